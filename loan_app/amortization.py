@@ -0,0 +1,90 @@
+import calendar
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+from .models import RepaymentInstallment
+
+CENT = Decimal('0.01')
+# Longest loan, in months, a schedule is generated for; it bounds the installment rows per loan.
+MAX_LOAN_PERIOD = getattr(settings, 'LOAN_MAX_PERIOD', 360)
+
+
+def add_months(start, months):
+    """Return the same day `months` later, clamped to the end of shorter months."""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def check_loan_period(loan_period):
+    """Raise ValueError unless a schedule can be generated for `loan_period` months."""
+    if not 1 <= loan_period <= MAX_LOAN_PERIOD:
+        raise ValueError(f'Loan period must be between 1 and {MAX_LOAN_PERIOD} months')
+
+
+def monthly_payment(principal, annual_interest_rate, loan_period):
+    """Level monthly payment that repays `principal` over `loan_period` months."""
+    check_loan_period(loan_period)
+    principal = Decimal(principal)
+    monthly_rate = Decimal(annual_interest_rate) / Decimal(1200)
+    if monthly_rate == 0:
+        return (principal / loan_period).quantize(CENT, rounding=ROUND_HALF_UP)
+    factor = (1 + monthly_rate) ** loan_period
+    return (principal * monthly_rate * factor / (factor - 1)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def amortization_schedule(principal, annual_interest_rate, loan_period):
+    """
+    Compute a fixed-payment amortization schedule in exact Decimal arithmetic.
+
+    Returns a list of (number, principal, interest, amount, remaining_principal)
+    tuples. Every value is rounded to cents and the final installment absorbs the
+    rounding difference, so the principal parts always sum to the loan amount.
+    """
+    remaining = Decimal(principal).quantize(CENT)
+    monthly_rate = Decimal(annual_interest_rate) / Decimal(1200)
+    payment = monthly_payment(remaining, annual_interest_rate, loan_period)
+
+    schedule = []
+    for number in range(1, loan_period + 1):
+        interest = (remaining * monthly_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+        principal_part = remaining if number == loan_period else min(payment - interest, remaining)
+        remaining -= principal_part
+        schedule.append((number, principal_part, interest, principal_part + interest, remaining))
+    return schedule
+
+
+def schedule_interest(principal, annual_interest_rate, loan_period):
+    """Total interest the borrower pays over the amortization schedule."""
+    return sum((row[2] for row in amortization_schedule(principal, annual_interest_rate, loan_period)), Decimal('0.00'))
+
+
+def build_installments(loan_offers, funded_on):
+    """
+    Build unsaved RepaymentInstallment rows for many funded offers in one pass.
+
+    Offers sharing the same amount, rate and period reuse one computed schedule,
+    so a batch of thousands of offers costs one calculation per distinct set of terms.
+    """
+    schedules = {}
+    installments = []
+    for loan_offer in loan_offers:
+        loan_request = loan_offer.loan_request
+        terms = (loan_request.loan_amount, loan_offer.annual_interest_rate, loan_request.loan_period)
+        if terms not in schedules:
+            schedules[terms] = amortization_schedule(*terms)
+        for number, principal, interest, amount, remaining in schedules[terms]:
+            installments.append(RepaymentInstallment(
+                loan_offer=loan_offer,
+                number=number,
+                due_date=add_months(funded_on, number),
+                principal=principal,
+                interest=interest,
+                amount=amount,
+                remaining_principal=remaining,
+            ))
+    return installments
@@ -0,0 +1,84 @@
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .cache import invalidate_loan_feed
+from .models import (
+    LoanRequest, LoanOffer, RepaymentInstallment,
+    ArchivedLoanRequest, ArchivedLoanOffer, ArchivedRepaymentInstallment,
+)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Hot model, archive model and the condition selecting the rows of a chunk of loan request ids, parents first.
+TIERS = [
+    (LoanRequest, ArchivedLoanRequest, 'id IN ({ids})'),
+    (LoanOffer, ArchivedLoanOffer, 'loan_request_id IN ({ids})'),
+    (RepaymentInstallment, ArchivedRepaymentInstallment,
+     'loan_offer_id IN (SELECT id FROM loan_offer WHERE loan_request_id IN ({ids}))'),
+]
+
+
+def archivable_requests(cutoff):
+    """
+    Completed loan requests that finished before `cutoff`.
+
+    Requests completed before completion times were recorded have no completed_at
+    and are treated as old enough.
+    """
+    return LoanRequest.objects.filter(status='Completed').filter(
+        Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True)
+    )
+
+
+def _columns(model):
+    return ', '.join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def archive_chunk(request_ids):
+    """
+    Move completed loan requests, their offers and installments to the archive tables.
+
+    Each table is copied with one INSERT ... SELECT and cleared with one DELETE, children
+    after parents on insert and before them on delete, all in one transaction. Requests
+    that are no longer completed are left alone. Returns the number of requests moved.
+    """
+    with transaction.atomic():
+        request_ids = list(
+            LoanRequest.objects.select_for_update().filter(pk__in=request_ids, status='Completed').values_list('id', flat=True)
+        )
+        if not request_ids:
+            return 0
+        ids = ', '.join(['%s'] * len(request_ids))
+        with connection.cursor() as cursor:
+            for hot, archived, condition in TIERS:
+                columns = _columns(hot)
+                cursor.execute(
+                    f'INSERT INTO {archived._meta.db_table} ({columns}) '
+                    f'SELECT {columns} FROM {hot._meta.db_table} WHERE {condition.format(ids=ids)}',
+                    request_ids,
+                )
+            for hot, _, condition in reversed(TIERS):
+                cursor.execute(f'DELETE FROM {hot._meta.db_table} WHERE {condition.format(ids=ids)}', request_ids)
+        invalidate_loan_feed()
+    return len(request_ids)
+
+
+def archive_loans(cutoff, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Archive every completed loan that finished before `cutoff`, `chunk_size` requests at a time.
+
+    Chunks commit independently and archived rows leave the hot tables, so an interrupted
+    run resumes where it stopped when started again. `progress` is called with the running
+    total after each chunk. Returns the number of loan requests archived.
+    """
+    archived, after = 0, 0
+    while True:
+        request_ids = list(
+            archivable_requests(cutoff).filter(id__gt=after).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not request_ids:
+            return archived
+        archived += archive_chunk(request_ids)
+        after = request_ids[-1]
+        if progress is not None:
+            progress(archived)
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import binascii
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate
+from django.db.models import Q
+from django.http import JsonResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .authentication import authenticate_bearer
+from .models import LoanRequest
+from .pagination import LoanRequestCursorPagination
+from .serializers import LoanRequestSerializer, LoanOfferDetailSerializer, UserRegistrationSerializer
+from .hashing import password_hasher, HasherSaturated
+from .idempotency import begin_idempotent, finish_idempotent
+from .services import register_user
+from .throttling import TokenBucketThrottle, route_name, take_token
+from .views import REGISTRATION_RETRY_AFTER, LOAN_REQUEST_RANGE_FILTERS, parse_range_filters, loan_offer_detail_queryset
+
+
+def _basic_credentials(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, encoded = header.partition(' ')
+    if scheme.lower() != 'basic' or not encoded:
+        return None
+    try:
+        username, _, password = base64.b64decode(encoded).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return username, password
+
+
+async def aget_user(request):
+    """
+    Resolve the authenticated user of an async request, or None.
+
+    Accepts the same bearer token, HTTP Basic and session credentials as the DRF
+    viewsets; database lookups run in a worker thread because the ORM calls behind
+    them are synchronous.
+    """
+    try:
+        user = await sync_to_async(authenticate_bearer)(request.headers.get('Authorization', ''))
+    except AuthenticationFailed:
+        return None
+    if user is not None:
+        return user
+    credentials = _basic_credentials(request)
+    if credentials is not None:
+        return await sync_to_async(authenticate)(request, username=credentials[0], password=credentials[1])
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    return user
+
+
+async def _throttled(request, user=None):
+    """Apply LOAN_RATE_LIMITS like TokenBucketThrottle does; return a 429 response or None."""
+    ident = user.pk if user is not None else TokenBucketThrottle().get_ident(request)
+    wait = await sync_to_async(take_token)(route_name(request), ident)
+    if not wait:
+        return None
+    wait = math.ceil(wait)
+    response = JsonResponse({'detail': f'Request was throttled. Expected available in {wait} seconds.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def _unauthenticated():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+def _page_size(request):
+    pagination = LoanRequestCursorPagination
+    try:
+        size = int(request.GET.get(pagination.page_size_query_param, pagination.page_size))
+    except ValueError:
+        return pagination.page_size
+    return max(1, min(size, pagination.max_page_size))
+
+
+def _before(request):
+    try:
+        return int(request.GET['before'])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _keyset_page(request, queryset, serializer_class):
+    """Fetch one page of `queryset` ordered by descending id, starting below the `before` id."""
+    page_size = _page_size(request)
+    before = _before(request)
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+
+    rows = [row async for row in queryset.order_by('-id')[:page_size + 1]]
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.GET.copy()
+        query['before'] = rows[-1].id
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return {'next': next_url, 'results': serializer_class(rows, many=True).data}
+
+
+async def loan_request_list(request):
+    """
+    Async variant of GET /loan-requests/.
+
+    Returns the logged-in user's loan requests and every pending request, newest first,
+    with the same range filters. Pages are keyed by the `before` id of the next link.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await aget_user(request)
+    if user is None:
+        return _unauthenticated()
+    throttled = await _throttled(request, user)
+    if throttled is not None:
+        return throttled
+
+    lookups, errors = parse_range_filters(request.GET, LOAN_REQUEST_RANGE_FILTERS)
+    if errors:
+        return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    requests = LoanRequest.objects.filter(Q(borrower=user) | Q(status='Pending')).filter(**lookups)
+    return JsonResponse(await _keyset_page(request, requests, LoanRequestSerializer))
+
+
+async def loan_offer_list(request):
+    """
+    Async variant of GET /loan-offers/.
+
+    Returns the logged-in investor's loan offers with investor and loan request summaries,
+    newest first, paged by the `before` id of the next link.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await aget_user(request)
+    if user is None:
+        return _unauthenticated()
+    throttled = await _throttled(request, user)
+    if throttled is not None:
+        return throttled
+
+    offers = loan_offer_detail_queryset().filter(investor=user)
+    return JsonResponse(await _keyset_page(request, offers, LoanOfferDetailSerializer))
+
+
+def _as_json(response):
+    """Render a DRF Response built by an async view, keeping its status and headers."""
+    rendered = JsonResponse(response.data, status=response.status_code, safe=False)
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            rendered[header] = value
+    return rendered
+
+
+async def _register(drf_request):
+    data = await sync_to_async(lambda: drf_request.data)()
+    serializer = UserRegistrationSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await asyncio.wrap_future(password_hasher.submit(serializer.validated_data['password']))
+    except HasherSaturated:
+        return Response(
+            {'message': 'Too many registrations in progress, please retry shortly'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(REGISTRATION_RETRY_AFTER)},
+        )
+
+    await sync_to_async(register_user)(serializer, password_hash)
+    return Response({'message': 'User registered successfully'}, status=status.HTTP_201_CREATED)
+
+
+async def user_registration(request):
+    """
+    Async variant of POST /register/.
+
+    The password is hashed on the bounded hashing pool while the event loop stays free;
+    validation and the single account insert run in a worker thread. An Idempotency-Key
+    is honoured like on /register/: the key is claimed before the view runs and its
+    response stored afterwards.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    throttled = await _throttled(request)
+    if throttled is not None:
+        return throttled
+    drf_request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+
+    claim, response = await sync_to_async(begin_idempotent)(drf_request)
+    if response is None:
+        try:
+            response = await _register(drf_request)
+        finally:
+            if claim is not None:
+                await sync_to_async(finish_idempotent)(claim, response)
+    return _as_json(response)
+
+
+# Django 4.2's require_http_methods and csrf_exempt wrap views in sync functions,
+# which would hide these coroutines from the async handler, so the method checks
+# live in the views and the CSRF exemption is set directly.
+user_registration.csrf_exempt = True
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.permissions import BasePermission
+from rest_framework.settings import api_settings
+
+from .idempotency import TTLCache
+
+API_TOKEN_TTL = getattr(settings, 'LOAN_API_TOKEN_TTL', 60 * 60)
+PRINCIPAL_CACHE_TTL = getattr(settings, 'LOAN_PRINCIPAL_CACHE_TTL', 30)
+PRINCIPAL_CACHE_SIZE = getattr(settings, 'LOAN_PRINCIPAL_CACHE_SIZE', 10000)
+TOKEN_SALT = 'loan_app.api-token'
+METRICS_TOKEN = getattr(settings, 'LOAN_METRICS_TOKEN', None)
+METRICS_SCRAPER = 'metrics-scraper'
+
+principals = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def issue_token(user):
+    """Return a signed token identifying `user`, valid for LOAN_API_TOKEN_TTL seconds."""
+    return signing.dumps({'uid': user.pk}, salt=TOKEN_SALT, compress=True)
+
+
+def verify_token(token):
+    """Return the user id a token was issued for, or raise signing.BadSignature if it is forged or expired."""
+    return signing.loads(token, salt=TOKEN_SALT, max_age=API_TOKEN_TTL)['uid']
+
+
+def get_principal(user_id):
+    """
+    Return the active user with this id, served from a short-lived per-process cache.
+
+    A deactivated user keeps access for at most LOAN_PRINCIPAL_CACHE_TTL seconds in other
+    processes; saves in this process evict the entry immediately.
+    """
+    user = principals.get(user_id)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            return None
+        principals.set(user_id, user)
+    return user
+
+
+def authenticate_bearer(header):
+    """
+    Resolve an `Authorization: Bearer <token>` header value to a user.
+
+    Returns None when the header is not a bearer token, so other schemes can be tried,
+    and raises AuthenticationFailed when the token is invalid or its user is inactive.
+    """
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    try:
+        user_id = verify_token(token.strip())
+    except (signing.BadSignature, KeyError, TypeError):
+        raise exceptions.AuthenticationFailed('Invalid or expired token.')
+    user = get_principal(user_id)
+    if user is None:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless HMAC-signed bearer tokens for API clients.
+
+    The signature and expiry are checked without touching the database, and the user
+    is looked up through the principal cache, so a hot client costs at most one query
+    every LOAN_PRINCIPAL_CACHE_TTL seconds per process. Tokens are issued by POST /token/.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        user = authenticate_bearer(get_authorization_header(request).decode('latin-1'))
+        if user is None:
+            return None
+        return user, None
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+API_AUTHENTICATION_CLASSES = [SignedTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Accept `Authorization: Bearer <LOAN_METRICS_TOKEN>` from a metrics scraper.
+
+    The scraper is not a user: it is authenticated as anonymous with `request.auth` set to
+    METRICS_SCRAPER, which only IsMetricsScraper accepts. Any other header is left to
+    the next authentication class.
+    """
+
+    def authenticate(self, request):
+        if not METRICS_TOKEN:
+            return None
+        scheme, _, token = get_authorization_header(request).decode('latin-1').partition(' ')
+        if scheme.lower() != 'bearer' or not constant_time_compare(token.strip(), METRICS_TOKEN):
+            return None
+        return AnonymousUser(), METRICS_SCRAPER
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+class IsMetricsScraper(BasePermission):
+    def has_permission(self, request, view):
+        return request.auth == METRICS_SCRAPER
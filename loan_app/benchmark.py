@@ -0,0 +1,125 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Count, Max, Min
+
+from .loan_book import chunked
+from .metrics import QueryTimer
+from .models import LedgerEntry, LoanUser, LoanRequest, LoanOffer
+
+OPENING_BALANCE = Decimal('1000000.00')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def seeded_ids(queryset):
+    """
+    Return the ids of rows just bulk inserted into `queryset` as a range.
+
+    Seeding inserts in sequence, so the ids are contiguous; a gap means another writer
+    interleaved and sampling from the range could reference a missing row.
+    """
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'), count=Count('id'))
+    if not bounds['count']:
+        return range(0)
+    if bounds['last'] - bounds['first'] + 1 != bounds['count']:
+        raise ValueError(f'Seeded {queryset.model.__name__} ids are not contiguous')
+    return range(bounds['first'], bounds['last'] + 1)
+
+
+def seed_database(users, requests, offers, prefix, rng, chunk_size=5000, password='benchmark-password'):
+    """
+    Bulk insert `users`, `requests` and `offers` rows of synthetic data.
+
+    Every user shares one precomputed password hash, rows are generated lazily and
+    inserted chunk by chunk, ids are sampled from the seeded id ranges and loan
+    requests are streamed back to attach offers, so memory stays flat for any volume.
+    Offers are spread evenly over the requests, each from an investor other than the
+    borrower. Returns the range of seeded user ids and the number of rows inserted per
+    entity, which can fall short of `offers` when there is a single user.
+    """
+    password_hash = make_password(password)
+    user_rows = (
+        LoanUser(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com', password=password_hash, balance=OPENING_BALANCE)
+        for i in range(users)
+    )
+    for chunk in chunked(user_rows, chunk_size):
+        LoanUser.objects.bulk_create(chunk)
+    user_ids = seeded_ids(LoanUser.objects.filter(username__startswith=f'{prefix}-'))
+    # bulk_create sends no post_save signals, so the opening deposits are written here.
+    deposits = (LedgerEntry(user_id=user_id, kind='Deposit', amount=OPENING_BALANCE) for user_id in user_ids)
+    for chunk in chunked(deposits, chunk_size):
+        LedgerEntry.objects.bulk_create(chunk)
+
+    request_rows = (
+        LoanRequest(borrower_id=rng.choice(user_ids), loan_amount=rng.randrange(500, 50000), loan_period=rng.choice([3, 6, 12, 24, 36]))
+        for _ in range(requests)
+    )
+    seeded = {'users': len(user_ids), 'requests': 0, 'offers': 0}
+    for chunk in chunked(request_rows, chunk_size):
+        seeded['requests'] += len(LoanRequest.objects.bulk_create(chunk))
+
+    def offer_rows():
+        if not requests or len(user_ids) < 2:
+            return
+        per_request, extra = divmod(offers, requests)
+        seeded_requests = LoanRequest.objects.filter(borrower_id__gte=user_ids.start, borrower_id__lt=user_ids.stop)
+        rows = seeded_requests.order_by('id').values_list('id', 'borrower_id').iterator(chunk_size=chunk_size)
+        for index, (loan_request_id, borrower_id) in enumerate(rows):
+            for _ in range(per_request + (index < extra)):
+                # Draw from every seeded user but the borrower.
+                investor_id = rng.choice(user_ids[:-1])
+                if investor_id >= borrower_id:
+                    investor_id += 1
+                yield LoanOffer(investor_id=investor_id, loan_request_id=loan_request_id, annual_interest_rate=rng.randrange(1, 30))
+    for chunk in chunked(offer_rows(), chunk_size):
+        seeded['offers'] += len(LoanOffer.objects.bulk_create(chunk))
+    return user_ids, seeded
+
+
+class EndpointStats:
+    """Thread-safe latency and query-count samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, queries, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, queries, ok))
+
+    def summary(self, elapsed):
+        result = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(seconds for seconds, _, _ in samples)
+            result[endpoint] = {
+                'requests': len(samples),
+                'errors': sum(1 for _, _, ok in samples if not ok),
+                'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'queries_per_request': round(sum(queries for _, queries, _ in samples) / len(samples), 2),
+            }
+        return result
+
+
+def timed(stats, endpoint, call):
+    """Run `call`, recording its latency, query count and success under `endpoint`."""
+    timer = QueryTimer()
+    started = time.perf_counter()
+    ok = False
+    try:
+        with connection.execute_wrapper(timer):
+            response = call()
+        ok = response.status_code < 400
+        return response
+    finally:
+        stats.record(endpoint, time.perf_counter() - started, timer.queries, ok)
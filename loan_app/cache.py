@@ -0,0 +1,91 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+FEED_CACHE_ALIAS = getattr(settings, 'LOAN_FEED_CACHE_ALIAS', 'default')
+FEED_CACHE_TIMEOUT = getattr(settings, 'LOAN_FEED_CACHE_TIMEOUT', 30)
+FEED_VERSION_KEY = 'loan_feed:version'
+
+
+class CacheStats:
+    """Process-local hit/miss counters for the loan request feed cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+feed_cache_stats = CacheStats()
+
+
+def get_feed_cache():
+    return caches[FEED_CACHE_ALIAS]
+
+
+def get_feed_version():
+    cache = get_feed_cache()
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        cache.add(FEED_VERSION_KEY, 1, timeout=None)
+        version = cache.get(FEED_VERSION_KEY, 1)
+    return version
+
+
+def feed_cache_key(user_id, query_params):
+    """
+    Build the cache key of one feed page.
+
+    The key embeds the current feed version, so bumping the version invalidates
+    every cached page at once without enumerating keys.
+    """
+    query = '&'.join(f'{key}={value}' for key, value in sorted(query_params.items()))
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f'loan_feed:v{get_feed_version()}:u{user_id}:{digest}'
+
+
+def get_cached_feed_page(key):
+    content = get_feed_cache().get(key)
+    feed_cache_stats.record(content is not None)
+    return content
+
+
+def set_cached_feed_page(key, content):
+    get_feed_cache().set(key, content, timeout=FEED_CACHE_TIMEOUT)
+
+
+def bump_feed_version():
+    cache = get_feed_cache()
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        cache.add(FEED_VERSION_KEY, 2, timeout=None)
+
+
+def invalidate_loan_feed():
+    """Invalidate every cached feed page once the current transaction commits."""
+    transaction.on_commit(bump_feed_version)
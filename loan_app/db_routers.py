@@ -0,0 +1,86 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_DATABASES = getattr(settings, 'LOAN_REPLICA_DATABASES', [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS])
+REPLICA_STICKINESS = getattr(settings, 'LOAN_REPLICA_STICKINESS', 5)
+
+read_database = ContextVar('loan_read_database', default=None)
+
+
+def _pin_key(user_id):
+    return f'loan_primary_pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for LOAN_REPLICA_STICKINESS seconds, so they see their own writes."""
+    cache.set(_pin_key(user_id), True, REPLICA_STICKINESS)
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id), False)
+
+
+def choose_read_database(request):
+    """Return a replica alias for a read-only request of a user without recent writes, else None for the primary."""
+    if not REPLICA_DATABASES or request.method not in SAFE_METHODS:
+        return None
+    if request.user.is_authenticated and is_pinned(request.user.pk):
+        return None
+    return random.choice(REPLICA_DATABASES)
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads to the replica chosen for the current request and everything else to the primary.
+
+    Outside a ReplicaReadMixin view no replica is chosen, so management commands, workers
+    and write requests read from the primary. Enable with
+    DATABASE_ROUTERS = ['loan_app.db_routers.PrimaryReplicaRouter'].
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Serve a view's read-only requests from a replica.
+
+    The replica is chosen after authentication, so the per-user stickiness window opened
+    by a successful write applies to session, Basic and bearer token clients alike.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._read_database_token = read_database.set(choose_read_database(request))
+
+    def _reset_read_database(self):
+        token = getattr(self, '_read_database_token', None)
+        if token is not None:
+            read_database.reset(token)
+            self._read_database_token = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Unhandled exceptions skip finalize_response; don't leave the replica set on this thread.
+            self._reset_read_database()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._reset_read_database()
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,57 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+PASSWORD_HASH_WORKERS = getattr(settings, 'LOAN_PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+PASSWORD_HASH_QUEUE_DEPTH = getattr(settings, 'LOAN_PASSWORD_HASH_QUEUE_DEPTH', PASSWORD_HASH_WORKERS * 4)
+
+
+class HasherSaturated(Exception):
+    """Raised when the password hashing pool already has its maximum number of jobs."""
+
+
+class BoundedPasswordHasher:
+    """
+    Hash passwords on a fixed-size thread pool with a bounded backlog.
+
+    PBKDF2 runs in hashlib with the GIL released, so a thread pool spreads hashing
+    across cores without tying up request threads beyond `workers`. At most
+    `workers + queue_depth` jobs are accepted at once; further submissions fail
+    immediately with HasherSaturated so callers can shed load instead of queueing.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_depth=PASSWORD_HASH_QUEUE_DEPTH):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so importing this module does not start threads in every process.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            return self._executor
+
+    def submit(self, password):
+        """Schedule hashing of `password` and return a Future of the encoded hash."""
+        if not self._slots.acquire(blocking=False):
+            raise HasherSaturated('Password hashing pool is saturated')
+        try:
+            future = self._get_executor().submit(make_password, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password):
+        """Hash `password` on the pool and wait for the result."""
+        return self.submit(password).result()
+
+
+password_hasher = BoundedPasswordHasher()
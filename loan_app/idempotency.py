@@ -0,0 +1,214 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'LOAN_IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+IDEMPOTENCY_CACHE_SIZE = getattr(settings, 'LOAN_IDEMPOTENCY_CACHE_SIZE', 10000)
+IDEMPOTENCY_IN_PROGRESS_TIMEOUT = getattr(settings, 'LOAN_IDEMPOTENCY_IN_PROGRESS_TIMEOUT', 60)
+IDEMPOTENCY_RETRY_AFTER = 1  # Seconds
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+recent_responses = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_KEY_TTL)
+
+
+def _fingerprint(request):
+    """
+    Hash the parsed request data.
+
+    The raw body cannot be read again once something upstream has consumed the stream
+    (request.POST in a middleware, or DRF parsing a multipart upload), so the parsed data
+    is hashed instead, with keys sorted so equal payloads hash alike.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _scope(request, key, fingerprint):
+    """
+    Return the (user_id, key) pair a request's Idempotency-Key is stored under.
+
+    Authenticated keys are scoped to the user. Anonymous clients share one key space, so
+    their key is combined with the request fingerprint: two clients picking the same key
+    for different requests never see each other's response.
+    """
+    if request.user.is_authenticated:
+        return request.user.id, key
+    return None, 'anonymous:' + hashlib.sha256(f'{key}:{fingerprint}'.encode()).hexdigest()
+
+
+def _lookup(user_id, key):
+    cached = recent_responses.get((user_id, key))
+    if cached is not None:
+        return cached
+    stored = (
+        IdempotencyKey.objects
+        .filter(user_id=user_id, key=key, created_at__gte=timezone.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL))
+        .values_list('method', 'path', 'fingerprint', 'status_code', 'response_body')
+        .first()
+    )
+    if stored is not None and stored[3] is not None:
+        recent_responses.set((user_id, key), stored)
+    return stored
+
+
+def _claim(user_id, key, method, path, fingerprint):
+    """
+    Insert the in-progress row for a key, returning False if another request holds it.
+
+    The unique constraint makes the insert the point where concurrent retries are decided:
+    exactly one of them creates the row and runs the view. Rows past the TTL, and in-progress
+    rows older than LOAN_IDEMPOTENCY_IN_PROGRESS_TIMEOUT left behind by a crashed worker,
+    are replaced.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(user_id=user_id, key=key).filter(
+                Q(created_at__lt=now - timedelta(seconds=IDEMPOTENCY_KEY_TTL))
+                | Q(status_code__isnull=True, created_at__lt=now - timedelta(seconds=IDEMPOTENCY_IN_PROGRESS_TIMEOUT))
+            ).delete()
+            IdempotencyKey.objects.create(user_id=user_id, key=key, method=method, path=path, fingerprint=fingerprint)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _finish(user_id, key, method, path, fingerprint, response):
+    if response is not None and response.status_code < 500 and response.status_code != status.HTTP_429_TOO_MANY_REQUESTS and hasattr(response, 'data'):
+        IdempotencyKey.objects.filter(user_id=user_id, key=key).update(status_code=response.status_code, response_body=response.data)
+        recent_responses.set((user_id, key), (method, path, fingerprint, response.status_code, response.data))
+    else:
+        # Nothing worth replaying: release the key so the client can retry.
+        IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+
+
+def _replay(request, stored, fingerprint):
+    method, path, stored_fingerprint, status_code, body = stored
+    if (method, path, stored_fingerprint) != (request.method, request.path, fingerprint):
+        return Response({'message': 'Idempotency-Key was already used for a different request'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if status_code is None:
+        return Response(
+            {'message': 'A request with this Idempotency-Key is still in progress'},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': str(IDEMPOTENCY_RETRY_AFTER)},
+        )
+    return Response(body, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def begin_idempotent(request):
+    """
+    Look up or claim the Idempotency-Key of a DRF request.
+
+    Returns `(claim, response)`. A response (400 for an oversized key, a replay, 409 or 422)
+    must be returned as is. Otherwise the caller runs the view and, if `claim` is not None,
+    passes it with the view's response to `finish_idempotent`.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return None, None
+    if len(key) > 255:
+        return None, Response({'message': 'Idempotency-Key must be at most 255 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = _fingerprint(request)
+    user_id, key = _scope(request, key, fingerprint)
+    stored = _lookup(user_id, key)
+    if stored is None or stored[3] is None:
+        if _claim(user_id, key, request.method, request.path, fingerprint):
+            return (user_id, key, request.method, request.path, fingerprint), None
+        stored = _lookup(user_id, key)
+        if stored is None:
+            # The other request released the key in the meantime; let the client retry.
+            stored = (request.method, request.path, fingerprint, None, None)
+    return None, _replay(request, stored, fingerprint)
+
+
+def finish_idempotent(claim, response):
+    """Store the response of a claimed request, or release the key if it should not be replayed."""
+    _finish(*claim, response)
+
+
+def idempotent(view_method):
+    """
+    Make a state-changing DRF view method replay its first response for a repeated Idempotency-Key.
+
+    Keys are scoped to the authenticated user; anonymous keys are scoped to the request body.
+    Before the view runs, an in-progress row is inserted under the key's unique constraint,
+    so of several concurrent retries only one runs the view and the others get 409 until it
+    finishes. The response is then kept in an in-process LRU and in the IdempotencyKey table
+    for LOAN_IDEMPOTENCY_KEY_TTL seconds; a retry within that window is answered from there
+    without running the view again. Server errors and 429 responses are not stored, so they
+    can be retried. Reusing a key for a different request returns 422.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        claim, response = begin_idempotent(request)
+        if response is not None:
+            return response
+        if claim is None:
+            return view_method(self, request, *args, **kwargs)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        finally:
+            finish_idempotent(claim, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(now=None):
+    """Delete stored idempotency keys older than the TTL and return how many were removed."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,140 @@
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job, LoanOffer
+from .repayments import post_due_repayments
+from .services import accept_loan_offer, complete_loan_offer, FundingError
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = getattr(settings, 'LOAN_JOB_LEASE_SECONDS', 300)
+JOB_MAX_ATTEMPTS = getattr(settings, 'LOAN_JOB_MAX_ATTEMPTS', 5)
+JOB_RETRY_DELAY = getattr(settings, 'LOAN_JOB_RETRY_DELAY', 10)
+
+JOB_HANDLERS = {}
+
+
+class JobRejected(Exception):
+    """Raised by a job handler when the job can never succeed; the job fails without retrying."""
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler of `kind` jobs. It receives the job payload."""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, user=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, payload=payload, user=user)
+
+
+def _claimable(now):
+    expired_lease = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    return Job.objects.filter(
+        Q(status='Queued', run_after__lte=now) | Q(status='Running', locked_at__lt=expired_lease)
+    ).order_by('run_after', 'id')
+
+
+def claim_job():
+    """
+    Claim the next runnable job for this worker, or return None.
+
+    Where the database supports it the candidate row is taken with SELECT ... FOR UPDATE
+    SKIP LOCKED, so concurrent workers never wait on each other. Elsewhere (SQLite) the
+    claim is a conditional UPDATE that only one worker can win. Jobs left Running by a
+    crashed worker become claimable again once their lease expires.
+    """
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _claimable(now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(status='Running', locked_at=now, attempts=job.attempts + 1)
+    else:
+        for job in _claimable(now)[:10]:
+            claimed = Job.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+                status='Running', locked_at=now, attempts=job.attempts + 1
+            )
+            if claimed:
+                break
+        else:
+            return None
+    job.status, job.locked_at, job.attempts = 'Running', now, job.attempts + 1
+    return job
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome, rescheduling it after unexpected errors."""
+    try:
+        result = JOB_HANDLERS[job.kind](job.payload)
+    except JobRejected as e:
+        Job.objects.filter(pk=job.pk).update(status='Failed', error=str(e), locked_at=None)
+        return 'Failed'
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            Job.objects.filter(pk=job.pk).update(status='Failed', error=repr(e), locked_at=None)
+            return 'Failed'
+        Job.objects.filter(pk=job.pk).update(
+            status='Queued', error=repr(e), locked_at=None,
+            run_after=timezone.now() + timedelta(seconds=JOB_RETRY_DELAY * job.attempts),
+        )
+        return 'Queued'
+    Job.objects.filter(pk=job.pk).update(status='Done', result=result, error='', locked_at=None)
+    return 'Done'
+
+
+def work(once=False, poll_interval=1.0):
+    """Run jobs until stopped; with `once`, return as soon as no job is runnable. Returns the number of jobs run."""
+    processed = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+        logger.debug('Worker %s ran job %s', os.getpid(), job.pk)
+
+
+@job_handler('accept_offer')
+def accept_offer_job(payload):
+    try:
+        accept_loan_offer(payload['loan_offer_id'], payload['borrower_id'])
+    except (LoanOffer.DoesNotExist, ValueError):
+        raise JobRejected('Loan offer not found or not in Pending status')
+    except FundingError as e:
+        raise JobRejected(str(e))
+    return {'message': 'Loan offer accepted and loan funded successfully'}
+
+
+@job_handler('complete_offer')
+def complete_offer_job(payload):
+    try:
+        complete_loan_offer(payload['loan_offer_id'], payload['investor_id'])
+    except (LoanOffer.DoesNotExist, ValueError):
+        raise JobRejected('Loan offer not found or not in Pending status')
+    except FundingError as e:
+        raise JobRejected(str(e))
+    return {'message': 'Loan offer Completed and loan Completed successfully'}
+
+
+@job_handler('post_repayments')
+def post_repayments_job(payload):
+    return post_due_repayments(
+        date.fromisoformat(payload['on']), payload.get('first_id'), payload.get('last_id'),
+    )
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import LedgerEntry, BalanceSnapshot
+
+# Entry ids are allocated at insert time, not at commit, so an entry can become visible after
+# entries with higher ids. Only entries older than this many seconds are folded into snapshots.
+SNAPSHOT_LAG = getattr(settings, 'LOAN_LEDGER_SNAPSHOT_LAG', 60)
+
+
+def record_entries(user, entries, loan_offer=None):
+    """
+    Append (kind, amount) ledger entries for a user in a single insert.
+
+    The ledger is the balance: entries are only ever inserted, so credits never contend
+    on a shared row. A debit must first lock the user's row and check get_ledger_balance,
+    which serializes debits of one user without blocking credits.
+    """
+    return LedgerEntry.objects.bulk_create([
+        LedgerEntry(user=user, loan_offer=loan_offer, kind=kind, amount=amount)
+        for kind, amount in entries
+    ])
+
+
+def get_ledger_balance(user):
+    """
+    Return a user's balance as their latest snapshot plus the entries appended since.
+
+    Both lookups are index range scans, and the entry scan only covers the entries
+    written since the last materialization run.
+    """
+    snapshot = (
+        BalanceSnapshot.objects.filter(user=user)
+        .order_by('-last_entry_id')
+        .values_list('balance', 'last_entry_id')
+        .first()
+    )
+    balance, last_entry_id = snapshot or (Decimal('0.00'), 0)
+    since = LedgerEntry.objects.filter(user=user, id__gt=last_entry_id).aggregate(total=Sum('amount'))['total']
+    return balance + (since or 0)
+
+
+def with_ledger_balance(users, name='ledger_balance'):
+    """
+    Annotate a LoanUser queryset with each user's balance as computed by get_ledger_balance.
+
+    The snapshot and the entries since are correlated subqueries, so the balances of many
+    users are read in the same single query as the users themselves.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    snapshot = BalanceSnapshot.objects.filter(user=OuterRef('pk')).order_by('-last_entry_id')
+    since = (
+        LedgerEntry.objects.filter(user=OuterRef('pk'), id__gt=OuterRef('snapshot_entry_id'))
+        .order_by().values('user').annotate(total=Sum('amount')).values('total')
+    )
+    balance = (
+        Coalesce(Subquery(snapshot.values('balance')[:1]), Value(Decimal('0.00')), output_field=money)
+        + Coalesce(Subquery(since, output_field=money), Value(Decimal('0.00')), output_field=money)
+    )
+    snapshot_entry_id = Coalesce(Subquery(snapshot.values('last_entry_id')[:1]), 0)
+    return users.alias(snapshot_entry_id=snapshot_entry_id).annotate(**{name: balance})
+
+
+def materialize_balance_snapshots(now=None):
+    """
+    Fold the ledger entries written since the previous run into new balance snapshots.
+
+    All snapshots of one run share the same cutoff entry id, so the next run only has
+    to aggregate entries above the highest cutoff. The cutoff is the newest entry older
+    than LOAN_LEDGER_SNAPSHOT_LAG seconds: an entry whose transaction was still open when
+    the cutoff was taken, with an id below it, would otherwise never be counted. Returns
+    the number of snapshots created.
+    """
+    settled_before = (now or timezone.now()) - timedelta(seconds=SNAPSHOT_LAG)
+    with transaction.atomic():
+        previous_cutoff = BalanceSnapshot.objects.aggregate(cutoff=Max('last_entry_id'))['cutoff'] or 0
+        cutoff = LedgerEntry.objects.filter(created_at__lt=settled_before).aggregate(cutoff=Max('id'))['cutoff'] or 0
+        if cutoff <= previous_cutoff:
+            return 0
+
+        totals = (
+            LedgerEntry.objects.filter(id__gt=previous_cutoff, id__lte=cutoff)
+            .values_list('user_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        user_ids = [user_id for user_id, _ in totals]
+        previous = dict(
+            BalanceSnapshot.objects.filter(user_id__in=user_ids)
+            .order_by('user_id', 'last_entry_id')
+            .values_list('user_id', 'balance')
+        )
+        snapshots = BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(user_id=user_id, balance=previous.get(user_id, Decimal('0.00')) + total, last_entry_id=cutoff)
+            for user_id, total in totals
+        ])
+    return len(snapshots)
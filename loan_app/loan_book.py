@@ -0,0 +1,217 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .amortization import build_installments
+from .ledger import with_ledger_balance
+from .models import LedgerEntry, LoanUser, LoanRequest, LoanOffer, RepaymentInstallment
+
+# Entities in dependency order: every foreign key points at an entity listed before it.
+ENTITIES = [
+    ('users', LoanUser, ['id', 'username', 'email', 'password', 'balance', 'date_joined']),
+    ('loan_requests', LoanRequest, ['id', 'borrower_id', 'loan_amount', 'loan_period', 'status', 'offer_deadline', 'completed_at']),
+    ('loan_offers', LoanOffer, ['id', 'investor_id', 'loan_request_id', 'annual_interest_rate', 'status']),
+]
+ID_FIELDS = {'id', 'borrower_id', 'investor_id', 'loan_request_id'}
+FORMATS = {'jsonl': 'jsonl', 'csv': 'csv'}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def entity_path(directory, name, fmt):
+    return os.path.join(directory, f'{name}.{FORMATS[fmt]}')
+
+
+def export_rows(model, fields, chunk_size):
+    """
+    Yield rows of `fields` from the database through a server-side cursor.
+
+    A user's exported balance is their current ledger balance, not the opening deposit
+    held by LoanUser.balance.
+    """
+    queryset = model.objects.order_by('id')
+    if model is LoanUser:
+        queryset = with_ledger_balance(queryset)
+        fields = ['ledger_balance' if field == 'balance' else field for field in fields]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def write_rows(path, fmt, fields, rows):
+    """Stream rows to a CSV or JSON Lines file and return the number written."""
+    written = 0
+    with open(path, 'w', newline='') as output:
+        if fmt == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(['' if value is None else value for value in row])
+                written += 1
+        else:
+            encoder = DjangoJSONEncoder()
+            for row in rows:
+                output.write(encoder.encode(dict(zip(fields, row))))
+                output.write('\n')
+                written += 1
+    return written
+
+
+def read_rows(path, fmt):
+    """Yield one dict per record of a CSV or JSON Lines file, reading line by line."""
+    with open(path, newline='') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def build_instances(model, fields, rows, id_offset=0):
+    """
+    Turn raw rows into unsaved model instances, shifting every id by `id_offset`.
+
+    CSV has no null, so an empty string becomes None for ids and nullable fields.
+    """
+    model_fields = {field: model._meta.get_field(field) for field in fields if field not in ID_FIELDS}
+    nullable = {field for field in fields if field in ID_FIELDS or model_fields[field].null}
+    for row in rows:
+        values = {}
+        for field in fields:
+            value = row.get(field)
+            if value == '' and field in nullable:
+                value = None
+            if value is not None:
+                value = int(value) + id_offset if field in ID_FIELDS else model_fields[field].to_python(value)
+            values[field] = value
+        yield model(**values)
+
+
+def record_deposits(users):
+    """Credit each imported balance to the ledger as a Deposit."""
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(user_id=user.id, kind='Deposit', amount=user.balance) for user in users if user.balance
+    ])
+
+
+def schedule_funded_offers(offers):
+    """
+    Generate repayment installments for imported Accepted offers, so they can be repaid.
+
+    Exports carry no schedules, so the schedule starts from the import date.
+    """
+    funded = [offer for offer in offers if offer.status == 'Accepted']
+    if not funded:
+        return
+    loan_requests = LoanRequest.objects.in_bulk([offer.loan_request_id for offer in funded])
+    for offer in funded:
+        offer.loan_request = loan_requests[offer.loan_request_id]
+    RepaymentInstallment.objects.bulk_create(build_installments(funded, timezone.localdate()))
+
+
+# Rows derived from each imported chunk, written in the chunk's transaction.
+DERIVED_ROWS = {
+    'users': record_deposits,
+    'loan_offers': schedule_funded_offers,
+}
+
+
+class Checkpoint:
+    """Rows already imported per entity, persisted to a JSON file after every committed chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.progress = {}
+        if path and os.path.exists(path):
+            with open(path) as source:
+                self.progress = json.load(source)
+
+    def done(self, name):
+        return self.progress.get(name, 0)
+
+    def advance(self, name, rows):
+        self.progress[name] = self.done(name) + rows
+        if self.path:
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as output:
+                json.dump(self.progress, output)
+            os.replace(temporary, self.path)
+
+
+class ImportConflict(Exception):
+    """Raised when an imported row collides with a row the import did not write."""
+
+
+def skip_committed(model, fields, chunk):
+    """
+    Drop rows identical to ones already in the database.
+
+    Used for the first chunk of a resumed import only: the checkpoint is written after
+    a chunk commits, so a crash in between leaves that chunk committed but unrecorded.
+    """
+    existing = {row[0]: row for row in model.objects.filter(pk__in=[instance.pk for instance in chunk]).values_list(*fields)}
+    return [
+        instance for instance in chunk
+        if existing.get(instance.pk) != tuple(getattr(instance, field) for field in fields)
+    ]
+
+
+def check_conflicts(model, instances):
+    """Raise ImportConflict if any id, or for users any username, is already taken."""
+    taken = sorted(model.objects.filter(pk__in=[instance.pk for instance in instances]).values_list('pk', flat=True)[:5])
+    if taken:
+        raise ImportConflict(
+            f'{model._meta.verbose_name_plural} with ids {taken} already exist; '
+            f'pass --id-offset to import into a database that already holds rows'
+        )
+    if model is LoanUser:
+        taken = sorted(LoanUser.objects.filter(username__in=[user.username for user in instances]).values_list('username', flat=True)[:5])
+        if taken:
+            raise ImportConflict(f'usernames {taken} already exist')
+
+
+def import_entity(path, fmt, model, fields, name, checkpoint, chunk_size, id_offset=0):
+    """
+    Import one entity file in chunks, each in its own transaction.
+
+    Rows recorded in the checkpoint are skipped, so an interrupted import resumes
+    after its last committed chunk. The checkpoint is written after the commit, so the
+    first chunk of a resumed import skips rows identical to ones already present. Any
+    other row whose id or username is taken raises ImportConflict before anything of its
+    chunk is written. Returns the number of rows inserted by this run.
+    """
+    rows = islice(read_rows(path, fmt), checkpoint.done(name), None)
+    derive = DERIVED_ROWS.get(name)
+    resuming = checkpoint.path is not None
+    inserted = 0
+    for chunk in chunked(build_instances(model, fields, rows, id_offset), chunk_size):
+        with transaction.atomic():
+            new = skip_committed(model, fields, chunk) if resuming else chunk
+            check_conflicts(model, new)
+            model.objects.bulk_create(new)
+            if derive is not None:
+                derive(new)
+        checkpoint.advance(name, len(chunk))
+        resuming = False
+        inserted += len(new)
+    return inserted
+
+
+def reset_sequences():
+    """Move the id sequences past explicitly inserted ids on backends that use sequences."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model for _, model, _ in ENTITIES])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
@@ -0,0 +1,32 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loan_app.archive import DEFAULT_CHUNK_SIZE, archive_loans
+
+AGE_UNITS = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+
+
+def parse_age(value):
+    match = re.fullmatch(r'(\d+)([dhm])', value)
+    if match is None:
+        raise CommandError(f'Invalid age {value!r}; use a number followed by d, h or m, e.g. 90d')
+    return timedelta(**{AGE_UNITS[match.group(2)]: int(match.group(1))})
+
+
+class Command(BaseCommand):
+    help = 'Move completed loan requests, their offers and installments to the archive tables in resumable chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', required=True, help='Archive loans completed longer ago than this, e.g. 90d, 12h.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Loan requests moved per transaction.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - parse_age(options['older_than'])
+        archived = archive_loans(
+            cutoff, options['chunk_size'],
+            progress=lambda total: self.stdout.write(f'Archived {total} loan requests so far'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} loan requests completed before {cutoff:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,113 @@
+import json
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DatabaseError, connection
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from loan_app.benchmark import EndpointStats, seed_database, timed
+from loan_app.models import LoanUser, LoanRequest, LoanOffer
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the configured database with synthetic users, loan requests and offers, then drive the '
+        'register -> request -> offer -> accept_offer -> complete_offer flow with concurrent in-process clients '
+        'and report p50/p99 latency, throughput and query counts per endpoint. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed.')
+        parser.add_argument('--requests', type=int, default=5000, help='Loan requests to seed.')
+        parser.add_argument('--offers', type=int, default=20000, help='Loan offers to seed.')
+        parser.add_argument('--flows', type=int, default=200, help='Full lifecycle flows to run.')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for reproducible data.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        rng = random.Random(options['seed'])
+
+        started = time.perf_counter()
+        user_ids, seeded = seed_database(options['users'], options['requests'], options['offers'], prefix, rng)
+        seed_seconds = time.perf_counter() - started
+        self.stdout.write(f"Seeded {seeded['users']} users, {seeded['requests']} requests, {seeded['offers']} offers in {seed_seconds:.1f}s")
+
+        stats = EndpointStats()
+        investors = list(LoanUser.objects.filter(id__in=user_ids[:max(1, options['clients'])]))
+        flow_lock = threading.Lock()
+        completed = []
+
+        def flow(index):
+            client = APIClient(raise_request_exception=False)
+            investor = investors[index % len(investors)]
+            username = f'{prefix}-flow-{index}'
+            try:
+                timed(stats, 'register', lambda: client.post('/api/register/', {
+                    'username': username, 'email': f'{username}@example.com', 'password': 'benchmark-password',
+                }))
+                borrower = LoanUser.objects.get(username=username)
+
+                client.force_authenticate(user=borrower)
+                timed(stats, 'loan_request_create', lambda: client.post('/api/loan-requests/', {'loan_amount': 1000, 'loan_period': 6}))
+                loan_request = LoanRequest.objects.filter(borrower=borrower).latest('id')
+
+                client.force_authenticate(user=investor)
+                timed(stats, 'loan_request_list', lambda: client.get('/api/loan-requests/'))
+                timed(stats, 'loan_offer_create', lambda: client.post('/api/loan-offers/', {'loan_request': loan_request.id, 'annual_interest_rate': 10}))
+                loan_offer = LoanOffer.objects.filter(loan_request=loan_request, investor=investor).latest('id')
+
+                client.force_authenticate(user=borrower)
+                timed(stats, 'accept_offer', lambda: client.post(f'/api/loan-offers/{loan_offer.id}/accept_offer/'))
+
+                client.force_authenticate(user=investor)
+                timed(stats, 'complete_offer', lambda: client.post(f'/api/loan-offers/{loan_offer.id}/complete_offer/'))
+                timed(stats, 'loan_offer_list', lambda: client.get('/api/loan-offers/'))
+            except (DatabaseError, LoanUser.DoesNotExist, LoanRequest.DoesNotExist, LoanOffer.DoesNotExist):
+                return
+            finally:
+                connection.close()
+            with flow_lock:
+                completed.append(index)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            list(pool.map(flow, range(options['flows'])))
+        elapsed = time.perf_counter() - started
+
+        results = {
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('users', 'requests', 'offers', 'flows', 'clients', 'seed')},
+            'seeded': seeded,
+            'seed_seconds': round(seed_seconds, 3),
+            'flow_seconds': round(elapsed, 3),
+            'flows_completed': len(completed),
+            'flows_per_second': round(len(completed) / elapsed, 2) if elapsed else 0.0,
+            'endpoints': stats.summary(elapsed),
+        }
+
+        for endpoint, summary in results['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint}: {summary['throughput_rps']} req/s, p50 {summary['p50_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms, {summary['queries_per_request']} queries/request, {summary['errors']} errors"
+            )
+        self.stdout.write(f"{results['flows_completed']} flows in {results['flow_seconds']}s ({results['flows_per_second']} flows/s)")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,66 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from loan_app.hashing import BoundedPasswordHasher, HasherSaturated
+from loan_app.models import LoanUser
+from loan_app.serializers import UserRegistrationSerializer
+from loan_app.services import register_user
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure registrations per second with inline hashing and two writes (the previous path) '
+        'against the bounded hashing pool with a single insert. Benchmark users are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Registrations per mode.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent registering threads.')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing pool size (defaults to LOAN_PASSWORD_HASH_WORKERS).')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        hasher = BoundedPasswordHasher(**({'workers': options['workers']} if options['workers'] else {}))
+
+        def inline(index):
+            serializer = self.serializer(f'{prefix}-inline-{index}')
+            user = serializer.save()
+            user.set_password(serializer.validated_data['password'])
+            user.save()
+            return True
+
+        def pooled(index):
+            serializer = self.serializer(f'{prefix}-pool-{index}')
+            try:
+                password_hash = hasher.hash(serializer.validated_data['password'])
+            except HasherSaturated:
+                return False
+            register_user(serializer, password_hash)
+            return True
+
+        try:
+            for name, register in [('inline', inline), ('pool', pooled)]:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                    results = list(pool.map(register, range(options['count'])))
+                elapsed = time.perf_counter() - started
+                accepted = sum(results)
+                self.stdout.write(
+                    f'{name}: {accepted / elapsed:.1f} registrations/s '
+                    f'({accepted} accepted, {len(results) - accepted} shed with 429)'
+                )
+        finally:
+            LoanUser.objects.filter(username__startswith=prefix).delete()
+
+    def serializer(self, username):
+        serializer = UserRegistrationSerializer(data={
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': 'benchmark-password',
+            'balance': 0,
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from loan_app.models import LoanRequest
+from loan_app.renderers import FastJSONRenderer, orjson
+from loan_app.serializers import LOAN_REQUEST_ROW_FIELDS, LoanRequestSerializer, serialize_loan_request_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure rows per second serialized and rendered for a loan request page through '
+        'LoanRequestSerializer and JSONRenderer (the previous path) against the precompiled '
+        'row serializer and FastJSONRenderer. Runs in memory; no database rows are written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page.')
+        parser.add_argument('--repeat', type=int, default=5, help='Pages rendered per path; the best run is reported.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        instances = [
+            LoanRequest(
+                id=index + 1, borrower_id=index % 1000 + 1, loan_amount=Decimal(1000 + index % 9000).quantize(Decimal('0.01')),
+                loan_period=index % 36 + 1, status='Pending', offer_deadline=now + timedelta(hours=index % 48) if index % 2 else None,
+            )
+            for index in range(options['rows'])
+        ]
+        rows = [{source: getattr(instance, source if source != 'borrower' else 'borrower_id') for source in LOAN_REQUEST_ROW_FIELDS}
+                for instance in instances]
+
+        def model_serializer():
+            return JSONRenderer().render(LoanRequestSerializer(instances, many=True).data)
+
+        def row_serializer():
+            return FastJSONRenderer().render(serialize_loan_request_rows(rows))
+
+        for name, render in [('ModelSerializer + JSONRenderer', model_serializer), ('row serializer + FastJSONRenderer', row_serializer)]:
+            best = min(self.timed(render) for _ in range(options['repeat']))
+            self.stdout.write(f'{name}: {options["rows"] / best:,.0f} rows/s ({best * 1000:.1f} ms per page)')
+        self.stdout.write(f'JSON encoder: {"orjson" if orjson is not None else "stdlib"}')
+
+    def timed(self, render):
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
@@ -0,0 +1,21 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from loan_app.loan_book import ENTITIES, FORMATS, entity_path, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream users, loan requests and loan offers to CSV or JSON Lines files, one file per entity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write users, loan_requests and loan_offers files into.')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        for name, model, fields in ENTITIES:
+            path = entity_path(options['directory'], name, options['format'])
+            written = write_rows(path, options['format'], fields, export_rows(model, fields, options['chunk_size']))
+            self.stdout.write(f'Exported {written} {name} to {path}')
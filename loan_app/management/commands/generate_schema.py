@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from loan_app.schema import write_schema_files
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema once and write it as openapi.json and openapi.yaml for the schema endpoints to serve.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', help='Directory to write the files into (default: LOAN_SCHEMA_DIR).')
+
+    def handle(self, *args, **options):
+        for path in write_schema_files(options['directory']):
+            self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
@@ -0,0 +1,69 @@
+import base64
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from loan_app.benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent GET requests at a running server and report throughput and latency. '
+        'Run it once against the WSGI app (loan_platform.wsgi) and once against the ASGI app '
+        '(loan_platform.asgi) to compare concurrency per process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server.')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request; repeatable. Defaults to the sync and async list endpoints.')
+        parser.add_argument(
+            '--username', action='append', dest='usernames', required=True,
+            help='User to authenticate as; repeatable. Requests are spread over the users so per-user rate limits do not skew the comparison.',
+        )
+        parser.add_argument('--password', required=True, help='Password shared by every --username.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per path.')
+
+    def handle(self, *args, **options):
+        users = [
+            {'Authorization': 'Basic ' + base64.b64encode(f"{username}:{options['password']}".encode()).decode(), 'Accept': 'application/json'}
+            for username in options['usernames']
+        ]
+        paths = options['paths'] or [
+            '/api/loan-requests/', '/api/async/loan-requests/',
+            '/api/loan-offers/', '/api/async/loan-offers/',
+        ]
+
+        for path in paths:
+            url = options['url'].rstrip('/') + path
+
+            def fetch(number):
+                started = time.perf_counter()
+                request = urllib.request.Request(url, headers=users[number % len(users)])
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        response.read()
+                        outcome = 'ok' if response.status < 400 else 'error'
+                except urllib.error.HTTPError as error:
+                    outcome = 'throttled' if error.code == 429 else 'error'
+                except (urllib.error.URLError, ConnectionError):
+                    outcome = 'error'
+                return outcome, time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                results = list(pool.map(fetch, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency for _, latency in results)
+            errors = sum(1 for outcome, _ in results if outcome == 'error')
+            throttled = sum(1 for outcome, _ in results if outcome == 'throttled')
+            self.stdout.write(
+                f"{path}: {len(results) / elapsed:.1f} req/s, "
+                f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+                f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+                f"{errors} errors, {throttled} throttled"
+            )
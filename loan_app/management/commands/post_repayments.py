@@ -0,0 +1,58 @@
+import multiprocessing
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from loan_app.jobs import enqueue
+from loan_app.repayments import DEFAULT_CHUNK_SIZE, partition_offer_ids, post_due_repayments
+
+
+def _post_partition(on, first_id, last_id, chunk_size):
+    post_due_repayments(on, first_id, last_id, chunk_size)
+
+
+class Command(BaseCommand):
+    help = 'Post every repayment installment due on or before a date and complete fully repaid loans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Posting date as YYYY-MM-DD (default: today).')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Loans posted per transaction.')
+        parser.add_argument('--processes', type=int, default=1, help='Processes posting disjoint loan offer id ranges.')
+        parser.add_argument('--enqueue', action='store_true', help='Queue one job per id range for run_workers instead.')
+
+    def handle(self, *args, **options):
+        on = options['date'] or timezone.localdate()
+        partitions = partition_offer_ids(on, max(1, options['processes']))
+
+        if options['enqueue']:
+            for first_id, last_id in partitions:
+                enqueue('post_repayments', {'on': on.isoformat(), 'first_id': first_id, 'last_id': last_id})
+            self.stdout.write(f'Queued {len(partitions)} repayment jobs for {on}')
+            return
+
+        if len(partitions) <= 1:
+            totals = post_due_repayments(on, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Posted {totals['installments']} installments totalling {totals['amount']}; "
+                f"completed {totals['completed']} loans"
+            ))
+            return
+
+        # Children must open their own database connections rather than share the parent's sockets.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_post_partition, args=(on, first_id, last_id, options['chunk_size']))
+            for first_id, last_id in partitions
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        failed = sum(1 for worker in workers if worker.exitcode)
+        if failed:
+            self.stderr.write(f'{failed} of {len(workers)} partitions failed; run the command again to finish them')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Posted repayments due by {on} in {len(workers)} partitions'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from loan_app.portfolio import rebuild_portfolios
+
+
+class Command(BaseCommand):
+    help = 'Recompute every investor portfolio aggregate from the loan offers in one set-based pass.'
+
+    def handle(self, *args, **options):
+        written = rebuild_portfolios()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} investor portfolios'))
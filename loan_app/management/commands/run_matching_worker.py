@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from loan_app.services import auto_accept_expired_requests
+
+
+class Command(BaseCommand):
+    help = 'Periodically accept the best fundable offer of loan requests whose offer deadline has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between passes.')
+        parser.add_argument('--once', action='store_true', help='Run a single pass and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            funded = auto_accept_expired_requests()
+            if funded:
+                self.stdout.write(f'Auto-accepted offers on {funded} loan requests')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
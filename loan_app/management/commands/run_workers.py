@@ -0,0 +1,41 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from loan_app.jobs import work
+
+
+def _worker(once, poll_interval):
+    work(once=once, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers for loan lifecycle transitions (acceptance, completion, repayments).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to run.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is runnable.')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            processed = work(once=options['once'], poll_interval=options['poll_interval'])
+            self.stdout.write(f'Processed {processed} jobs')
+            return
+
+        # Children must open their own database connections rather than share the parent's sockets.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_worker, args=(options['once'], options['poll_interval']), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from loan_app.ledger import materialize_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Materialize balance snapshots from the ledger entries written since the last run.'
+
+    def handle(self, *args, **options):
+        created = materialize_balance_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Created {created} balance snapshots'))
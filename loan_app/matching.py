@@ -0,0 +1,145 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import LoanOffer
+
+OFFER_BOOK_TTL = getattr(settings, 'LOAN_OFFER_BOOK_TTL', 60)
+OFFER_BOOK_SIZE = getattr(settings, 'LOAN_OFFER_BOOK_SIZE', 10000)
+
+
+class OfferBook:
+    """
+    In-process order book of pending offers, one binary heap per loan request.
+
+    Heap entries are (annual_interest_rate, offer_id) so the cheapest offer, and among
+    equal rates the earliest one, sits at the root. A heap is built from the database
+    the first time its request is queried and rebuilt once it is older than `ttl`
+    seconds, which bounds how stale a process can get when other processes take offers.
+    At most `maxsize` heaps are kept; the least recently used ones are evicted.
+
+    Heaps are loaded without holding the lock, so a query for one request never waits on
+    another request's database round trip. Loads of the same request are single-flight:
+    later callers wait for the running load and reuse its heap. Offers added while a heap
+    is loading are merged into it in the same critical section that publishes it, and a
+    load that raced with discard() or clear() is used once but not kept.
+    """
+
+    def __init__(self, ttl=OFFER_BOOK_TTL, maxsize=OFFER_BOOK_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._heaps = OrderedDict()
+        self._pending = {}  # loan_request_id -> entries added while its heap is being loaded
+        self._loaders = {}  # loan_request_id -> [load lock, callers waiting on or holding it]
+        self._version = 0  # Bumped by discard() and clear()
+        self._lock = threading.Lock()
+
+    def _cached(self, loan_request_id):
+        loaded = self._heaps.get(loan_request_id)
+        if loaded is None:
+            return None
+        if time.monotonic() - loaded[0] > self.ttl:
+            del self._heaps[loan_request_id]
+            return None
+        self._heaps.move_to_end(loan_request_id)
+        return loaded[1]
+
+    def _load(self, loan_request_id):
+        entries = list(
+            LoanOffer.objects.filter(loan_request_id=loan_request_id, status='Pending')
+            .values_list('annual_interest_rate', 'id')
+        )
+        heapq.heapify(entries)
+        return entries
+
+    def _heap(self, loan_request_id):
+        with self._lock:
+            heap = self._cached(loan_request_id)
+            if heap is not None:
+                return heap
+            loader = self._loaders.setdefault(loan_request_id, [threading.Lock(), 0])
+            loader[1] += 1
+        try:
+            with loader[0]:
+                return self._load_heap(loan_request_id)
+        finally:
+            with self._lock:
+                loader[1] -= 1
+                if not loader[1]:
+                    del self._loaders[loan_request_id]
+
+    def _load_heap(self, loan_request_id):
+        # Called with the request's load lock held, so this is the only load of this request.
+        with self._lock:
+            heap = self._cached(loan_request_id)
+            if heap is not None:
+                return heap
+            self._pending[loan_request_id] = []
+            version = self._version
+        try:
+            heap = self._load(loan_request_id)
+        except BaseException:
+            with self._lock:
+                del self._pending[loan_request_id]
+            raise
+        with self._lock:
+            for entry in self._pending.pop(loan_request_id):
+                if entry not in heap:
+                    heapq.heappush(heap, entry)
+            if version == self._version:
+                self._heaps[loan_request_id] = (time.monotonic(), heap)
+                self._heaps.move_to_end(loan_request_id)
+                while len(self._heaps) > self.maxsize:
+                    self._heaps.popitem(last=False)
+        return heap
+
+    def add(self, loan_offer):
+        """Push a new offer onto its request's heap if that heap is loaded or being loaded."""
+        entry = (loan_offer.annual_interest_rate, loan_offer.id)
+        with self._lock:
+            loaded = self._heaps.get(loan_offer.loan_request_id)
+            if loaded is not None:
+                heapq.heappush(loaded[1], entry)
+            elif loan_offer.loan_request_id in self._pending:
+                self._pending[loan_offer.loan_request_id].append(entry)
+
+    def discard(self, loan_request_id):
+        with self._lock:
+            self._heaps.pop(loan_request_id, None)
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._heaps.clear()
+            self._version += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heaps)
+
+    def best(self, loan_request_id, k=None):
+        """
+        Return the ids of the k best offers (all of them if k is None), best first, without popping the heap.
+
+        The heap is walked as a tree with a second heap of frontier nodes, so only
+        the k visited nodes and their children are touched: O(k log k) per query.
+        """
+        heap = self._heap(loan_request_id)
+        with self._lock:
+            k = len(heap) if k is None else k
+            result = []
+            frontier = [(heap[0], 0)] if heap else []
+            while frontier and len(result) < k:
+                (_, offer_id), index = heapq.heappop(frontier)
+                result.append(offer_id)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], child))
+            return result
+
+
+offer_book = OfferBook()
+
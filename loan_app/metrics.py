@@ -0,0 +1,118 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+METRICS_SAMPLE_RATE = getattr(settings, 'LOAN_METRICS_SAMPLE_RATE', 1.0)
+
+
+def log_buckets(lowest, highest, per_doubling=4):
+    """Upper bounds growing by a constant ratio, giving every bucket the same relative precision."""
+    ratio = 2 ** (1 / per_doubling)
+    bounds = []
+    bound = lowest
+    while bound < highest:
+        bounds.append(round(bound, 6))
+        bound *= ratio
+    bounds.append(highest)
+    return bounds
+
+
+SECONDS_BUCKETS = log_buckets(0.0001, 60.0)
+COUNT_BUCKETS = log_buckets(1, 1000000, per_doubling=1)
+
+
+class Histogram:
+    """Fixed-bucket histogram; recording a value is a binary search plus an increment."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-route histograms of the request metrics, rendered in Prometheus text format."""
+
+    METRICS = {
+        'loan_http_request_duration_seconds': ('Wall time spent handling the request.', SECONDS_BUCKETS),
+        'loan_db_duration_seconds': ('Time spent executing database queries per request.', SECONDS_BUCKETS),
+        'loan_db_queries': ('Database queries executed per request.', COUNT_BUCKETS),
+        'loan_db_lock_wait_seconds': ('Time spent in SELECT ... FOR UPDATE queries per request.', SECONDS_BUCKETS),
+        'loan_rows_serialized': ('Rows serialized into the response body.', COUNT_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, route, values):
+        """Record one request's values, a dict keyed by metric name."""
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, route))
+                if histogram is None:
+                    histogram = self._histograms[(name, route)] = Histogram(self.METRICS[name][1])
+                histogram.record(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (description, bounds) in self.METRICS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(bounds + [float('inf')], histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{{route="{route}",le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{route="{route}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{route="{route}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Database execute wrapper accumulating query count, query time and lock-wait time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.duration += elapsed
+            if 'FOR UPDATE' in sql:
+                self.lock_wait += elapsed
+
+
+def rows_in(response):
+    """Number of serialized rows in a DRF response: list length, or the length of a page's results."""
+    data = getattr(response, 'data', None)
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return len(data['results'])
+    return 0
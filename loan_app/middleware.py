@@ -0,0 +1,42 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from .metrics import METRICS_SAMPLE_RATE, QueryTimer, registry, rows_in
+
+
+class MetricsMiddleware:
+    """
+    Record per-route latency, database and serialization metrics for a sample of requests.
+
+    Unsampled requests pass straight through; sampled ones install a QueryTimer on
+    every database connection for the duration of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if METRICS_SAMPLE_RATE < 1 and random.random() >= METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        registry.observe(route, {
+            'loan_http_request_duration_seconds': elapsed,
+            'loan_db_duration_seconds': timer.duration,
+            'loan_db_queries': timer.queries,
+            'loan_db_lock_wait_seconds': timer.lock_wait,
+            'loan_rows_serialized': rows_in(response),
+        })
+        return response
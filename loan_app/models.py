@@ -1,16 +1,49 @@
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+LENME_FEE = Decimal('3.00')
 
 
 class LoanUser(AbstractUser):
+    # Opening deposit, credited to the ledger when the user is created. The current balance
+    # is the ledger's: see loan_app.ledger.get_ledger_balance.
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
     def __str__(self):
         return self.username
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.CheckConstraint(check=models.Q(balance__gte=0), name='loan_user_balance_non_negative'),
+        ]
+
+
+class PrincipalPlusFeeField(models.DecimalField):
+    """
+    Loan amount plus the Lenme fee, recomputed whenever the row is written.
+
+    Computed in pre_save so plain saves and bulk_create inserts both keep it in step
+    with loan_amount; QuerySet.update() bypasses it.
+    """
 
-class LoanRequest(models.Model):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_digits', 11)
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = Decimal(model_instance.loan_amount) + LENME_FEE
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class AbstractLoanRequest(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
         ('Accepted', 'Accepted'),
@@ -20,31 +53,231 @@ class LoanRequest(models.Model):
     loan_amount = models.DecimalField(max_digits=10, decimal_places=2)
     loan_period = models.PositiveIntegerField()  # In months
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Pending')
+    offer_deadline = models.DateTimeField(null=True, blank=True)  # Best fundable offer is accepted automatically after this
+    completed_at = models.DateTimeField(null=True, blank=True)
+    principal_plus_fee = PrincipalPlusFeeField(default=0)  # Lower bound of what funding costs an investor at any rate
 
     def __str__(self):
         return f"{self.borrower.username} - Amount: {self.loan_amount} - Period: {self.loan_period} months"
 
+    class Meta:
+        abstract = True
+
+
+class LoanRequest(AbstractLoanRequest):
     class Meta:
         db_table = 'loan_request'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='loan_request_status_id_idx'),
+            models.Index(fields=['borrower', 'status'], name='loan_request_borrower_idx'),
+            models.Index(fields=['status', 'principal_plus_fee', 'id'], name='loan_request_fundable_idx'),
+        ]
 
 
-class LoanOffer(models.Model):
+class AbstractLoanOffer(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
         ('Funded', 'Funded'),
         ('Completed', 'Completed'),
+        ('Rejected', 'Rejected'),
     ]
     investor = models.ForeignKey(LoanUser, on_delete=models.CASCADE)
-    loan_request = models.ForeignKey(LoanRequest, on_delete=models.CASCADE)
     annual_interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Pending')
 
     def __str__(self):
-        return f"Investor: {self.investor.username} - Loan Request: {self.loan_request.id} - Status: {self.status}"
+        return f"Investor: {self.investor.username} - Loan Request: {self.loan_request_id} - Status: {self.status}"
 
     def clean(self):
         if not (0 <= self.annual_interest_rate <= 100):
             raise ValidationError('Annual interest rate must be between 0 and 100.')
 
+    class Meta:
+        abstract = True
+
+
+class LoanOffer(AbstractLoanOffer):
+    loan_request = models.ForeignKey(LoanRequest, on_delete=models.CASCADE)
+
     class Meta:
         db_table = 'loan_offer'
+
+
+class AbstractRepaymentInstallment(models.Model):
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Paid', 'Paid'),
+    ]
+    number = models.PositiveIntegerField()
+    due_date = models.DateField()
+    principal = models.DecimalField(max_digits=10, decimal_places=2)
+    interest = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    remaining_principal = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Pending')
+
+    def __str__(self):
+        return f"Loan Offer: {self.loan_offer_id} - Installment: {self.number} - Due: {self.due_date} - Status: {self.status}"
+
+    class Meta:
+        abstract = True
+        ordering = ['loan_offer', 'number']
+
+
+class RepaymentInstallment(AbstractRepaymentInstallment):
+    loan_offer = models.ForeignKey(LoanOffer, on_delete=models.CASCADE, related_name='installments')
+
+    class Meta(AbstractRepaymentInstallment.Meta):
+        db_table = 'repayment_installment'
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='repayment_installment_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['loan_offer', 'number'], name='repayment_installment_unique_number'),
+        ]
+
+
+# Cold tier: completed loans moved out of the tables above by `manage.py archive_loans`.
+# Rows keep their original ids, so references such as ledger entries stay meaningful.
+
+class ArchivedLoanRequest(AbstractLoanRequest):
+    id = models.BigIntegerField(primary_key=True)
+
+    class Meta:
+        db_table = 'loan_request_archive'
+        indexes = [
+            models.Index(fields=['borrower', 'id'], name='loan_request_archive_user_idx'),
+        ]
+
+
+class ArchivedLoanOffer(AbstractLoanOffer):
+    id = models.BigIntegerField(primary_key=True)
+    loan_request = models.ForeignKey(ArchivedLoanRequest, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'loan_offer_archive'
+        indexes = [
+            models.Index(fields=['investor', 'id'], name='loan_offer_archive_user_idx'),
+        ]
+
+
+class ArchivedRepaymentInstallment(AbstractRepaymentInstallment):
+    id = models.BigIntegerField(primary_key=True)
+    loan_offer = models.ForeignKey(ArchivedLoanOffer, on_delete=models.CASCADE, related_name='installments')
+
+    class Meta(AbstractRepaymentInstallment.Meta):
+        db_table = 'repayment_installment_archive'
+
+
+class LedgerEntry(models.Model):
+    KIND_CHOICES = [
+        ('Deposit', 'Deposit'),
+        ('Funding', 'Funding'),
+        ('Fee', 'Fee'),
+        ('Repayment', 'Repayment'),
+        ('Settlement', 'Settlement'),  # Repayment collected from a borrower outside the platform
+    ]
+    user = models.ForeignKey(LoanUser, on_delete=models.CASCADE, related_name='ledger_entries')
+    # No database constraint: the offer may since have been moved to the archive under the same id.
+    loan_offer = models.ForeignKey(LoanOffer, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True)
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)  # Signed: credits positive, debits negative
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.kind}: {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('Ledger entries are append-only.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError('Ledger entries are append-only.')
+
+    class Meta:
+        db_table = 'ledger_entry'
+        indexes = [
+            models.Index(fields=['user', 'id'], name='ledger_entry_user_id_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    user = models.ForeignKey(LoanUser, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_entry_id = models.BigIntegerField()  # Every ledger entry up to this id is included in balance
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} - Balance: {self.balance} - Up to entry: {self.last_entry_id}"
+
+    class Meta:
+        db_table = 'balance_snapshot'
+        indexes = [
+            models.Index(fields=['user', '-last_entry_id'], name='balance_snapshot_user_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(LoanUser, on_delete=models.CASCADE, null=True, blank=True)
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, default='')  # SHA-256 of the request body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # Null while the first request is in flight
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key} - {self.method} {self.path}"
+
+    class Meta:
+        db_table = 'idempotency_key'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_unique_per_user'),
+            # NULLs never collide in the constraint above, so anonymous keys need their own.
+            models.UniqueConstraint(fields=['key'], condition=models.Q(user__isnull=True), name='idempotency_key_unique_anonymous'),
+        ]
+
+
+class InvestorPortfolio(models.Model):
+    investor = models.OneToOneField(LoanUser, on_delete=models.CASCADE, primary_key=True, related_name='portfolio')
+    funded_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    funded_principal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expected_interest = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Principal plus interest of funded, not yet completed loans
+
+    def __str__(self):
+        return f"{self.investor_id} - Funded: {self.funded_principal} - Outstanding: {self.outstanding}"
+
+    class Meta:
+        db_table = 'investor_portfolio'
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    user = models.ForeignKey(LoanUser, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Job {self.id} - {self.kind} - Status: {self.status}"
+
+    class Meta:
+        db_table = 'job'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
@@ -0,0 +1,111 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class LoanRequestCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the loan request feed.
+
+    Pages are ordered by descending id, so each page is a single index range
+    scan on (status, id) no matter how deep the client has paged.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a composite ordering ending in a unique field, such as ('amount', 'id').
+
+    DRF's CursorPagination positions its cursor on the first ordering field only and
+    steps over rows sharing that value with an OFFSET, so a long run of equal values is
+    paged by scanning and discarding rows. Here the cursor carries the value of every
+    ordering field and a page starts strictly after that row in the full ordering, so no
+    offset is ever needed. Client-supplied offsets are ignored.
+    """
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor is not None else None
+
+        queryset = queryset.order_by(*(self._flip(order) for order in self.ordering) if reverse else self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset.model, current_position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if len(results) > self.page_size else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = current_position is not None, current_position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = current_position is not None, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        return cursor._replace(offset=0) if cursor is not None else None
+
+    @staticmethod
+    def _flip(order):
+        return order[1:] if order.startswith('-') else '-' + order
+
+    def _after(self, model, position, reverse):
+        """
+        Rows strictly past `position` in the (possibly reversed) ordering.
+
+        The comparison is spelled out as (a > A) OR (a = A AND b > B) ..., plus a plain
+        range bound on the leading field so the database can start an index range scan there.
+        """
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        fields, bounds = [], []
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip('-')
+            try:
+                bounds.append(model._meta.get_field(name).to_python(value))
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            fields.append((name, 'lt' if order.startswith('-') != reverse else 'gt'))
+
+        (leading, leading_lookup), leading_bound = fields[0], bounds[0]
+        condition = Q()
+        for i, (name, lookup) in enumerate(fields):
+            equal = {earlier: bound for (earlier, _), bound in zip(fields[:i], bounds)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': bounds[i]})
+        inclusive = {'gt': 'gte', 'lt': 'lte'}[leading_lookup]
+        return Q(**{f'{leading}__{inclusive}': leading_bound}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        return self.position_separator.join(
+            str(instance[order.lstrip('-')] if isinstance(instance, dict) else getattr(instance, order.lstrip('-')))
+            for order in ordering
+        )
+
+
+class FundableLoanRequestCursorPagination(KeysetCursorPagination, LoanRequestCursorPagination):
+    """
+    Keyset pagination for fundable loan requests, cheapest to fund first.
+
+    Follows the (status, principal_plus_fee, id) index: every page, including runs of
+    requests with the same principal_plus_fee, is one range scan from the cursor's row.
+    """
+    ordering = ('principal_plus_fee', 'id')
@@ -0,0 +1,78 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import InvestorPortfolio
+
+
+def _apply(investor_id, **changes):
+    """Add `changes` to the investor's aggregate row, creating it on first use."""
+    InvestorPortfolio.objects.get_or_create(investor_id=investor_id)
+    InvestorPortfolio.objects.filter(investor_id=investor_id).update(
+        **{field: F(field) + delta for field, delta in changes.items()}
+    )
+
+
+def record_funding(investor_id, principal, interest):
+    _apply(
+        investor_id,
+        funded_count=1,
+        funded_principal=principal,
+        expected_interest=interest,
+        outstanding=principal + interest,
+    )
+
+
+def record_completions(completions):
+    """Apply many (investor_id, principal, interest) completions with one update per investor."""
+    totals = {}
+    for investor_id, principal, interest in completions:
+        count, outstanding = totals.get(investor_id, (0, 0))
+        totals[investor_id] = (count + 1, outstanding + principal + interest)
+    for investor_id, (count, outstanding) in totals.items():
+        _apply(investor_id, completed_count=count, outstanding=-outstanding)
+
+
+# One row per funded offer of one tier; interest is the total of the repayment schedule,
+# as recorded by accept_loan_offer.
+FUNDED_OFFERS_SQL = """
+    SELECT lo.investor_id, lo.status, lr.loan_amount, COALESCE(ri.interest, 0) AS interest
+    FROM {offers} lo
+    JOIN {requests} lr ON lr.id = lo.loan_request_id
+    LEFT JOIN (
+        SELECT loan_offer_id, SUM(interest) AS interest FROM {installments} GROUP BY loan_offer_id
+    ) ri ON ri.loan_offer_id = lo.id
+    WHERE lo.status IN ('Accepted', 'Completed')
+"""
+
+# Archived loans still count towards the totals, so both tiers are read.
+REBUILD_SQL = """
+    INSERT INTO investor_portfolio
+        (investor_id, funded_count, completed_count, funded_principal, expected_interest, outstanding)
+    SELECT
+        investor_id,
+        COUNT(*),
+        SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END),
+        SUM(loan_amount),
+        SUM(interest),
+        SUM(CASE WHEN status = 'Accepted' THEN loan_amount + interest ELSE 0 END)
+    FROM ({hot} UNION ALL {archived}) funded_offers
+    GROUP BY investor_id
+""".format(
+    hot=FUNDED_OFFERS_SQL.format(offers='loan_offer', requests='loan_request', installments='repayment_installment'),
+    archived=FUNDED_OFFERS_SQL.format(
+        offers='loan_offer_archive', requests='loan_request_archive', installments='repayment_installment_archive',
+    ),
+)
+
+
+def rebuild_portfolios():
+    """
+    Recompute every investor aggregate from the live and archived loan offers in one INSERT ... SELECT.
+
+    Returns the number of portfolios written.
+    """
+    with transaction.atomic():
+        InvestorPortfolio.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL)
+    return InvestorPortfolio.objects.count()
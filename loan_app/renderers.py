@@ -0,0 +1,101 @@
+import json
+import math
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder as DRFJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib C encoder is used without it.
+    orjson = None
+
+_drf_encoder = DRFJSONEncoder()
+
+
+def _default(obj):
+    """Encode Decimals the way DecimalField would and everything else the way DRF's encoder does."""
+    if isinstance(obj, Decimal):
+        return format(obj, 'f') if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    return _drf_encoder.default(obj)
+
+
+_stdlib_encoders = {
+    strict: json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False, allow_nan=not strict, default=_default)
+    for strict in (True, False)
+}
+
+
+def _check_finite(data):
+    """Raise ValueError on NaN or infinite floats, which orjson would silently write as null."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise ValueError('Out of range float values are not JSON compliant: ' + repr(value))
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+
+
+def dumps(data):
+    """
+    Encode `data` as compact UTF-8 JSON bytes with orjson when installed, else the stdlib C encoder.
+
+    As in DRF's JSONRenderer, NaN and infinities are rejected under STRICT_JSON, and U+2028
+    and U+2029 are escaped so the output is also valid JavaScript.
+    """
+    if orjson is not None:
+        if api_settings.STRICT_JSON:
+            _check_finite(data)
+        encoded = orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    else:
+        encoded = _stdlib_encoders[api_settings.STRICT_JSON].encode(data).encode()
+    return encoded.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    application/json renderer for large list pages.
+
+    Produces the same compact output as DRF's JSONRenderer but skips its
+    per-request encoder setup and uses orjson when it is installed. Decimal
+    values are encoded as DecimalField would represent them, so lean row
+    serializers can pass them through unconverted; orjson writes float
+    exponents in its own spelling (1e-7 rather than 1e-07). Indented requests
+    (`Accept: application/json; indent=4`), and projects that turn off
+    UNICODE_JSON or COMPACT_JSON, fall back to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            self.get_indent(accepted_media_type or '', renderer_context or {})
+            or not api_settings.UNICODE_JSON or not api_settings.COMPACT_JSON
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+API_RENDERER_CLASSES = [FastJSONRenderer] + [
+    renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if renderer is not JSONRenderer
+]
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Advertises application/x-ndjson during content negotiation.
+
+    Views that accept it stream their rows themselves with a StreamingHttpResponse;
+    this renderer only covers responses that are not streamed, such as errors.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return dumps(data) + b'\n'
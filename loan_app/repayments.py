@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .amortization import schedule_interest
+from .cache import invalidate_loan_feed
+from .ledger import with_ledger_balance
+from .models import LENME_FEE, LedgerEntry, LoanOffer, LoanRequest, LoanUser, RepaymentInstallment
+from .portfolio import record_completions
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def due_installments(on):
+    """Pending installments of funded loans that fall due on or before `on`."""
+    return RepaymentInstallment.objects.filter(status='Pending', due_date__lte=on, loan_offer__status='Accepted')
+
+
+def partition_offer_ids(on, partitions):
+    """
+    Split the ids of loan offers with due installments into `partitions` contiguous ranges.
+
+    Returns a list of (first_id, last_id) pairs, both inclusive, that together cover every
+    due loan offer; each range can be posted by a separate process.
+    """
+    bounds = due_installments(on).aggregate(first=Min('loan_offer_id'), last=Max('loan_offer_id'))
+    if bounds['first'] is None:
+        return []
+    first, last = bounds['first'], bounds['last']
+    step = max(1, -(-(last - first + 1) // partitions))
+    return [(start, min(start + step - 1, last)) for start in range(first, last + 1, step)]
+
+
+def post_installments(offer_ids, on):
+    """
+    Post the installments of the given loan offers due on or before `on`, or all of them if `on` is None.
+
+    Must run inside a transaction. An investor pays for a loan when its first installment
+    is posted: the principal and the Lenme fee are debited and the principal is credited to
+    the borrower before any repayment is made, and loans whose investor cannot cover that
+    are left for a later run. Each installment moves money from the borrower to the
+    investor: it is debited from the borrower's balance, and whatever that balance does not
+    cover is collected outside the platform and recorded as a Settlement credit first, so
+    no balance is ever credited without a matching debit or an external payment.
+
+    Users' ledger balances are read in the same query that locks their rows, the installments
+    are marked Paid with one UPDATE and the ledger entries are appended with one INSERT.
+    Loans with no installment left to pay are completed. Returns (ids of posted installments,
+    amount repaid by offer id, completed offers, ids of offers whose investor could not fund them).
+    """
+    # Investors and borrowers first, in id order, then the offers, so two posting runs over
+    # loans sharing users always lock them in the same order.
+    accepted = LoanOffer.objects.filter(pk__in=offer_ids, status='Accepted')
+    users = LoanUser.objects.select_for_update().filter(
+        Q(pk__in=accepted.values('investor_id')) | Q(pk__in=accepted.values('loan_request__borrower_id'))
+    )
+    balances = dict(with_ledger_balance(users).order_by('pk').values_list('pk', 'ledger_balance'))
+    offers = list(
+        LoanOffer.objects.select_related('loan_request')
+        .select_for_update(of=('self',))
+        .filter(pk__in=offer_ids, status='Accepted', investor_id__in=balances, loan_request__borrower_id__in=balances)
+        .order_by('pk')
+    )
+    installments = RepaymentInstallment.objects.filter(loan_offer_id__in=[offer.pk for offer in offers], status='Pending')
+    if on is not None:
+        installments = installments.filter(due_date__lte=on)
+    due_by_offer = {}
+    for pk, offer_id, number, amount in installments.values_list('id', 'loan_offer_id', 'number', 'amount'):
+        due_by_offer.setdefault(offer_id, []).append((pk, number, amount))
+
+    paid, entries, repaid, unfunded = [], [], {}, []
+    for offer in offers:
+        due = due_by_offer.get(offer.pk)
+        if not due:
+            continue
+        investor_id, borrower_id = offer.investor_id, offer.loan_request.borrower_id
+        if any(number == 1 for _, number, _ in due):
+            principal = offer.loan_request.loan_amount
+            if balances[investor_id] < principal + LENME_FEE:
+                unfunded.append(offer.pk)
+                continue
+            balances[investor_id] -= principal + LENME_FEE
+            balances[borrower_id] += principal
+            entries += [
+                (investor_id, offer.pk, 'Funding', -principal),
+                (investor_id, offer.pk, 'Fee', -LENME_FEE),
+                (borrower_id, offer.pk, 'Funding', principal),
+            ]
+        amount = sum(amount for _, _, amount in due)
+        shortfall = amount - min(max(balances[borrower_id], Decimal('0.00')), amount)
+        if shortfall:
+            entries.append((borrower_id, offer.pk, 'Settlement', shortfall))
+        balances[borrower_id] += shortfall - amount
+        balances[investor_id] += amount
+        entries += [(borrower_id, offer.pk, 'Repayment', -amount), (investor_id, offer.pk, 'Repayment', amount)]
+        repaid[offer.pk] = amount
+        paid += [pk for pk, _, _ in due]
+    if not paid:
+        return paid, repaid, [], unfunded
+
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(user_id=user_id, loan_offer_id=offer_id, kind=kind, amount=amount)
+        for user_id, offer_id, kind, amount in entries
+    ])
+    RepaymentInstallment.objects.filter(pk__in=paid).update(status='Paid')
+
+    # Paying off whole schedules leaves nothing outstanding.
+    outstanding = set() if on is None else set(
+        RepaymentInstallment.objects.filter(loan_offer_id__in=repaid, status='Pending')
+        .values_list('loan_offer_id', flat=True)
+    )
+    completed = [offer for offer in offers if offer.pk in repaid and offer.pk not in outstanding]
+    if completed:
+        LoanOffer.objects.filter(pk__in=[offer.pk for offer in completed]).update(status='Completed')
+        LoanRequest.objects.filter(pk__in=[offer.loan_request_id for offer in completed]).update(
+            status='Completed', completed_at=timezone.now(),
+        )
+        record_completions([
+            (
+                offer.investor_id, offer.loan_request.loan_amount,
+                schedule_interest(offer.loan_request.loan_amount, offer.annual_interest_rate, offer.loan_request.loan_period),
+            )
+            for offer in completed
+        ])
+        invalidate_loan_feed()
+    return paid, repaid, completed, unfunded
+
+
+def post_repayment_chunk(offer_ids, on):
+    """
+    Post every due installment of the given loan offers in one transaction.
+
+    See post_installments. Returns (installments posted, amount posted, loans completed).
+    """
+    with transaction.atomic():
+        paid, repaid, completed, _ = post_installments(offer_ids, on)
+    return len(paid), sum(repaid.values(), Decimal('0.00')), len(completed)
+
+
+def post_due_repayments(on=None, first_id=None, last_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Post every installment due on or before `on` (default today), `chunk_size` loans at a time.
+
+    `first_id` and `last_id` restrict the run to an inclusive range of loan offer ids, so
+    several processes can post disjoint partitions concurrently. Chunks are walked by offer
+    id and each commits on its own, so an interrupted run can simply be started again.
+    Returns a dict of totals.
+    """
+    on = on or timezone.localdate()
+    installments, amount, completed = 0, Decimal('0.00'), 0
+    queryset = due_installments(on)
+    if last_id is not None:
+        queryset = queryset.filter(loan_offer_id__lte=last_id)
+    after = first_id - 1 if first_id is not None else 0
+    while True:
+        offer_ids = list(
+            queryset.filter(loan_offer_id__gt=after)
+            .order_by('loan_offer_id')
+            .values_list('loan_offer_id', flat=True)
+            .distinct()[:chunk_size]
+        )
+        if not offer_ids:
+            break
+        posted = post_repayment_chunk(offer_ids, on)
+        installments, amount, completed = installments + posted[0], amount + posted[1], completed + posted[2]
+        after = offer_ids[-1]
+    return {'installments': installments, 'amount': str(amount), 'completed': completed}
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="Loan API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+SCHEMA_DIR = getattr(settings, 'LOAN_SCHEMA_DIR', getattr(settings, 'BASE_DIR', os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+SCHEMA_MAX_AGE = getattr(settings, 'LOAN_SCHEMA_MAX_AGE', 300)
+SCHEMA_FORMATS = {
+    'json': ('openapi.json', 'application/json', lambda: OpenAPICodecJson(validators=[])),
+    'yaml': ('openapi.yaml', 'application/yaml', lambda: OpenAPICodecYaml(validators=[])),
+}
+
+
+def schema_path(fmt, directory=None):
+    return os.path.join(directory or SCHEMA_DIR, SCHEMA_FORMATS[fmt][0])
+
+
+def generate_schema():
+    """Introspect every API endpoint and return the public OpenAPI document."""
+    return OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+
+
+def encode_schema(schema, fmt):
+    return SCHEMA_FORMATS[fmt][2]().encode(schema)
+
+
+def write_schema_files(directory=None):
+    """
+    Generate the schema once and write it to disk in every supported format.
+
+    Each file is written to a uniquely named temporary file in the same directory and
+    renamed into place, so a server reading them never sees a partial document and
+    concurrent runs never write into each other's file. Returns the written paths.
+    """
+    schema = generate_schema()
+    paths = []
+    for fmt in SCHEMA_FORMATS:
+        path = schema_path(fmt, directory)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.openapi-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode_schema(schema, fmt))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        paths.append(path)
+    return paths
+
+
+class SchemaFiles:
+    """
+    The rendered schema documents and their ETags, loaded once per process.
+
+    Documents are read from the files written by `manage.py generate_schema` at build or
+    deploy time. If they are missing (for example in development) the schema is generated
+    in memory on first use instead; requests never write to the schema directory, and
+    introspection happens at most once per process either way.
+    """
+
+    def __init__(self):
+        self._documents = {}
+        self._schema = None
+        self._lock = threading.Lock()
+
+    def _read(self, fmt):
+        try:
+            with open(schema_path(fmt), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning('%s is missing, generating the schema in memory; run manage.py generate_schema', schema_path(fmt))
+            if self._schema is None:
+                self._schema = generate_schema()
+            return encode_schema(self._schema, fmt)
+
+    def get(self, fmt):
+        with self._lock:
+            if fmt not in self._documents:
+                content = self._read(fmt)
+                self._documents[fmt] = (content, '"%s"' % hashlib.sha256(content).hexdigest())
+            return self._documents[fmt]
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._schema = None
+
+
+schema_files = SchemaFiles()
+
+
+def _format(request, format=None):
+    fmt = (format or request.GET.get('format') or 'json').lstrip('.')
+    return 'json' if fmt == 'openapi' else fmt
+
+
+def _etag(request, format=None):
+    fmt = _format(request, format)
+    return schema_files.get(fmt)[1] if fmt in SCHEMA_FORMATS else None
+
+
+@require_safe
+@condition(etag_func=_etag)
+def schema_file(request, format=None):
+    """
+    Serve the pregenerated OpenAPI document as JSON or YAML.
+
+    Responses carry an ETag, so a client sending If-None-Match gets 304 Not Modified.
+    """
+    fmt = _format(request, format)
+    if fmt not in SCHEMA_FORMATS:
+        raise Http404('Unknown schema format')
+    content, _ = schema_files.get(fmt)
+    response = HttpResponse(content, content_type=SCHEMA_FORMATS[fmt][1])
+    patch_cache_control(response, public=True, max_age=SCHEMA_MAX_AGE)
+    return response
+
+
+def static_spec(ui_view):
+    """Answer the spec requests of a Swagger UI or ReDoc page (`?format=openapi`) from the pregenerated file."""
+    @wraps(ui_view)
+    def view(request, *args, **kwargs):
+        if request.GET.get('format') == 'openapi':
+            return schema_file(request)
+        return ui_view(request, *args, **kwargs)
+    return view
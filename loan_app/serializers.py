@@ -1,5 +1,9 @@
-from rest_framework import serializers
-from .models import LoanRequest, LoanOffer , LoanUser
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .amortization import MAX_LOAN_PERIOD
+from .models import LoanRequest, LoanOffer , LoanUser, RepaymentInstallment, InvestorPortfolio, Job
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -12,7 +16,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class LoanRequestCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = LoanRequest
-        fields = ['loan_amount', 'loan_period']
+        fields = ['loan_amount', 'loan_period', 'offer_deadline']
+        extra_kwargs = {'loan_period': {'min_value': 1, 'max_value': MAX_LOAN_PERIOD}}
 
 class LoanRequestSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,7 +26,130 @@ class LoanRequestSerializer(serializers.ModelSerializer):
 
 
 
+def _row_converter(field):
+    # Values read from the database already have the representation these fields produce
+    # (DecimalField values come back quantized), so they are passed through unconverted.
+    if isinstance(field, (serializers.IntegerField, serializers.CharField, serializers.ChoiceField,
+                          serializers.BooleanField, serializers.PrimaryKeyRelatedField)):
+        return None
+    if (isinstance(field, serializers.DecimalField) and not field.localize and not field.normalize_output
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) == api_settings.COERCE_DECIMAL_TO_STRING):
+        return None
+    if (isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+            and str(getattr(field, 'format', api_settings.DATETIME_FORMAT)).lower() == ISO_8601):
+        def iso_datetime(value, tz):
+            if tz is None or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return iso_datetime
+    return lambda value, tz: field.to_representation(value)
+
+
+def compile_row_serializer(serializer_class):
+    """
+    Precompile a flat read-only ModelSerializer into a function over `values()` rows.
+
+    Returns `(sources, serialize_rows)`: query `.values(*sources)` and `serialize_rows(rows)`
+    gives the serializer's representation of those rows, without building model instances
+    or running field introspection per row. Decimal values are left as Decimal for
+    FastJSONRenderer to encode, and the current time zone is looked up once per call
+    rather than once per datetime.
+    """
+    fields = [(name, field) for name, field in serializer_class().fields.items() if not field.write_only]
+    sources = tuple(field.source for _, field in fields)
+    plan = tuple((name, field.source, _row_converter(field)) for name, field in fields)
+
+    def serialize_rows(rows):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [
+            {
+                name: row[source] if convert is None or row[source] is None else convert(row[source], tz)
+                for name, source, convert in plan
+            }
+            for row in rows
+        ]
+
+    return sources, serialize_rows
+
+
+LOAN_REQUEST_ROW_FIELDS, serialize_loan_request_rows = compile_row_serializer(LoanRequestSerializer)
+
+
 class LoanOfferSerializer(serializers.ModelSerializer):
     class Meta:
         model = LoanOffer
         fields = ['annual_interest_rate' , "loan_request"]
+
+
+
+class LoanUserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanUser
+        fields = ['id', 'username']
+
+
+class LoanRequestSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanRequest
+        fields = ['id', 'borrower', 'loan_amount', 'loan_period', 'status']
+
+
+class LoanOfferDetailSerializer(serializers.ModelSerializer):
+    investor = LoanUserSummarySerializer(read_only=True)
+    loan_request = LoanRequestSummarySerializer(read_only=True)
+
+    class Meta:
+        model = LoanOffer
+        fields = ['id', 'investor', 'loan_request', 'annual_interest_rate', 'status']
+
+
+
+LOAN_OFFER_ROW_FIELDS = (
+    'id', 'annual_interest_rate', 'status',
+    'investor_id', 'investor__username',
+    'loan_request_id', 'loan_request__borrower_id', 'loan_request__loan_amount',
+    'loan_request__loan_period', 'loan_request__status',
+)
+
+
+def serialize_loan_offer_row(row):
+    """Build the LoanOfferDetailSerializer representation from a LOAN_OFFER_ROW_FIELDS values_list row."""
+    (offer_id, rate, offer_status, investor_id, username,
+     loan_request_id, borrower_id, loan_amount, loan_period, request_status) = row
+    return {
+        'id': offer_id,
+        'investor': {'id': investor_id, 'username': username},
+        'loan_request': {
+            'id': loan_request_id,
+            'borrower': borrower_id,
+            'loan_amount': loan_amount,
+            'loan_period': loan_period,
+            'status': request_status,
+        },
+        'annual_interest_rate': rate,
+        'status': offer_status,
+    }
+
+
+class LoanOfferBatchItemSerializer(serializers.Serializer):
+    loan_request = serializers.IntegerField()
+    annual_interest_rate = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100)
+
+
+class RepaymentInstallmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RepaymentInstallment
+        fields = ['number', 'due_date', 'principal', 'interest', 'amount', 'remaining_principal', 'status']
+
+
+class PortfolioSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InvestorPortfolio
+        fields = ['funded_count', 'completed_count', 'funded_principal', 'expected_interest', 'outstanding']
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'attempts', 'result', 'error', 'created_at']
@@ -0,0 +1,204 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef, Q, Value
+from django.utils import timezone
+
+from .amortization import build_installments, check_loan_period
+from .cache import invalidate_loan_feed
+from .ledger import get_ledger_balance
+from .matching import offer_book
+from .models import LENME_FEE, LoanRequest, LoanOffer, RepaymentInstallment
+from .portfolio import record_funding
+from .repayments import post_installments
+
+CENT = Decimal('0.01')
+
+
+class FundingError(Exception):
+    """Raised when a loan offer cannot be accepted or completed."""
+
+
+class OutbidError(FundingError):
+    """Raised when an offer accepted as the best one is no longer the best pending offer."""
+
+
+def loan_interest(loan_amount, annual_interest_rate, loan_period):
+    interest = Decimal(loan_amount) * Decimal(annual_interest_rate) / 100 * loan_period / 12
+    return interest.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def calculate_loan_interest(loan_offer):
+    loan_request = loan_offer.loan_request
+    return loan_interest(loan_request.loan_amount, loan_offer.annual_interest_rate, loan_request.loan_period)
+
+
+def calculate_total_loan_amount(loan_offer):
+    return Decimal(loan_offer.loan_request.loan_amount) + calculate_loan_interest(loan_offer) + LENME_FEE
+
+
+def fundable_loan_requests(investor, annual_interest_rate, balance):
+    """
+    Pending loan requests, other than the investor's own, that `balance` can fund at `annual_interest_rate`.
+
+    The indexed principal_plus_fee <= balance range discards everything the investor cannot
+    afford at any rate; the remaining rows are checked exactly against calculate_total_loan_amount,
+    scaled by 1200 so no division is needed: rounded interest fits into the remaining balance
+    exactly when loan_amount * loan_period * rate < (balance - principal_plus_fee) * 1200 + 6.
+    """
+    decimal = DecimalField(max_digits=30, decimal_places=4)
+    return LoanRequest.objects.filter(status='Pending', principal_plus_fee__lte=balance).exclude(borrower=investor).alias(
+        scaled_interest=ExpressionWrapper(F('loan_amount') * F('loan_period') * Value(annual_interest_rate), output_field=decimal),
+        scaled_headroom=ExpressionWrapper((Value(balance) - F('principal_plus_fee')) * 1200 + 6, output_field=decimal),
+    ).filter(scaled_interest__lt=F('scaled_headroom'))
+
+
+def register_user(serializer, password_hash):
+    """
+    Create the user from a validated UserRegistrationSerializer in a single insert.
+
+    `password_hash` is the already encoded password, so no hashing happens here. The
+    opening balance is recorded as a deposit by the post_save signal, in the same transaction.
+    """
+    with transaction.atomic():
+        return serializer.save(password=password_hash)
+
+
+def lock_loan_offer(**lookups):
+    """
+    Fetch a loan offer together with its investor and loan request, locking all three rows.
+
+    The rows are locked by a single SELECT ... FOR UPDATE, so concurrent acceptances take
+    the investor, offer and request locks in the same statement and cannot deadlock
+    against each other. Raises LoanOffer.DoesNotExist when no offer matches.
+    """
+    return (
+        LoanOffer.objects
+        .select_related('investor', 'loan_request')
+        .select_for_update(of=('investor', 'self', 'loan_request'))
+        .get(**lookups)
+    )
+
+
+def accept_loan_offer(pk, borrower, passed_over=None):
+    """
+    Accept a pending loan offer on one of the borrower's requests and fund the loan.
+
+    Competing pending offers on the same request are rejected in the same transaction
+    and the repayment schedule is generated. Raises LoanOffer.DoesNotExist if the offer
+    is not a pending offer of this borrower and FundingError if it cannot be funded.
+    The investor's portfolio aggregate is updated in the same transaction.
+
+    With `passed_over`, the ids of better offers already found unfundable, the offer must
+    be the best other pending offer on its request by rate then age; OutbidError is raised
+    otherwise, so a stale in-process offer book cannot pick a worse offer.
+    """
+    with transaction.atomic():
+        loan_offer = lock_loan_offer(pk=pk, loan_request__borrower=borrower, status='Pending')
+        if passed_over is not None:
+            rate = loan_offer.annual_interest_rate
+            better = LoanOffer.objects.filter(
+                Q(annual_interest_rate__lt=rate) | Q(annual_interest_rate=rate, pk__lt=loan_offer.pk),
+                loan_request_id=loan_offer.loan_request_id, status='Pending',
+            ).exclude(pk__in=passed_over)
+            if better.exists():
+                raise OutbidError('A better offer is pending on this loan request')
+        try:
+            check_loan_period(loan_offer.loan_request.loan_period)
+        except ValueError as e:
+            raise FundingError(str(e))
+        total_loan_amount = calculate_total_loan_amount(loan_offer)
+
+        if get_ledger_balance(loan_offer.investor) < total_loan_amount:
+            raise FundingError('Investor does not have sufficient balance')
+
+        # The status filters make these updates safe even where row locks are unavailable:
+        # only one transaction can move the request out of Pending.
+        if not LoanRequest.objects.filter(pk=loan_offer.loan_request_id, status='Pending').update(status='Funded'):
+            raise FundingError('Loan request has already been funded')
+        LoanOffer.objects.filter(pk=loan_offer.pk).update(status='Accepted')
+        LoanOffer.objects.filter(loan_request_id=loan_offer.loan_request_id, status='Pending').exclude(pk=loan_offer.pk).update(status='Rejected')
+
+        loan_offer.status = 'Accepted'
+        loan_offer.loan_request.status = 'Funded'
+        installments = RepaymentInstallment.objects.bulk_create(build_installments([loan_offer], timezone.localdate()))
+        record_funding(loan_offer.investor_id, loan_offer.loan_request.loan_amount, sum(row.interest for row in installments))
+        invalidate_loan_feed()
+        loan_request_id = loan_offer.loan_request_id
+        transaction.on_commit(lambda: offer_book.discard(loan_request_id))
+    return loan_offer
+
+
+def complete_loan_offer(pk, investor):
+    """
+    Complete an accepted loan offer by paying off every installment still pending.
+
+    This is the repayment run of post_installments applied to the whole remaining schedule:
+    if no installment has been posted yet, the investor pays the principal and the fee
+    first, and the borrower then repays the remaining scheduled principal and interest to
+    the investor. The investor's debit is checked against the ledger balance while the
+    investor's row is locked, so concurrent completions against the same investor can never
+    drive the balance negative. Raises LoanOffer.DoesNotExist if the offer is not an
+    accepted offer of this investor and FundingError if the investor cannot fund the loan.
+    """
+    with transaction.atomic():
+        loan_offer = (
+            LoanOffer.objects.select_related('loan_request')
+            .annotate(scheduled=Exists(RepaymentInstallment.objects.filter(loan_offer=OuterRef('pk'))))
+            .get(pk=pk, investor=investor, status='Accepted')
+        )
+        if not loan_offer.scheduled:
+            # Accepted before schedules were generated: schedule it from today, as import_loans does.
+            RepaymentInstallment.objects.bulk_create(build_installments([loan_offer], timezone.localdate()))
+        _, _, completed, unfunded = post_installments([loan_offer.pk], None)
+        if unfunded:
+            raise FundingError('Investor does not have sufficient balance')
+        if not completed:
+            # Another transaction completed the loan between the read and the lock.
+            raise LoanOffer.DoesNotExist('Loan offer is no longer accepted')
+
+        loan_offer.status = 'Completed'
+        loan_offer.loan_request.status = 'Completed'
+    return loan_offer
+
+
+def auto_accept_expired_requests(now=None):
+    """
+    Accept the best fundable offer of every pending request whose offer deadline has passed.
+
+    Offers are tried best first from the offer book; an offer the investor can no longer
+    fund is skipped in favour of the next one. Each acceptance re-checks the ranking
+    against the database, and a request whose cached ranking turns out to be stale is
+    ranked again from the database. Requests without any pending offer are not looked at,
+    so they do not reload the offer book on every pass. Returns the number of loan
+    requests funded.
+    """
+    now = now or timezone.now()
+    expired = LoanRequest.objects.filter(
+        Exists(LoanOffer.objects.filter(loan_request=OuterRef('pk'), status='Pending')),
+        status='Pending', offer_deadline__lte=now,
+    ).values_list('id', 'borrower_id')
+    funded = 0
+    for loan_request_id, borrower_id in expired:
+        if accept_best_offer(loan_request_id, borrower_id):
+            funded += 1
+    return funded
+
+
+def accept_best_offer(loan_request_id, borrower_id, reloads=1):
+    """Accept the best fundable pending offer on a loan request; return whether one was accepted."""
+    passed_over = []
+    for offer_id in offer_book.best(loan_request_id):
+        try:
+            accept_loan_offer(offer_id, borrower_id, passed_over=passed_over)
+        except OutbidError:
+            if not reloads:
+                return False
+            # Another process added a better offer this book has not seen yet.
+            offer_book.discard(loan_request_id)
+            return accept_best_offer(loan_request_id, borrower_id, reloads - 1)
+        except (LoanOffer.DoesNotExist, FundingError):
+            passed_over.append(offer_id)
+            continue
+        return True
+    return False
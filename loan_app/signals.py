@@ -0,0 +1,31 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import principals
+from .cache import invalidate_loan_feed
+from .ledger import record_entries
+from .models import LoanUser, LoanRequest, LoanOffer
+
+
+@receiver([post_save, post_delete], sender=LoanRequest)
+def loan_request_changed(sender, **kwargs):
+    invalidate_loan_feed()
+
+
+@receiver([post_save, post_delete], sender=LoanOffer)
+def loan_offer_changed(sender, instance, **kwargs):
+    # Only offers that have moved past Pending can change what the feed shows.
+    if instance.status != 'Pending':
+        invalidate_loan_feed()
+
+
+@receiver([post_save, post_delete], sender=LoanUser)
+def loan_user_changed(sender, instance, **kwargs):
+    principals.discard(instance.pk)
+
+
+@receiver(post_save, sender=LoanUser)
+def record_opening_balance(sender, instance, created, raw=False, **kwargs):
+    # The ledger is the balance, so a user created with money gets it as a deposit.
+    if created and instance.balance and not raw:
+        record_entries(instance, [('Deposit', instance.balance)])
@@ -1,8 +1,59 @@
-from django.test import TestCase
-from rest_framework.test import APIClient
+import base64
+import io
+import os
+import shutil
+import tempfile
+import json
+import random
+import threading
+import time
+from django.test import TestCase, TransactionTestCase, AsyncClient, modify_settings, override_settings
+from django.conf import settings
+from unittest import skipUnless
+from asgiref.sync import sync_to_async
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework import status
-from .models import LoanUser , LoanRequest, LoanOffer
+from .models import LoanUser , LoanRequest, LoanOffer, RepaymentInstallment, LedgerEntry, BalanceSnapshot, IdempotencyKey, InvestorPortfolio, Job, ArchivedLoanRequest, ArchivedLoanOffer, ArchivedRepaymentInstallment
+from .cache import get_feed_cache, feed_cache_stats
+from .ledger import get_ledger_balance, materialize_balance_snapshots, record_entries, with_ledger_balance
+from django.core.exceptions import ValidationError
 from django.urls import reverse
+from django.core.management import CommandError, call_command
+from datetime import date, timedelta
+from decimal import Decimal
+from .amortization import MAX_LOAN_PERIOD, add_months, amortization_schedule, monthly_payment, schedule_interest
+from django.db import connection, router, transaction, DatabaseError, IntegrityError, OperationalError
+from django.db.models import F, Sum
+from .services import accept_loan_offer, complete_loan_offer, calculate_total_loan_amount, fundable_loan_requests, auto_accept_expired_requests, FundingError, OutbidError
+from .matching import OfferBook, offer_book
+from .metrics import Histogram, registry as metrics_registry
+from .authentication import principals
+from .throttling import CONCURRENCY_LIMITS, RATE_LIMITS as THROTTLE_RATE_LIMITS, ConcurrencyLimiter, TokenBucketStore, admission_control, buckets, concurrency_limiter
+from .benchmark import percentile, seed_database
+from .loan_book import Checkpoint
+from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from .renderers import FastJSONRenderer, orjson
+from .schema import generate_schema, schema_files, write_schema_files
+from .db_routers import read_database
+from .serializers import LOAN_REQUEST_ROW_FIELDS, LoanRequestSerializer, serialize_loan_request_rows
+from .idempotency import TTLCache, _fingerprint, purge_expired_keys, recent_responses
+from .jobs import JOB_HANDLERS, claim_job, enqueue, work
+from .repayments import partition_offer_ids, post_due_repayments, post_repayment_chunk
+from .archive import archive_loans
+from .hashing import BoundedPasswordHasher, HasherSaturated, password_hasher
+from unittest import mock
+from django.contrib.auth.hashers import check_password
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+
+def set_balance(user, amount):
+    """Bring a user's ledger balance to `amount`, as if the difference had been deposited or spent."""
+    difference = Decimal(amount) - get_ledger_balance(user)
+    record_entries(user, [('Deposit' if difference > 0 else 'Funding', difference)])
 
 class AuthenticationTestCase(TestCase):
     def setUp(self):
@@ -31,6 +82,205 @@ class AuthenticationTestCase(TestCase):
 
 
 
+    def test_registration_inserts_hashed_user_once(self):
+        registration_data = {'username': 'hashed', 'password': 'testpassword', 'email': 'hashed@example.com'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/register/', registration_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sum(1 for query in queries if query['sql'].startswith('INSERT INTO "loan_app_loanuser"')), 1)
+        self.assertFalse(any(query['sql'].startswith(f'UPDATE "{LoanUser._meta.db_table}"') for query in queries))
+        self.assertTrue(LoanUser.objects.get(username='hashed').check_password('testpassword'))
+
+    def test_registration_sheds_load_when_hasher_saturated(self):
+        registration_data = {'username': 'shed', 'password': 'testpassword', 'email': 'shed@example.com'}
+        with mock.patch.object(password_hasher, 'submit', side_effect=HasherSaturated):
+            response = self.client.post('/api/register/', registration_data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(LoanUser.objects.filter(username='shed').exists())
+
+
+class TokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        principals.clear()
+        self.client = APIClient()
+        self.user = LoanUser.objects.create_user(username='bot', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'bot:testpassword').decode())
+        response = self.client.post(reverse('api-token'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.token = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_token_authenticates_without_queries_once_cached(self):
+        self.assertEqual(self.client.get(reverse('job-list')).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries.captured_queries if 'loan_app_loanuser' in q['sql']])
+
+    def test_forged_and_expired_tokens_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}x')
+        response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with mock.patch('loan_app.authentication.API_TOKEN_TTL', -1):
+            response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivating_user_evicts_cached_principal(self):
+        self.client.get(reverse('job-list'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('job-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_views_accept_token(self):
+        response = await AsyncClient().get('/api/async/loan-requests/', headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ThrottlingTestCase(TestCase):
+    def setUp(self):
+        get_feed_cache().clear()
+        buckets.clear()
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
+
+    def test_token_bucket_refills_over_time(self):
+        store = TokenBucketStore()
+        self.assertEqual(store.take('bucket', 1, 2, now=100.0), 0)
+        self.assertEqual(store.take('bucket', 1, 2, now=100.0), 0)
+        self.assertAlmostEqual(store.take('bucket', 1, 2, now=100.5), 0.5)
+        self.assertEqual(store.take('bucket', 1, 2, now=101.0), 0)
+
+    def test_token_bucket_falls_back_to_process_memory(self):
+        store = TokenBucketStore(alias='missing')
+        with self.assertLogs('loan_app.throttling', 'WARNING'):
+            self.assertEqual(store.take('bucket', 1, 1, now=100.0), 0)
+            self.assertGreater(store.take('bucket', 1, 1, now=100.0), 0)
+
+    @mock.patch.dict(THROTTLE_RATE_LIMITS, {'GET loanrequest-list': (0.5, 2)})
+    def test_polling_is_limited_per_user(self):
+        self.client.force_authenticate(user=self.investor)
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('loanrequest-list')).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('loanrequest-list'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(response['Retry-After'], ('1', '2'))
+
+        self.client.force_authenticate(user=self.borrower)
+        self.assertEqual(self.client.get(reverse('loanrequest-list')).status_code, status.HTTP_200_OK)
+
+    @mock.patch.dict(THROTTLE_RATE_LIMITS, {'GET loanrequest-list': (0.5, 2)})
+    async def test_async_feed_shares_the_sync_bucket(self):
+        await sync_to_async(self.client.force_authenticate)(user=self.investor)
+        self.assertEqual((await sync_to_async(self.client.get)(reverse('loanrequest-list'))).status_code, status.HTTP_200_OK)
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.investor)
+        self.assertEqual((await client.get('/api/async/loan-requests/')).status_code, status.HTTP_200_OK)
+        response = await client.get('/api/async/loan-requests/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(response['Retry-After'], ('1', '2'))
+
+    def test_write_endpoint_sheds_load_when_saturated(self):
+        self.client.force_authenticate(user=self.investor)
+        route = 'POST loanoffer-list'
+        with mock.patch.dict(CONCURRENCY_LIMITS, {route: 1}):
+            release = concurrency_limiter.acquire(route, 1)
+            self.assertIsNotNone(release)
+            try:
+                response = self.client.post(
+                    reverse('loanoffer-list'), {'loan_request': self.loan_request.id, 'annual_interest_rate': 15.0},
+                    HTTP_IDEMPOTENCY_KEY='offer-1',
+                )
+            finally:
+                release()
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+
+            # The shed response is not stored, so the retry runs.
+            response = self.client.post(
+                reverse('loanoffer-list'), {'loan_request': self.loan_request.id, 'annual_interest_rate': 15.0},
+                HTTP_IDEMPOTENCY_KEY='offer-1',
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(concurrency_limiter.in_flight(route), 0)
+
+    def test_concurrency_limit_is_shared_between_processes(self):
+        # Two limiters on the same cache stand in for two worker processes.
+        first, second = ConcurrencyLimiter(), ConcurrencyLimiter()
+        release = first.acquire('POST /shared/', 2)
+        other = second.acquire('POST /shared/', 2)
+        self.assertIsNone(first.acquire('POST /shared/', 2))
+        self.assertEqual(second.in_flight('POST /shared/'), 2)
+        release()
+        self.assertIsNotNone(second.acquire('POST /shared/', 2))
+        other()
+
+    def test_concurrency_limit_falls_back_to_process_counters(self):
+        limiter = ConcurrencyLimiter(alias='missing')
+        with self.assertLogs('loan_app.throttling', 'WARNING'):
+            release = limiter.acquire('POST /local/', 1)
+            self.assertIsNone(limiter.acquire('POST /local/', 1))
+        release()
+        self.assertEqual(limiter.in_flight('POST /local/'), 0)
+
+    def test_shedding_keeps_admitted_latency_stable_under_overload(self):
+        capacity = threading.BoundedSemaphore(4)
+        request = mock.Mock(method='POST', path='/slow/', resolver_match=None)
+
+        def slow_view(view, request):
+            with capacity:
+                time.sleep(0.03)
+            return Response(status=status.HTTP_201_CREATED)
+
+        def overload(view_method, callers=40):
+            latencies, statuses, lock = [], [], threading.Lock()
+            barrier = threading.Barrier(callers)
+
+            def call():
+                barrier.wait()
+                started = time.perf_counter()
+                response = view_method(None, request)
+                with lock:
+                    statuses.append(response.status_code)
+                    if response.status_code == status.HTTP_201_CREATED:
+                        latencies.append(time.perf_counter() - started)
+
+            threads = [threading.Thread(target=call) for _ in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return sorted(latencies), statuses
+
+        unlimited, _ = overload(slow_view)
+        with mock.patch.dict(CONCURRENCY_LIMITS, {'POST /slow/': 4}):
+            admitted, statuses = overload(admission_control(slow_view))
+        self.assertIn(status.HTTP_429_TOO_MANY_REQUESTS, statuses)
+        self.assertLess(percentile(admitted, 0.99), percentile(unlimited, 0.99) / 2)
+
+
+class BoundedPasswordHasherTestCase(TestCase):
+    def test_rejects_jobs_beyond_capacity(self):
+        hasher = BoundedPasswordHasher(workers=1, queue_depth=1)
+        release = threading.Event()
+        with mock.patch('loan_app.hashing.make_password', side_effect=lambda password: release.wait()):
+            first = hasher.submit('a')
+            second = hasher.submit('b')
+            with self.assertRaises(HasherSaturated):
+                hasher.submit('c')
+            release.set()
+            self.assertEqual([first.result(), second.result()], [True, True])
+
+    def test_hashes_are_checkable(self):
+        hasher = BoundedPasswordHasher(workers=2, queue_depth=0)
+        self.assertTrue(check_password('secret', hasher.hash('secret')))
+
+
 
 
 class LoanRequestTestCase(TestCase):
@@ -54,8 +304,130 @@ class LoanRequestTestCase(TestCase):
         self.assertEqual(loan_request.loan_amount, loan_request_data['loan_amount'])
         self.assertEqual(loan_request.loan_period, loan_request_data['loan_period'])
 
+    def test_loan_period_must_be_schedulable(self):
+        self.client.force_authenticate(user=self.user)
+        for loan_period in [0, MAX_LOAN_PERIOD + 1, 2147483647]:
+            response = self.client.post('/api/loan-requests/', {'loan_amount': 5000.00, 'loan_period': loan_period})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('loan_period', response.data)
+        self.assertFalse(LoanRequest.objects.exists())
 
 
+class LoanRequestFeedTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_feed_cache().clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        for amount, period in [(1000, 3), (2000, 6), (3000, 12), (4000, 24)]:
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=amount, loan_period=period)
+        LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000, loan_period=6, status='Completed')
+
+    def test_feed_pages_with_cursor(self):
+        self.client.force_authenticate(user=self.investor)
+
+        response = self.client.get('/api/loan-requests/', {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(first_page), 3)
+        self.assertEqual(first_page, sorted(first_page, reverse=True))
+
+        response = self.client.get(response.data['next'])
+        second_page = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(second_page), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertLess(second_page[0], first_page[-1])
+
+    def test_feed_filters_by_amount_and_period(self):
+        self.client.force_authenticate(user=self.investor)
+
+        response = self.client.get('/api/loan-requests/', {'min_amount': 1500, 'max_amount': 3500, 'min_period': 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        amounts = sorted(float(item['loan_amount']) for item in response.data['results'])
+        self.assertEqual(amounts, [2000.00, 3000.00])
+
+    def test_feed_rejects_invalid_filter(self):
+        self.client.force_authenticate(user=self.investor)
+
+        response = self.client.get('/api/loan-requests/', {'min_amount': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_amount', response.data)
+
+        for param, value in [('min_amount', 'NaN'), ('max_amount', 'Infinity'), ('min_amount', '1e20'),
+                             ('min_period', '99999999999999999999999'), ('max_period', '-1'), ('min_period', '1.5')]:
+            with self.subTest(param=param, value=value):
+                response = self.client.get('/api/loan-requests/', {param: value})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(param, response.data)
+
+
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a "replica" database alias, e.g. a second SQLite file')
+@override_settings(DATABASE_ROUTERS=['loan_app.db_routers.PrimaryReplicaRouter'])
+class ReplicaRoutingTestCase(TestCase):
+    # The runner collects `databases` before the skip applies, so only ask for the alias when it exists.
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        get_feed_cache().clear()
+        patcher = mock.patch('loan_app.db_routers.REPLICA_DATABASES', ['replica'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        replicated = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6)
+        # The replica has caught up with the first request but not yet with the second.
+        for user in (self.borrower, self.investor):
+            LoanUser.objects.using('replica').create(id=user.id, username=user.username)
+        LoanRequest.objects.using('replica').create(id=replicated.id, borrower_id=self.borrower.id, loan_amount=1000.00, loan_period=6)
+        self.lagging = LoanRequest.objects.create(borrower=self.borrower, loan_amount=2000.00, loan_period=12)
+
+    def listed_ids(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('loanrequest-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.json()['results']}
+
+    def test_reads_are_served_by_replica(self):
+        self.assertNotIn(self.lagging.id, self.listed_ids(self.investor))
+        self.assertIsNone(read_database.get())
+
+    def test_writer_reads_from_primary_during_stickiness_window(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.post(reverse('loanrequest-list'), {'loan_amount': 500.00, 'loan_period': 3})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(LoanRequest.objects.using('replica').filter(loan_amount=500).exists())
+
+        self.assertIn(self.lagging.id, self.listed_ids(self.borrower))
+        self.assertNotIn(self.lagging.id, self.listed_ids(self.investor))
+
+        get_feed_cache().clear()  # The stickiness window expires.
+        self.assertNotIn(self.lagging.id, self.listed_ids(self.borrower))
+
+    def test_pages_read_from_a_replica_are_not_cached(self):
+        self.assertNotIn(self.lagging.id, self.listed_ids(self.investor))
+        # The replica catches up after the write's invalidation has already happened.
+        LoanRequest.objects.using('replica').create(id=self.lagging.id, borrower_id=self.borrower.id, loan_amount=2000.00, loan_period=12)
+        self.assertIn(self.lagging.id, self.listed_ids(self.investor))
+
+    def test_unhandled_error_does_not_leave_replica_selected(self):
+        self.client.force_authenticate(user=self.investor)
+        with mock.patch('loan_app.views.feed_cache_key', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.client.get(reverse('loanrequest-list'))
+        self.assertIsNone(read_database.get())
+
+    def test_router_uses_primary_outside_replica_views(self):
+        self.assertEqual(router.db_for_read(LoanRequest), 'default')
+        token = read_database.set('replica')
+        try:
+            self.assertEqual(router.db_for_read(LoanRequest), 'replica')
+            self.assertEqual(router.db_for_write(LoanRequest), 'default')
+        finally:
+            read_database.reset(token)
+
 
 class LoanOfferTestCase(TestCase):
     def setUp(self):
@@ -84,6 +456,421 @@ class LoanOfferTestCase(TestCase):
 
 
 
+class FastRenderingTestCase(TestCase):
+    def setUp(self):
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        LoanRequest.objects.create(borrower=self.borrower, loan_amount=1234.5, loan_period=6)
+        LoanRequest.objects.create(
+            borrower=self.borrower, loan_amount=99.99, loan_period=12,
+            offer_deadline=timezone.now() + timedelta(days=1),
+        )
+
+    def test_row_serializer_matches_model_serializer(self):
+        queryset = LoanRequest.objects.order_by('id')
+        expected = JSONRenderer().render(LoanRequestSerializer(queryset, many=True).data)
+        rows = serialize_loan_request_rows(queryset.values(*LOAN_REQUEST_ROW_FIELDS))
+        self.assertEqual(json.loads(FastJSONRenderer().render(rows)), json.loads(expected))
+        with timezone.override('Africa/Cairo'):
+            expected = JSONRenderer().render(LoanRequestSerializer(queryset, many=True).data)
+            rows = serialize_loan_request_rows(queryset.values(*LOAN_REQUEST_ROW_FIELDS))
+        self.assertEqual(json.loads(FastJSONRenderer().render(rows)), json.loads(expected))
+
+    def test_renderer_output_matches_json_renderer(self):
+        data = {'amount': Decimal('10.50'), 'when': timezone.now(), 'name': 'Zoë', 'items': [1, None, True]}
+        expected = JSONRenderer().render({**data, 'amount': '10.50'})
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with mock.patch('loan_app.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    def test_renderer_matches_json_renderer_on_edge_cases(self):
+        data = {'note': 'line\u2028separator\u2029paragraph', 'rate': 12.5, 'nested': [{'name': 'Zoë', 'rows': ()}]}
+        tiny = {'rate': 1e-07, 'nested': [{'big': 1e300}]}
+        for encoder in ['orjson', 'stdlib']:
+            with self.subTest(encoder=encoder), mock.patch('loan_app.renderers.orjson', orjson if encoder == 'orjson' else None):
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+                # orjson spells exponents differently (1e-7 for 1e-07) but encodes the same numbers.
+                self.assertEqual(json.loads(FastJSONRenderer().render(tiny)), json.loads(JSONRenderer().render(tiny)))
+                for value in [float('nan'), float('inf'), -float('inf')]:
+                    with self.assertRaises(ValueError):
+                        JSONRenderer().render({'rows': [{'rate': value}]})
+                    with self.assertRaises(ValueError):
+                        FastJSONRenderer().render({'rows': [{'rate': value}]})
+
+    def test_feed_is_rendered_by_fast_renderer(self):
+        get_feed_cache().clear()
+        client = APIClient()
+        client.force_authenticate(user=self.borrower)
+        response = client.get(reverse('loanrequest-list'))
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.json()['results'][1]['loan_amount'], '1234.50')
+
+    def test_benchmark_command_reports_both_paths(self):
+        out = io.StringIO()
+        call_command('benchmark_serialization', rows=100, repeat=1, stdout=out)
+        self.assertIn('ModelSerializer + JSONRenderer', out.getvalue())
+        self.assertIn('row serializer + FastJSONRenderer', out.getvalue())
+
+
+class SchemaTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch('loan_app.schema.SCHEMA_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        schema_files.clear()
+        self.addCleanup(schema_files.clear)
+
+    def test_command_writes_schema_files(self):
+        out = io.StringIO()
+        call_command('generate_schema', stdout=out)
+        with open(os.path.join(self.directory, 'openapi.json')) as f:
+            schema = json.load(f)
+        self.assertIn('/loan-offers/{id}/accept_offer/', schema['paths'])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'openapi.yaml')))
+
+    def test_schema_is_served_from_disk_with_etag(self):
+        call_command('generate_schema', stdout=io.StringIO())
+        with mock.patch('loan_app.schema.generate_schema') as generate:
+            response = self.client.get('/.json/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('max-age=', response['Cache-Control'])
+            etag = response['ETag']
+
+            response = self.client.get('/.json/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            response = self.client.get('/.yaml/')
+            self.assertEqual(response['Content-Type'], 'application/yaml')
+            self.assertNotEqual(response['ETag'], etag)
+
+            response = self.client.get('/redoc/', {'format': 'openapi'})
+            self.assertEqual(response['ETag'], etag)
+        generate.assert_not_called()
+
+    def test_missing_schema_is_generated_once_without_writing(self):
+        with mock.patch('loan_app.schema.generate_schema', wraps=generate_schema) as generate, self.assertLogs('loan_app.schema', 'WARNING'):
+            self.assertEqual(self.client.get('/.json/').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/json/').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/.yaml/').status_code, status.HTTP_200_OK)
+        generate.assert_called_once()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_concurrent_writes_use_their_own_temporary_files(self):
+        errors = []
+
+        def write():
+            try:
+                write_schema_files()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['openapi.json', 'openapi.yaml'])
+        with open(os.path.join(self.directory, 'openapi.json')) as f:
+            self.assertIn('/loan-offers/{id}/accept_offer/', json.load(f)['paths'])
+
+
+class LoanRequestFeedCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_feed_cache().clear()
+        feed_cache_stats.reset()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6)
+        self.client.force_authenticate(user=self.investor)
+
+    def test_repeated_poll_is_served_from_cache(self):
+        first = self.client.get('/api/loan-requests/', format='json')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/loan-requests/', format='json')
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        self.assertEqual(feed_cache_stats.as_dict()['hits'], 1)
+        self.assertEqual(feed_cache_stats.as_dict()['misses'], 1)
+
+    def test_new_request_invalidates_cache(self):
+        self.client.get('/api/loan-requests/', format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=2000.00, loan_period=6)
+
+        response = self.client.get('/api/loan-requests/', format='json')
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+    def test_funding_invalidates_cache(self):
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=10.0)
+        set_balance(self.investor, 5000)
+        self.client.get('/api/loan-requests/', format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            accept_loan_offer(loan_offer.pk, self.borrower)
+
+        response = self.client.get('/api/loan-requests/', format='json')
+        self.assertEqual(json.loads(response.content)['results'], [])
+
+    def test_cache_stats_require_admin(self):
+        response = self.client.get('/api/loan-requests/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = LoanUser.objects.create_superuser(username='admin', password='testpassword')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/loan-requests/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_ratio', response.data)
+
+
+class AsyncEndpointTestCase(TestCase):
+    def setUp(self):
+        self.client = AsyncClient()
+        recent_responses.clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        self.loan_requests = [
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000 * (i + 1), loan_period=6)
+            for i in range(3)
+        ]
+        LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_requests[0], annual_interest_rate=10.0)
+
+    async def test_async_request_list_pages_by_id(self):
+        await sync_to_async(self.client.force_login)(self.investor)
+        response = await self.client.get('/api/async/loan-requests/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual([item['id'] for item in body['results']], [self.loan_requests[2].id, self.loan_requests[1].id])
+
+        response = await self.client.get(body['next'])
+        body = response.json()
+        self.assertEqual([item['id'] for item in body['results']], [self.loan_requests[0].id])
+        self.assertIsNone(body['next'])
+
+    async def test_async_offer_list_with_basic_auth(self):
+        credentials = base64.b64encode(b'investor:testpassword').decode()
+        response = await self.client.get('/api/async/loan-offers/', headers={'Authorization': f'Basic {credentials}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['loan_request']['id'], self.loan_requests[0].id)
+
+    async def test_async_list_requires_authentication(self):
+        response = await self.client.get('/api/async/loan-offers/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_registration(self):
+        data = {'username': 'asyncuser', 'password': 'testpassword', 'email': 'asyncuser@example.com', 'balance': 100.00}
+        response = await self.client.post('/api/async/register/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await self.client.post('/api/async/register/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        user = await LoanUser.objects.aget(username='asyncuser')
+        self.assertTrue(user.check_password('testpassword'))
+
+    async def test_async_registration_honours_idempotency_key(self):
+        data = {'username': 'asyncuser', 'password': 'testpassword', 'email': 'asyncuser@example.com'}
+        first = await self.client.post('/api/async/register/', data, content_type='application/json', headers={'Idempotency-Key': 'k1'})
+        retry = await self.client.post('/api/async/register/', data, content_type='application/json', headers={'Idempotency-Key': 'k1'})
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(await LoanUser.objects.filter(username='asyncuser').acount(), 1)
+
+
+@modify_settings(MIDDLEWARE={'append': 'loan_app.middleware.MetricsMiddleware'})
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        metrics_registry.reset()
+        get_feed_cache().clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=10000.00)
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6)
+
+    def test_records_per_route_metrics(self):
+        self.client.force_authenticate(user=self.investor)
+        LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=10.0)
+        self.client.get(reverse('loanoffer-list'))
+        self.client.get(reverse('loanoffer-list'))
+
+        histogram = metrics_registry._histograms[('loan_db_queries', 'loanoffer-list')]
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.sum, 2)
+        self.assertEqual(metrics_registry._histograms[('loan_rows_serialized', 'loanoffer-list')].sum, 2)
+
+    def test_records_lock_wait_for_funding(self):
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=10.0)
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post(f'/api/loan-offers/{loan_offer.id}/accept_offer/')
+        self.assertEqual(metrics_registry._histograms[('loan_db_lock_wait_seconds', 'loanoffer-accept-offer')].count, 1)
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.force_authenticate(user=self.investor)
+        self.client.get('/api/loan-requests/')
+
+        self.client.force_authenticate(user=LoanUser.objects.create_user(username='operator', password='testpassword', is_staff=True))
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE loan_http_request_duration_seconds histogram', body)
+        self.assertIn('loan_http_request_duration_seconds_count{route="loanrequest-list"} 1', body)
+        self.assertIn('loan_db_queries_bucket{route="loanrequest-list",le="+Inf"} 1', body)
+
+    def test_metrics_endpoint_requires_staff_or_scrape_token(self):
+        self.assertIn(self.client.get('/api/metrics/').status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.client.force_authenticate(user=self.investor)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+
+        with mock.patch('loan_app.authentication.METRICS_TOKEN', 'scrape-secret'):
+            response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong-secret')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            # The scrape token grants nothing outside the metrics endpoint.
+            response = self.client.get('/api/portfolio/summary/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram([1, 2, 4])
+        for value in [0.5, 1, 3, 10]:
+            histogram.record(value)
+        self.assertEqual(histogram.counts, [2, 0, 1, 1])
+        self.assertEqual(histogram.count, 4)
+
+
+class LoanOfferBatchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        self.loan_requests = [
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6)
+            for _ in range(20)
+        ]
+
+    def test_batch_creates_all_offers(self):
+        self.client.force_authenticate(user=self.investor)
+
+        data = [{'loan_request': loan_request.id, 'annual_interest_rate': 10.0} for loan_request in self.loan_requests]
+        response = self.client.post(reverse('loanoffer-batch'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(LoanOffer.objects.filter(investor=self.investor).count(), 20)
+
+    def test_batch_reports_per_item_errors(self):
+        self.client.force_authenticate(user=self.investor)
+        completed = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6, status='Completed')
+        own = LoanRequest.objects.create(borrower=self.investor, loan_amount=1000.00, loan_period=6)
+
+        data = {'offers': [
+            {'loan_request': self.loan_requests[0].id, 'annual_interest_rate': 10.0},
+            {'loan_request': completed.id, 'annual_interest_rate': 10.0},
+            {'loan_request': own.id, 'annual_interest_rate': 10.0},
+            {'loan_request': self.loan_requests[1].id, 'annual_interest_rate': 150.0},
+        ]}
+        response = self.client.post(reverse('loanoffer-batch'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'error'])
+        self.assertEqual(results[1]['message'], 'Loan request not found or not in Pending status')
+        self.assertEqual(results[2]['message'], "You can't make an offer to yourself")
+        self.assertIn('annual_interest_rate', results[3]['errors'])
+        self.assertEqual(LoanOffer.objects.filter(investor=self.investor).count(), 1)
+
+    def test_batch_query_count_does_not_grow_with_size(self):
+        self.client.force_authenticate(user=self.investor)
+
+        small = [{'loan_request': loan_request.id, 'annual_interest_rate': 10.0} for loan_request in self.loan_requests[:2]]
+        large = [{'loan_request': loan_request.id, 'annual_interest_rate': 12.0} for loan_request in self.loan_requests]
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(reverse('loanoffer-batch'), small, format='json')
+        with CaptureQueriesContext(connection) as large_queries:
+            self.client.post(reverse('loanoffer-batch'), large, format='json')
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_batch_rejects_non_list_body(self):
+        self.client.force_authenticate(user=self.investor)
+
+        response = self.client.post(reverse('loanoffer-batch'), {'loan_request': self.loan_requests[0].id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LoanOfferQueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_feed_cache().clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword')
+        self.loan_requests = LoanRequest.objects.bulk_create([
+            LoanRequest(borrower=self.borrower, loan_amount=1000.00, loan_period=6) for _ in range(10)
+        ])
+        self.client.force_authenticate(user=self.investor)
+
+    def create_offers(self, count):
+        LoanOffer.objects.bulk_create([
+            LoanOffer(investor=self.investor, loan_request=self.loan_requests[i % 10], annual_interest_rate=10.0)
+            for i in range(count)
+        ])
+
+    def assert_list_query_budget(self, count):
+        self.create_offers(count)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('loanoffer-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), count)
+        self.assertEqual(response.data[0]['investor']['username'], 'investor')
+        self.assertEqual(response.data[0]['loan_request']['borrower'], self.borrower.id)
+
+    def test_list_query_budget_1_offer(self):
+        self.assert_list_query_budget(1)
+
+    def test_list_query_budget_100_offers(self):
+        self.assert_list_query_budget(100)
+
+    def test_list_query_budget_10000_offers(self):
+        self.assert_list_query_budget(10000)
+
+    def test_stream_matches_regular_listing(self):
+        self.create_offers(25)
+        regular = self.client.get(reverse('loanoffer-list')).json()
+
+        response = self.client.get(reverse('loanoffer-list'), {'stream': '1'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        streamed = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(streamed, sorted(regular, key=lambda offer: offer['id']))
+
+    def test_stream_negotiated_by_accept_header(self):
+        self.create_offers(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('loanoffer-list'), HTTP_ACCEPT='application/x-ndjson')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['investor']['username'], 'investor')
+
+    def test_detail_query_budget(self):
+        self.create_offers(1)
+        loan_offer = LoanOffer.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('loanoffer-detail', args=[loan_offer.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['loan_request']['id'], self.loan_requests[0].id)
+
+    def test_detail_hidden_from_other_users(self):
+        self.create_offers(1)
+        loan_offer = LoanOffer.objects.get()
+        other = LoanUser.objects.create_user(username='other', password='testpassword')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('loanoffer-detail', args=[loan_offer.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_request_list_query_budget(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/loan-requests/')
+        self.assertEqual(len(response.data['results']), 10)
+
+
 class LoanOfferAcceptanceTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -97,7 +884,7 @@ class LoanOfferAcceptanceTestCase(TestCase):
         loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
         loan_offer = LoanOffer.objects.create(investor=self.investor_with_balance, loan_request=loan_request, annual_interest_rate=15.0)
 
-        response = self.client.get(f'/api/loan-offers/{loan_offer.id}/accept_offer/')
+        response = self.client.post(f'/api/loan-offers/{loan_offer.id}/accept_offer/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Verify that the loan offer and loan request statuses are updated
@@ -112,12 +899,69 @@ class LoanOfferAcceptanceTestCase(TestCase):
         loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
         loan_offer = LoanOffer.objects.create(investor=self.investor_without_balance, loan_request=loan_request, annual_interest_rate=15.0)
 
-        response = self.client.get(f'/api/loan-offers/{loan_offer.id}/accept_offer/')
+        response = self.client.post(f'/api/loan-offers/{loan_offer.id}/accept_offer/')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['message'], 'Investor does not have sufficient balance')
 
 
 
+class RepaymentScheduleTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=10000.00)
+        self.other = LoanUser.objects.create_user(username='other', password='testpassword')
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
+        self.loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+
+    def test_amortization_schedule_repays_principal_exactly(self):
+        schedule = amortization_schedule(Decimal('5000.00'), Decimal('15.00'), 6)
+        self.assertEqual(len(schedule), 6)
+        self.assertEqual(sum(row[1] for row in schedule), Decimal('5000.00'))
+        self.assertEqual(schedule[0][3], monthly_payment(Decimal('5000.00'), Decimal('15.00'), 6))
+        self.assertEqual(schedule[0][2], Decimal('62.50'))
+        self.assertEqual(schedule[-1][4], Decimal('0.00'))
+
+    def test_zero_rate_schedule_splits_principal(self):
+        schedule = amortization_schedule(Decimal('1000.00'), Decimal('0'), 3)
+        self.assertEqual([row[1] for row in schedule], [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        self.assertTrue(all(row[2] == 0 for row in schedule))
+
+    def test_unschedulable_period_is_rejected(self):
+        with self.assertRaises(ValueError):
+            amortization_schedule(Decimal('1000.00'), Decimal('10'), 0)
+        # Rows stored before periods were validated cannot be funded, by the API or the matching worker.
+        loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=0, offer_deadline=timezone.now())
+        offer = LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=10.0)
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.post(f'/api/loan-offers/{offer.id}/accept_offer/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(auto_accept_expired_requests(), 0)
+        self.assertEqual(LoanOffer.objects.get(pk=offer.pk).status, 'Pending')
+        self.assertFalse(RepaymentInstallment.objects.filter(loan_offer=offer).exists())
+
+    def test_add_months_clamps_to_month_end(self):
+        self.assertEqual(add_months(date(2024, 1, 31), 1), date(2024, 2, 29))
+        self.assertEqual(add_months(date(2024, 11, 15), 3), date(2025, 2, 15))
+
+    def test_accepting_offer_generates_schedule(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post(f'/api/loan-offers/{self.loan_offer.id}/accept_offer/')
+
+        response = self.client.get(reverse('loanoffer-schedule', args=[self.loan_offer.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['number'] for item in response.data], [1, 2, 3, 4, 5, 6])
+
+        self.client.force_authenticate(user=self.investor)
+        response = self.client.get(reverse('loanoffer-schedule', args=[self.loan_offer.id]))
+        self.assertEqual(len(response.data), 6)
+
+    def test_schedule_hidden_from_other_users(self):
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('loanoffer-schedule', args=[self.loan_offer.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class LoanOfferCompletionTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -130,7 +974,7 @@ class LoanOfferCompletionTestCase(TestCase):
         loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
         loan_offer = LoanOffer.objects.create(investor=self.investor_with_balance, loan_request=loan_request, annual_interest_rate=15.0, status='Accepted')
 
-        response = self.client.get(reverse('loanoffer-complete-offer', args=[loan_offer.id]))
+        response = self.client.post(reverse('loanoffer-complete-offer', args=[loan_offer.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'Loan offer Completed and loan Completed successfully')
 
@@ -140,13 +984,14 @@ class LoanOfferCompletionTestCase(TestCase):
         loan_request.refresh_from_db()
         self.assertEqual(loan_request.status, 'Completed')
         investor = LoanUser.objects.get(username=self.investor_with_balance.username)
-        self.assertEqual(float(investor.balance), 10000.00 - float(float(loan_request.loan_amount) + float(loan_request.loan_amount) * float(loan_offer.annual_interest_rate/100) * (loan_request.loan_period / 12) + 3.00))
+        # The investor paid the principal and fee and was repaid the principal with the schedule's interest.
+        self.assertEqual(get_ledger_balance(investor), Decimal('10000.00') - Decimal('3.00') + schedule_interest(5000, 15.0, 6))
     def test_investor_completes_loan_offer_with_insufficient_balance(self):
         self.client.force_authenticate(user=self.investor_without_balance)
         loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
         loan_offer = LoanOffer.objects.create(investor=self.investor_without_balance, loan_request=loan_request, annual_interest_rate=15.0, status='Accepted')
 
-        response = self.client.get(reverse('loanoffer-complete-offer', args=[loan_offer.id]))
+        response = self.client.post(reverse('loanoffer-complete-offer', args=[loan_offer.id]))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['message'], 'Investor does not have sufficient balance')
 
@@ -156,10 +1001,911 @@ class LoanOfferCompletionTestCase(TestCase):
         loan_request.refresh_from_db()
         self.assertEqual(loan_request.status, 'Pending')
         investor = LoanUser.objects.get(username=self.investor_without_balance.username)
-        self.assertEqual(float(investor.balance), 100.00)  # Balance remains the same
+        self.assertEqual(float(get_ledger_balance(investor)), 100.00)  # Balance remains the same
 
 
 
+class FundingServiceTestCase(TestCase):
+    def setUp(self):
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=10000.00)
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
+
+    def test_accepting_offer_rejects_competing_offers(self):
+        rival = LoanUser.objects.create_user(username='rival', password='testpassword', balance=10000.00)
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+        competing_offer = LoanOffer.objects.create(investor=rival, loan_request=self.loan_request, annual_interest_rate=12.0)
+
+        accept_loan_offer(loan_offer.pk, self.borrower)
+
+        competing_offer.refresh_from_db()
+        self.assertEqual(competing_offer.status, 'Rejected')
+        with self.assertRaises(LoanOffer.DoesNotExist):
+            accept_loan_offer(competing_offer.pk, self.borrower)
+
+    def test_total_loan_amount_is_decimal_exact(self):
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=Decimal('15.00'))
+        self.assertEqual(calculate_total_loan_amount(loan_offer), Decimal('5378.00'))
+
+    def test_balance_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                LoanUser.objects.filter(pk=self.investor.pk).update(balance=-1)
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def register(self, username, balance):
+        self.client.post('/api/register/', {'username': username, 'password': 'testpassword', 'email': f'{username}@example.com', 'balance': balance})
+        return LoanUser.objects.get(username=username)
+
+    def test_registration_records_deposit(self):
+        user = self.register('depositor', 1000.00)
+        entry = LedgerEntry.objects.get(user=user)
+        self.assertEqual(entry.kind, 'Deposit')
+        self.assertEqual(get_ledger_balance(user), Decimal('1000.00'))
+
+    def test_every_created_balance_is_deposited(self):
+        user = LoanUser.objects.create_user(username='direct', password='testpassword', balance=250.00)
+        self.assertEqual(list(LedgerEntry.objects.filter(user=user).values_list('kind', 'amount')), [('Deposit', Decimal('250.00'))])
+        self.assertFalse(LedgerEntry.objects.filter(user=LoanUser.objects.create_user(username='empty', password='testpassword')).exists())
+
+    def test_credits_only_append_entries(self):
+        investor = self.register('investor', 10000.00)
+        borrower = self.register('borrower', 0)
+        loan_request = LoanRequest.objects.create(borrower=borrower, loan_amount=1000.00, loan_period=2)
+        loan_offer = LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=12.0)
+        accept_loan_offer(loan_offer.pk, borrower)
+
+        with CaptureQueriesContext(connection) as queries:
+            post_due_repayments(add_months(timezone.localdate(), 2))
+        self.assertFalse([query['sql'] for query in queries.captured_queries if query['sql'].startswith(f'UPDATE "{LoanUser._meta.db_table}"')])
+        self.assertEqual(LoanUser.objects.get(pk=investor.pk).balance, Decimal('10000.00'))
+        expected = Decimal('10000.00') - Decimal('1003.00') + sum(RepaymentInstallment.objects.filter(loan_offer=loan_offer).values_list('amount', flat=True))
+        self.assertEqual(get_ledger_balance(investor), expected)
+
+        materialize_balance_snapshots(now=timezone.now() + timedelta(minutes=5))
+        record_entries(investor, [('Deposit', Decimal('5.00'))])
+        balances = dict(with_ledger_balance(LoanUser.objects.all()).values_list('username', 'ledger_balance'))
+        self.assertEqual(balances['investor'], expected + Decimal('5.00'))
+        self.assertEqual(balances['borrower'], Decimal('0.00'))
+
+    def test_completion_funds_the_loan_and_posts_the_schedule(self):
+        investor = self.register('investor', 10000.00)
+        borrower = self.register('borrower', 0)
+        loan_request = LoanRequest.objects.create(borrower=borrower, loan_amount=5000.00, loan_period=6)
+        loan_offer = LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=15.0)
+        accept_loan_offer(loan_offer.pk, borrower)
+
+        complete_loan_offer(loan_offer.pk, investor)
+
+        kinds = list(LedgerEntry.objects.filter(user=investor).order_by('id').values_list('kind', flat=True))
+        self.assertEqual(kinds, ['Deposit', 'Funding', 'Fee', 'Repayment'])
+        interest = schedule_interest(5000, 15.0, 6)
+        self.assertEqual(get_ledger_balance(investor), Decimal('10000.00') - Decimal('3.00') + interest)
+        # The borrower repaid the principal they received and settled the interest from outside.
+        borrower_entries = list(LedgerEntry.objects.filter(user=borrower).order_by('id').values_list('kind', 'amount'))
+        self.assertEqual(borrower_entries, [
+            ('Funding', Decimal('5000.00')), ('Settlement', interest), ('Repayment', -(Decimal('5000.00') + interest)),
+        ])
+        self.assertEqual(get_ledger_balance(borrower), Decimal('0.00'))
+        self.assertFalse(RepaymentInstallment.objects.filter(loan_offer=loan_offer, status='Pending').exists())
+        # The opening deposit is all the balance column keeps.
+        investor.refresh_from_db()
+        self.assertEqual(investor.balance, Decimal('10000.00'))
+
+    def test_repayments_only_move_money_between_users(self):
+        investor = self.register('investor', 10000.00)
+        borrower = self.register('borrower', 0)
+        for rate in [12.0, 0]:
+            loan_request = LoanRequest.objects.create(borrower=borrower, loan_amount=1000.00, loan_period=4)
+            loan_offer = LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=rate)
+            accept_loan_offer(loan_offer.pk, borrower)
+        post_due_repayments(add_months(timezone.localdate(), 2))
+        complete_loan_offer(loan_offer.pk, investor)
+        post_due_repayments(add_months(timezone.localdate(), 4))
+
+        totals = dict(LedgerEntry.objects.values('kind').annotate(total=Sum('amount')).values_list('kind', 'total'))
+        self.assertEqual(totals['Funding'], 0)
+        self.assertEqual(totals['Repayment'], 0)
+        # Money only enters through deposits and settlements and leaves as fees.
+        self.assertEqual(
+            get_ledger_balance(investor) + get_ledger_balance(borrower),
+            totals['Deposit'] + totals['Settlement'] + totals['Fee'],
+        )
+        self.assertGreaterEqual(get_ledger_balance(borrower), 0)
+
+    def test_snapshots_fold_new_entries_only(self):
+        user = self.register('saver', 100.00)
+        later = timezone.now() + timedelta(minutes=5)
+        self.assertEqual(materialize_balance_snapshots(now=later), 1)
+        self.assertEqual(materialize_balance_snapshots(now=later), 0)
+
+        record_entries(user, [('Deposit', Decimal('50.00'))])
+        self.assertEqual(get_ledger_balance(user), Decimal('150.00'))
+        self.assertEqual(materialize_balance_snapshots(now=timezone.now() + timedelta(minutes=5)), 1)
+        self.assertEqual(BalanceSnapshot.objects.filter(user=user).order_by('-last_entry_id').first().balance, Decimal('150.00'))
+
+        record_entries(user, [('Fee', Decimal('-3.00'))])
+        with self.assertNumQueries(2):
+            self.assertEqual(get_ledger_balance(user), Decimal('147.00'))
+
+    def test_recent_entries_wait_for_the_snapshot_lag(self):
+        user = self.register('late', 100.00)
+        # The entry may belong to a transaction that commits after entries with higher ids.
+        self.assertEqual(materialize_balance_snapshots(), 0)
+        LedgerEntry.objects.filter(user=user).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(materialize_balance_snapshots(), 1)
+        self.assertEqual(get_ledger_balance(user), Decimal('100.00'))
+
+    def test_entries_are_append_only(self):
+        user = self.register('auditor', 100.00)
+        entry = LedgerEntry.objects.get(user=user)
+        entry.amount = Decimal('1.00')
+        with self.assertRaises(ValidationError):
+            entry.save()
+        with self.assertRaises(ValidationError):
+            entry.delete()
+
+
+class FundingConcurrencyTestCase(TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 200
+    # Funding operations per second the service must sustain under contention. Each call
+    # is a handful of indexed queries; the floor leaves room for SQLite's table-locked retries.
+    MIN_OPERATIONS_PER_SECOND = 10
+    # A completion posts the loan's whole repayment schedule in its transaction.
+    MIN_COMPLETIONS_PER_SECOND = 5
+
+    def run_concurrently(self, func, args_list, min_rate=MIN_OPERATIONS_PER_SECOND):
+        """Run func once per args in its own thread; every call must end accepted or rejected."""
+        results = []
+        lock = threading.Lock()
+
+        def worker(args):
+            outcome = 'busy'
+            try:
+                for attempt in range(self.ATTEMPTS):
+                    try:
+                        func(*args)
+                        outcome = 'ok'
+                    except (FundingError, LoanOffer.DoesNotExist):
+                        outcome = 'rejected'
+                    except OperationalError:
+                        # SQLite has no row locks and reports a busy database instead of waiting;
+                        # back off exponentially so retrying workers do not keep colliding.
+                        time.sleep(random.uniform(0, 0.001 * 2 ** min(attempt, 7)))
+                        continue
+                    break
+            finally:
+                connection.close()
+            with lock:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=worker, args=(args,)) for args in args_list]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(results), len(args_list))
+        self.assertNotIn('busy', results)
+        throughput = len(results) / elapsed
+        self.assertGreaterEqual(throughput, min_rate, f'{throughput:.1f} operations per second')
+        return results, elapsed
+
+    def test_concurrent_acceptances_fund_request_once(self):
+        borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        loan_request = LoanRequest.objects.create(borrower=borrower, loan_amount=1000.00, loan_period=6)
+        offers = [
+            LoanOffer.objects.create(
+                investor=LoanUser.objects.create_user(username=f'investor{i}', password='testpassword', balance=5000.00),
+                loan_request=loan_request,
+                annual_interest_rate=10.0,
+            )
+            for i in range(self.THREADS)
+        ]
+
+        results, _ = self.run_concurrently(accept_loan_offer, [(offer.pk, borrower) for offer in offers])
+
+        self.assertEqual(results.count('ok'), 1)
+        self.assertEqual(LoanOffer.objects.filter(loan_request=loan_request, status='Accepted').count(), 1)
+        self.assertEqual(LoanRequest.objects.get(pk=loan_request.pk).status, 'Funded')
+        self.assertEqual(RepaymentInstallment.objects.filter(loan_offer__loan_request=loan_request).count(), 6)
+
+    def test_concurrent_completions_against_one_investor(self):
+        investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=Decimal('1006.00'))
+        offers = []
+        for i in range(self.THREADS):
+            borrower = LoanUser.objects.create_user(username=f'borrower{i}', password='testpassword')
+            loan_request = LoanRequest.objects.create(borrower=borrower, loan_amount=997.00, loan_period=12)
+            offers.append(LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=0))
+            accept_loan_offer(offers[-1].pk, borrower)
+
+        results, _ = self.run_concurrently(
+            complete_loan_offer, [(offer.pk, investor) for offer in offers], min_rate=self.MIN_COMPLETIONS_PER_SECOND,
+        )
+
+        # Each completion needs 1000.00 up front and leaves the investor 3.00 poorer, so the
+        # balance funds exactly three loans; the rest are rejected, not lost to contention.
+        self.assertEqual(results.count('ok'), 3)
+        self.assertEqual(LoanOffer.objects.filter(investor=investor, status='Completed').count(), 3)
+        self.assertEqual(get_ledger_balance(investor), Decimal('997.00'))
+
+
+class OfferMatchingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        offer_book.clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investors = [
+            LoanUser.objects.create_user(username=f'investor{i}', password='testpassword', balance=10000.00)
+            for i in range(4)
+        ]
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6)
+
+    def submit_offer(self, investor, rate):
+        self.client.force_authenticate(user=investor)
+        self.client.post(reverse('loanoffer-list'), {'loan_request': self.loan_request.id, 'annual_interest_rate': rate})
+        return LoanOffer.objects.filter(investor=investor).latest('id')
+
+    def test_offer_book_orders_by_rate_then_time(self):
+        book = OfferBook()
+        offers = [
+            LoanOffer.objects.create(investor=investor, loan_request=self.loan_request, annual_interest_rate=rate)
+            for investor, rate in zip(self.investors, [12, 9, 12, 15])
+        ]
+        self.assertEqual(book.best(self.loan_request.id, 3), [offers[1].id, offers[0].id, offers[2].id])
+        self.assertEqual(book.best(self.loan_request.id), [offers[1].id, offers[0].id, offers[2].id, offers[3].id])
+
+    def test_offer_book_evicts_least_recently_used_heaps(self):
+        book = OfferBook(maxsize=2)
+        loan_requests = [self.loan_request] + [
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000.00, loan_period=6) for _ in range(2)
+        ]
+        for loan_request in loan_requests:
+            book.best(loan_request.id)
+        self.assertEqual(len(book), 2)
+        with self.assertNumQueries(1):
+            book.best(self.loan_request.id)  # Evicted first, so it is loaded again.
+        with self.assertNumQueries(0):
+            book.best(loan_requests[2].id)
+
+    def test_offer_book_loads_without_holding_the_lock(self):
+        book = OfferBook()
+        offer = LoanOffer.objects.create(investor=self.investors[0], loan_request=self.loan_request, annual_interest_rate=10)
+        added = LoanOffer(id=offer.id + 100, investor=self.investors[1], loan_request=self.loan_request, annual_interest_rate=5)
+        load = book._load
+
+        def load_while_offer_arrives(loan_request_id):
+            self.assertFalse(book._lock.locked())
+            entries = load(loan_request_id)
+            book.add(added)  # Submitted while the query was running.
+            return entries
+
+        with mock.patch.object(book, '_load', side_effect=load_while_offer_arrives):
+            self.assertEqual(book.best(self.loan_request.id), [added.id, offer.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(book.best(self.loan_request.id), [added.id, offer.id])
+
+    def test_offer_book_loads_each_request_once_at_a_time(self):
+        book = OfferBook()
+        loads, results = [], []
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load(loan_request_id):
+            loads.append(loan_request_id)
+            started.set()
+            release.wait(5)
+            return [(Decimal('10.00'), 1)]
+
+        with mock.patch.object(book, '_load', side_effect=slow_load):
+            threads = [threading.Thread(target=lambda: results.append(book.best(self.loan_request.id))) for _ in range(2)]
+            threads[0].start()
+            started.wait(5)
+            threads[1].start()
+            while book._loaders[self.loan_request.id][1] < 2:
+                time.sleep(0.001)
+            book.add(LoanOffer(id=2, loan_request_id=self.loan_request.id, annual_interest_rate=Decimal('5.00')))
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(loads, [self.loan_request.id])
+        self.assertEqual(results, [[2, 1], [2, 1]])
+        self.assertEqual(book.best(self.loan_request.id), [2, 1])
+        self.assertFalse(book._loaders)
+
+    def test_best_offers_endpoint_tracks_new_offers(self):
+        first = self.submit_offer(self.investors[0], 12.0)
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('loanrequest-best-offers', args=[self.loan_request.id]))
+        self.assertEqual([offer['id'] for offer in response.data], [first.id])
+
+        cheaper = self.submit_offer(self.investors[1], 8.0)
+        self.client.force_authenticate(user=self.borrower)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('loanrequest-best-offers', args=[self.loan_request.id]), {'k': 1})
+        self.assertEqual([offer['id'] for offer in response.data], [cheaper.id])
+
+    def test_best_offers_validates_k_and_owner(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('loanrequest-best-offers', args=[self.loan_request.id]), {'k': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.investors[0])
+        response = self.client.get(reverse('loanrequest-best-offers', args=[self.loan_request.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auto_accept_skips_unfundable_best_offer(self):
+        set_balance(self.investors[0], 10)
+        self.submit_offer(self.investors[0], 5.0)
+        fundable = self.submit_offer(self.investors[1], 9.0)
+        self.submit_offer(self.investors[2], 11.0)
+        LoanRequest.objects.filter(pk=self.loan_request.pk).update(offer_deadline=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(auto_accept_expired_requests(), 1)
+        fundable.refresh_from_db()
+        self.assertEqual(fundable.status, 'Accepted')
+        self.assertEqual(auto_accept_expired_requests(), 0)
+
+    def test_auto_accept_rechecks_a_stale_offer_book(self):
+        self.submit_offer(self.investors[0], 9.0)
+        self.assertEqual(len(offer_book.best(self.loan_request.id)), 1)
+        # Another process takes a cheaper offer; this process's book has not seen it.
+        cheaper = LoanOffer.objects.create(investor=self.investors[1], loan_request=self.loan_request, annual_interest_rate=5.0)
+        LoanRequest.objects.filter(pk=self.loan_request.pk).update(offer_deadline=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(auto_accept_expired_requests(), 1)
+        self.assertEqual(LoanOffer.objects.get(pk=cheaper.pk).status, 'Accepted')
+
+    def test_outbid_offer_is_not_accepted_as_the_best(self):
+        offer = self.submit_offer(self.investors[0], 9.0)
+        cheaper = self.submit_offer(self.investors[1], 5.0)
+        with self.assertRaises(OutbidError):
+            accept_loan_offer(offer.pk, self.borrower, passed_over=[])
+        accept_loan_offer(offer.pk, self.borrower, passed_over=[cheaper.pk])
+        self.assertEqual(LoanOffer.objects.get(pk=offer.pk).status, 'Accepted')
+
+    def test_request_before_deadline_is_not_auto_accepted(self):
+        self.submit_offer(self.investors[0], 5.0)
+        LoanRequest.objects.filter(pk=self.loan_request.pk).update(offer_deadline=timezone.now() + timedelta(days=1))
+        self.assertEqual(auto_accept_expired_requests(), 0)
+
+
+class IdempotencyTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        recent_responses.clear()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=10000.00)
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
+
+    def test_retried_offer_is_created_once(self):
+        self.client.force_authenticate(user=self.investor)
+        data = {'loan_request': self.loan_request.id, 'annual_interest_rate': 15.0}
+
+        first = self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='offer-1')
+        retry = self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='offer-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(LoanOffer.objects.filter(investor=self.investor).count(), 1)
+
+        self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='offer-2')
+        self.assertEqual(LoanOffer.objects.filter(investor=self.investor).count(), 2)
+
+    def test_retried_acceptance_is_replayed_from_table_without_touching_offers(self):
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+        self.client.force_authenticate(user=self.borrower)
+        url = reverse('loanoffer-accept-offer', args=[loan_offer.id])
+
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='accept-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(IdempotencyKey.objects.filter(user=self.borrower, key='accept-1').exists())
+
+        recent_responses.clear()
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='accept-1')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        self.assertFalse(any('loan_offer' in query['sql'] for query in queries))
+
+        with self.assertNumQueries(0):
+            self.client.post(url, HTTP_IDEMPOTENCY_KEY='accept-1')
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post('/api/loan-requests/', {'loan_amount': 100, 'loan_period': 3}, HTTP_IDEMPOTENCY_KEY='shared')
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+
+        response = self.client.post(reverse('loanoffer-accept-offer', args=[loan_offer.id]), HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_keys_are_scoped_per_user(self):
+        data = {'loan_amount': 100, 'loan_period': 3}
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post('/api/loan-requests/', data, HTTP_IDEMPOTENCY_KEY='same')
+        self.client.force_authenticate(user=self.investor)
+        self.client.post('/api/loan-requests/', data, HTTP_IDEMPOTENCY_KEY='same')
+        self.assertEqual(LoanRequest.objects.filter(loan_amount=100).count(), 2)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.post('/api/loan-requests/', {'loan_amount': 100, 'loan_period': 3}, HTTP_IDEMPOTENCY_KEY='body')
+        response = self.client.post('/api/loan-requests/', {'loan_amount': 200, 'loan_period': 3}, HTTP_IDEMPOTENCY_KEY='body')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(LoanRequest.objects.filter(loan_amount=200).exists())
+
+    def test_retry_while_first_request_is_in_flight_gets_conflict(self):
+        data = {'loan_request': self.loan_request.id, 'annual_interest_rate': 15.0}
+        self.client.force_authenticate(user=self.investor)
+        # A concurrent first attempt has claimed the key and is still running.
+        self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='in-flight')
+        IdempotencyKey.objects.filter(key='in-flight').update(status_code=None, response_body=None)
+        recent_responses.clear()
+
+        response = self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='in-flight')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(LoanOffer.objects.filter(investor=self.investor).count(), 1)
+
+        # A claim abandoned by a crashed worker is taken over once it times out.
+        IdempotencyKey.objects.filter(key='in-flight').update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(reverse('loanoffer-list'), data, HTTP_IDEMPOTENCY_KEY='in-flight')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_anonymous_keys_are_scoped_to_the_request(self):
+        alice = {'username': 'alice', 'email': 'alice@example.com', 'password': 'testpassword'}
+        bob = {'username': 'bob', 'email': 'bob@example.com', 'password': 'testpassword'}
+        self.assertEqual(self.client.post('/api/register/', alice, HTTP_IDEMPOTENCY_KEY='k1').status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/register/', bob, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertTrue(LoanUser.objects.filter(username='bob').exists())
+
+        retry = self.client.post('/api/register/', alice, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(LoanUser.objects.filter(username='alice').count(), 1)
+
+    def test_fingerprint_survives_a_consumed_body(self):
+        def fingerprint(data):
+            django_request = APIRequestFactory().post('/api/register/', data, format='multipart')
+            django_request.POST  # A middleware reading the form consumes the stream.
+            return _fingerprint(Request(django_request, parsers=[FormParser(), MultiPartParser()]))
+
+        alice = {'username': 'alice', 'password': 'testpassword'}
+        self.assertEqual(fingerprint(alice), fingerprint(dict(alice)))
+        self.assertNotEqual(fingerprint(alice), fingerprint({'username': 'bob', 'password': 'testpassword'}))
+
+    def test_accept_offer_requires_post(self):
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('loanoffer-accept-offer', args=[loan_offer.id]))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_ttl_cache_evicts_least_recently_used_and_expired(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        expired = TTLCache(maxsize=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+    def test_purge_removes_expired_keys(self):
+        IdempotencyKey.objects.create(user=self.borrower, key='old', method='POST', path='/', status_code=200, response_body={})
+        self.assertEqual(purge_expired_keys(now=timezone.now() + timedelta(days=2)), 1)
+
+
+class PortfolioSummaryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=100000.00)
+        self.offers = []
+        for amount, rate, period in [(5000, 15, 6), (1000, 10, 12), (2500, 7.5, 3)]:
+            loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=amount, loan_period=period)
+            self.offers.append(LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=rate))
+        for loan_offer in self.offers:
+            accept_loan_offer(loan_offer.pk, self.borrower)
+        complete_loan_offer(self.offers[0].pk, self.investor)
+
+    def summary(self):
+        self.client.force_authenticate(user=self.investor)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('portfolio-summary'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_summary_is_maintained_incrementally(self):
+        self.assertEqual(self.summary(), {
+            'funded_count': 3,
+            'completed_count': 1,
+            'funded_principal': '8500.00',
+            'expected_interest': '307.31',
+            'outstanding': '3586.31',
+        })
+
+    def test_rebuild_matches_incremental_totals(self):
+        incremental = self.summary()
+        InvestorPortfolio.objects.all().delete()
+        call_command('rebuild_portfolios', stdout=io.StringIO())
+        self.assertEqual(self.summary(), incremental)
+
+    def test_rebuild_keeps_fractional_interest(self):
+        # 1000 at 15% over 5 months earns 37.80 over its schedule, which does not divide evenly.
+        loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000, loan_period=5)
+        loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=15)
+        accept_loan_offer(loan_offer.pk, self.borrower)
+        incremental = self.summary()
+        self.assertEqual(incremental['expected_interest'], '345.11')
+        call_command('rebuild_portfolios', stdout=io.StringIO())
+        self.assertEqual(self.summary(), incremental)
+
+    def test_summary_for_new_investor_is_zero(self):
+        self.investor = LoanUser.objects.create_user(username='newcomer', password='testpassword')
+        self.assertEqual(self.summary()['funded_count'], 0)
+
+
+class RepaymentProcessingTestCase(TestCase):
+    def setUp(self):
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=100000.00)
+        self.offers = []
+        for amount, rate, period in [(5000, 15, 6), (1000, 10, 12), (2500, 7.5, 3), (1200, 0, 2)]:
+            loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=amount, loan_period=period)
+            loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=rate)
+            accept_loan_offer(loan_offer.pk, self.borrower)
+            self.offers.append(loan_offer)
+        self.funded_on = timezone.localdate()
+
+    def test_posts_installments_due_by_date(self):
+        totals = post_due_repayments(add_months(self.funded_on, 2), chunk_size=3)
+        self.assertEqual(totals['installments'], 8)
+        self.assertEqual(totals['completed'], 1)
+
+        paid = RepaymentInstallment.objects.filter(status='Paid')
+        paid_amount = sum(paid.values_list('amount', flat=True))
+        self.assertEqual(Decimal(totals['amount']), paid_amount)
+        # Every loan had its first installment posted, so each was paid for: principal plus the 3.00 fee.
+        funded = Decimal('9700.00') + 4 * Decimal('3.00')
+        self.assertEqual(get_ledger_balance(self.investor), Decimal('100000.00') - funded + paid_amount)
+
+        statuses = dict(LoanOffer.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.offers[3].id], 'Completed')
+        self.assertEqual(statuses[self.offers[0].id], 'Accepted')
+        self.assertEqual(LoanRequest.objects.get(pk=self.offers[3].loan_request_id).status, 'Completed')
+        self.assertEqual(self.investor.portfolio.completed_count, 1)
+
+    def test_repaying_everything_completes_every_loan(self):
+        post_due_repayments(add_months(self.funded_on, 12))
+        self.assertFalse(LoanOffer.objects.filter(status='Accepted').exists())
+        self.assertFalse(RepaymentInstallment.objects.filter(status='Pending').exists())
+        portfolio = InvestorPortfolio.objects.get(investor=self.investor)
+        self.assertEqual(portfolio.completed_count, 4)
+        self.assertEqual(portfolio.outstanding, Decimal('0.00'))
+
+    def test_investor_pays_for_the_loan_before_being_repaid(self):
+        investor = LoanUser.objects.create_user(username='small', password='testpassword', balance=5000.00)
+        loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000, loan_period=5)
+        loan_offer = LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=15)
+        accept_loan_offer(loan_offer.pk, self.borrower)
+
+        set_balance(investor, Decimal('1002.00'))
+        self.assertEqual(post_due_repayments(add_months(self.funded_on, 1), first_id=loan_offer.pk, last_id=loan_offer.pk)['installments'], 0)
+        with self.assertRaises(FundingError):
+            complete_loan_offer(loan_offer.pk, investor)
+
+        set_balance(investor, Decimal('5000.00'))
+        post_due_repayments(add_months(self.funded_on, 5), first_id=loan_offer.pk, last_id=loan_offer.pk)
+        investor.refresh_from_db()
+        self.assertEqual(get_ledger_balance(investor), Decimal('5000.00') - Decimal('1003.00') + Decimal('1037.80'))
+        self.assertEqual(investor.portfolio.outstanding, Decimal('0.00'))
+
+    def test_completing_pays_off_what_posting_would(self):
+        def repay(pay_off):
+            investor = LoanUser.objects.create_user(username=f'investor-{pay_off}', password='testpassword', balance=5000.00)
+            loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000, loan_period=5)
+            loan_offer = LoanOffer.objects.create(investor=investor, loan_request=loan_request, annual_interest_rate=15)
+            accept_loan_offer(loan_offer.pk, self.borrower)
+            post_due_repayments(add_months(self.funded_on, 2), first_id=loan_offer.pk, last_id=loan_offer.pk)
+            if pay_off:
+                complete_loan_offer(loan_offer.pk, investor)
+            else:
+                post_due_repayments(add_months(self.funded_on, 5), first_id=loan_offer.pk, last_id=loan_offer.pk)
+            self.assertEqual(LoanOffer.objects.get(pk=loan_offer.pk).status, 'Completed')
+            return get_ledger_balance(investor)
+
+        paid_off = repay(pay_off=True)
+        self.assertEqual(paid_off, repay(pay_off=False))
+        self.assertEqual(paid_off, Decimal('5000.00') - Decimal('1003.00') + Decimal('1037.80'))
+
+    def test_loan_the_investor_cannot_fund_is_not_posted(self):
+        set_balance(self.investor, Decimal('4000.00'))
+        totals = post_due_repayments(add_months(self.funded_on, 1))
+        self.assertEqual(totals['installments'], 3)
+        self.assertFalse(RepaymentInstallment.objects.filter(loan_offer=self.offers[0], status='Paid').exists())
+        self.investor.refresh_from_db()
+        self.assertGreaterEqual(get_ledger_balance(self.investor), 0)
+
+    def test_posting_is_idempotent(self):
+        on = add_months(self.funded_on, 1)
+        post_due_repayments(on)
+        self.assertEqual(post_due_repayments(on), {'installments': 0, 'amount': '0.00', 'completed': 0})
+
+    def test_chunk_query_count_does_not_depend_on_loan_count(self):
+        offer_ids = [offer.id for offer in self.offers]
+        with CaptureQueriesContext(connection) as queries:
+            post_repayment_chunk(offer_ids, add_months(self.funded_on, 1))
+        with CaptureQueriesContext(connection) as more_queries:
+            post_repayment_chunk(offer_ids[:1], add_months(self.funded_on, 2))
+        self.assertEqual(len(queries), len(more_queries))
+
+    def test_partitions_cover_disjoint_offer_ranges(self):
+        on = add_months(self.funded_on, 1)
+        partitions = partition_offer_ids(on, 2)
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual(partitions[0][0], self.offers[0].id)
+        self.assertEqual(partitions[-1][1], self.offers[-1].id)
+
+        first_id, last_id = partitions[0]
+        post_due_repayments(on, first_id, last_id)
+        paid_offers = set(RepaymentInstallment.objects.filter(status='Paid').values_list('loan_offer_id', flat=True))
+        self.assertEqual(paid_offers, {offer.id for offer in self.offers if first_id <= offer.id <= last_id})
+
+    def test_command_posts_or_queues_repayments(self):
+        on = add_months(self.funded_on, 1).isoformat()
+        out = io.StringIO()
+        call_command('post_repayments', date=date.fromisoformat(on), processes=2, enqueue=True, stdout=out)
+        self.assertIn('Queued 2 repayment jobs', out.getvalue())
+        self.assertEqual(work(once=True), 2)
+        self.assertEqual(RepaymentInstallment.objects.filter(status='Paid').count(), 4)
+
+        call_command('post_repayments', date=date.fromisoformat(on), stdout=out)
+        self.assertIn('Posted 0 installments', out.getvalue())
+
+
+class ArchivalTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=100000.00)
+        self.offers = []
+        for amount in [1000, 2000, 3000]:
+            loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=amount, loan_period=3)
+            loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=10.0)
+            accept_loan_offer(loan_offer.pk, self.borrower)
+            self.offers.append(loan_offer)
+        complete_loan_offer(self.offers[0].pk, self.investor)
+        complete_loan_offer(self.offers[1].pk, self.investor)
+        self.live = LoanRequest.objects.create(borrower=self.borrower, loan_amount=500, loan_period=2)
+
+    def test_archives_completed_loans_with_offers_and_installments(self):
+        balance = get_ledger_balance(self.investor)
+        self.assertEqual(archive_loans(timezone.now(), chunk_size=1), 2)
+
+        archived_ids = {self.offers[0].loan_request_id, self.offers[1].loan_request_id}
+        self.assertEqual(set(ArchivedLoanRequest.objects.values_list('id', flat=True)), archived_ids)
+        self.assertEqual(set(LoanRequest.objects.values_list('id', flat=True)), {self.offers[2].loan_request_id, self.live.id})
+        self.assertEqual(ArchivedLoanOffer.objects.count(), 2)
+        self.assertEqual(ArchivedRepaymentInstallment.objects.count(), 6)
+        self.assertEqual(RepaymentInstallment.objects.count(), 3)
+        self.assertEqual(ArchivedLoanRequest.objects.get(pk=self.offers[0].loan_request_id).status, 'Completed')
+
+        # Ledger entries keep pointing at the archived offer, so balances are unaffected.
+        self.assertTrue(LedgerEntry.objects.filter(loan_offer_id=self.offers[0].id).exists())
+        self.assertEqual(get_ledger_balance(self.investor), balance)
+
+        self.assertEqual(archive_loans(timezone.now()), 0)
+
+    def test_rebuilding_portfolios_counts_archived_loans(self):
+        archive_loans(timezone.now())
+        incremental = InvestorPortfolio.objects.filter(investor=self.investor).values().get()
+        self.assertEqual(incremental['completed_count'], 2)
+        call_command('rebuild_portfolios', stdout=io.StringIO())
+        self.assertEqual(InvestorPortfolio.objects.filter(investor=self.investor).values().get(), incremental)
+
+    def test_cutoff_keeps_recently_completed_loans(self):
+        self.assertEqual(archive_loans(timezone.now() - timedelta(days=1)), 0)
+        LoanRequest.objects.filter(pk=self.offers[0].loan_request_id).update(completed_at=None)
+        self.assertEqual(archive_loans(timezone.now() - timedelta(days=1)), 1)
+
+    def test_history_pages_across_hot_and_archived_tiers(self):
+        archive_loans(timezone.now())
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('loanrequest-history'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.json()
+        self.assertEqual([row['id'] for row in first['results']], [self.live.id, self.offers[2].loan_request_id])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.offers[1].loan_request_id, self.offers[0].loan_request_id])
+        self.assertEqual(second['results'][0]['status'], 'Completed')
+        self.assertIsNone(second['next'])
+
+        self.client.force_authenticate(user=self.investor)
+        response = self.client.get(reverse('loanoffer-history'))
+        self.assertEqual([row['id'] for row in response.json()['results']], [offer.id for offer in reversed(self.offers)])
+        self.assertEqual(self.client.get(reverse('loanoffer-history'), {'before': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schedule_of_archived_offer(self):
+        archive_loans(timezone.now())
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('loanoffer-schedule', args=[self.offers[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+        self.client.force_authenticate(user=LoanUser.objects.create_user(username='other', password='testpassword'))
+        response = self.client.get(reverse('loanoffer-schedule', args=[self.offers[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_command_archives_in_chunks(self):
+        out = io.StringIO()
+        call_command('archive_loans', older_than='0d', chunk_size=1, stdout=out)
+        self.assertIn('Archived 2 loan requests completed before', out.getvalue())
+        self.assertEqual(ArchivedLoanRequest.objects.count(), 2)
+
+
+class FundableLoanRequestTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=1075.50)
+        self.requests = {
+            (amount, period): LoanRequest.objects.create(borrower=self.borrower, loan_amount=amount, loan_period=period)
+            for amount, period in [(500, 12), (1000, 6), (1000, 12), (1070, 3), (2000, 6)]
+        }
+        LoanRequest.objects.create(borrower=self.investor, loan_amount=100, loan_period=6)
+        self.client.force_authenticate(user=self.investor)
+
+    def affordable(self, rate):
+        balance = get_ledger_balance(self.investor)
+        return {
+            loan_request.id for loan_request in LoanRequest.objects.filter(status='Pending').exclude(borrower=self.investor)
+            if calculate_total_loan_amount(LoanOffer(loan_request=loan_request, annual_interest_rate=rate)) <= balance
+        }
+
+    def test_principal_plus_fee_is_maintained_on_every_insert(self):
+        self.assertEqual(self.requests[500, 12].principal_plus_fee, Decimal('503.00'))
+        LoanRequest.objects.bulk_create([LoanRequest(borrower=self.borrower, loan_amount=Decimal('10.50'), loan_period=1)])
+        self.assertEqual(LoanRequest.objects.get(loan_amount=Decimal('10.50')).principal_plus_fee, Decimal('13.50'))
+
+    def test_matches_calculate_total_loan_amount_at_boundaries(self):
+        # 1000 over 6 months at 14.4% costs exactly the balance: 1000 + 72.00 + 3.00 = 1075.00.
+        for rate in ['0', '5', '14.4', '14.5', '15', '72.01', '100']:
+            with self.subTest(rate=rate):
+                found = set(fundable_loan_requests(self.investor, Decimal(rate), get_ledger_balance(self.investor)).values_list('id', flat=True))
+                self.assertEqual(found, self.affordable(Decimal(rate)))
+
+    def test_endpoint_pages_cheapest_first_against_current_balance(self):
+        # At 10% only 500 over 12 months (553.00) and 1000 over 6 months (1053.00) fit into 1075.50.
+        response = self.client.get(reverse('loanrequest-fundable'), {'rate': '10', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.json()
+        self.assertEqual([row['id'] for row in first['results']], [self.requests[500, 12].id])
+        self.assertEqual(Decimal(first['results'][0]['total_loan_amount']), Decimal('553.00'))
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.requests[1000, 6].id])
+        self.assertIsNone(second['next'])
+
+        set_balance(self.investor, Decimal('600.00'))
+        response = self.client.get(reverse('loanrequest-fundable'), {'rate': '10'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.requests[500, 12].id])
+
+    def test_uses_the_fundable_index_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('loanrequest-fundable'), {'rate': '10'})
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"principal_plus_fee" <=', sql)
+        self.assertIn('ORDER BY "loan_request"."principal_plus_fee" ASC', sql)
+
+    def test_pages_through_tied_amounts_without_offsets(self):
+        set_balance(self.investor, Decimal('100000.00'))
+        tied = [LoanRequest.objects.create(borrower=self.borrower, loan_amount=700, loan_period=6) for _ in range(9)]
+        expected = list(
+            LoanRequest.objects.filter(status='Pending').exclude(borrower=self.investor)
+            .order_by('principal_plus_fee', 'id').values_list('id', flat=True)
+        )
+        self.assertGreater(expected.index(tied[-1].id), 4)
+
+        seen, pages, url = [], [], reverse('loanrequest-fundable') + '?rate=0&page_size=4'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+            pages.append(page)
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, expected)
+
+        # Walking back from the last page returns the same pages.
+        back, url = [], pages[-1]['previous']
+        while url:
+            page = self.client.get(url).json()
+            back = [row['id'] for row in page['results']] + back
+            url = page['previous']
+        self.assertEqual(back, expected[:len(expected) - len(pages[-1]['results'])])
+
+    def test_rejects_a_tampered_cursor(self):
+        cursor = base64.b64encode(b'p=abc%7C1').decode()
+        response = self.client.get(reverse('loanrequest-fundable'), {'rate': '10', 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rejects_invalid_rate(self):
+        for params in [{}, {'rate': 'abc'}, {'rate': '-1'}, {'rate': '101'}, {'rate': 'NaN'}, {'rate': 'sNaN'}, {'rate': 'Infinity'}]:
+            response = self.client.get(reverse('loanrequest-fundable'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=10000.00)
+        self.loan_request = LoanRequest.objects.create(borrower=self.borrower, loan_amount=5000.00, loan_period=6)
+        self.loan_offer = LoanOffer.objects.create(investor=self.investor, loan_request=self.loan_request, annual_interest_rate=15.0)
+
+    def test_async_acceptance_returns_job_and_worker_runs_it(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.post(reverse('loanoffer-accept-offer', args=[self.loan_offer.id]), HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.loan_offer.refresh_from_db()
+        self.assertEqual(self.loan_offer.status, 'Pending')
+
+        self.assertEqual(work(once=True), 1)
+        self.loan_offer.refresh_from_db()
+        self.assertEqual(self.loan_offer.status, 'Accepted')
+
+        job = self.client.get(response.data['status_url']).data
+        self.assertEqual(job['status'], 'Done')
+        self.assertEqual(job['result'], {'message': 'Loan offer accepted and loan funded successfully'})
+
+    def test_business_failure_fails_job_without_retry(self):
+        set_balance(self.investor, 10)
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.post(reverse('loanoffer-accept-offer', args=[self.loan_offer.id]), {'async': '1'}, QUERY_STRING='async=1')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        work(once=True)
+        job = Job.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.status, 'Failed')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.error, 'Investor does not have sufficient balance')
+
+    def test_unexpected_error_is_retried_later(self):
+        job = enqueue('complete_offer', {'loan_offer_id': self.loan_offer.id, 'investor_id': self.investor.id})
+        with mock.patch.dict(JOB_HANDLERS, {'complete_offer': mock.Mock(side_effect=RuntimeError('boom'))}):
+            work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Queued')
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(claim_job())
+
+    def test_job_is_claimed_once(self):
+        enqueue('accept_offer', {'loan_offer_id': self.loan_offer.id, 'borrower_id': self.borrower.id})
+        self.assertIsNotNone(claim_job())
+        self.assertIsNone(claim_job())
+
+    def test_jobs_are_private(self):
+        job = enqueue('accept_offer', {'loan_offer_id': self.loan_offer.id, 'borrower_id': self.borrower.id}, self.borrower)
+        self.client.force_authenticate(user=self.investor)
+        response = self.client.get(reverse('job-detail', args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_run_workers_command_drains_queue(self):
+        enqueue('accept_offer', {'loan_offer_id': self.loan_offer.id, 'borrower_id': self.borrower.id})
+        out = io.StringIO()
+        call_command('run_workers', once=True, stdout=out)
+        self.assertIn('Processed 1 jobs', out.getvalue())
+
+
 class LoanOfferCreationTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -223,5 +1969,135 @@ class LoanOfferCreationTestCase(TestCase):
         self.assertEqual(response.data['message'], "You can't make an offer to yourself")
 
 
+class LoanBookImportExportTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.borrower = LoanUser.objects.create_user(username='borrower', password='testpassword')
+        self.investor = LoanUser.objects.create_user(username='investor', password='testpassword', balance=500.00)
+        self.loan_requests = [
+            LoanRequest.objects.create(borrower=self.borrower, loan_amount=1000 + i, loan_period=6)
+            for i in range(5)
+        ]
+        for loan_request in self.loan_requests:
+            LoanOffer.objects.create(investor=self.investor, loan_request=loan_request, annual_interest_rate=12.5)
+        LoanRequest.objects.filter(pk=self.loan_requests[0].pk).update(status='Funded')
+        LoanOffer.objects.filter(loan_request=self.loan_requests[0]).update(status='Accepted')
+
+    def export_and_clear(self, fmt):
+        call_command('export_loans', self.directory, format=fmt, chunk_size=2, stdout=io.StringIO())
+        LoanUser.objects.all().delete()
+
+    def assert_round_trip(self, id_offset=0):
+        self.assertEqual(LoanUser.objects.count(), 2)
+        self.assertEqual(LoanOffer.objects.count(), 5)
+        investor = LoanUser.objects.get(username='investor')
+        self.assertEqual(investor.id, self.investor.id + id_offset)
+        self.assertEqual(investor.balance, Decimal('500.00'))
+        self.assertTrue(investor.check_password('testpassword'))
+        offer = LoanOffer.objects.select_related('loan_request').get(loan_request_id=self.loan_requests[2].id + id_offset)
+        self.assertEqual(offer.annual_interest_rate, Decimal('12.50'))
+        self.assertEqual(offer.loan_request.borrower_id, self.borrower.id + id_offset)
+
+        # Invariants of the funding service hold for imported rows too.
+        self.assertEqual(get_ledger_balance(investor), investor.balance)
+        funded = LoanOffer.objects.get(status='Accepted')
+        self.assertEqual(RepaymentInstallment.objects.filter(loan_offer=funded).count(), 6)
+        self.assertFalse(RepaymentInstallment.objects.exclude(loan_offer=funded).exists())
+        self.assertEqual(investor.portfolio.funded_count, 1)
+
+    def test_jsonl_round_trip(self):
+        self.export_and_clear('jsonl')
+        call_command('import_loans', self.directory, format='jsonl', chunk_size=2, stdout=io.StringIO())
+        self.assert_round_trip()
+
+    def test_csv_round_trip_with_id_offset(self):
+        self.export_and_clear('csv')
+        call_command('import_loans', self.directory, format='csv', chunk_size=2, id_offset=1000, stdout=io.StringIO())
+        self.assert_round_trip(id_offset=1000)
+
+    def test_import_resumes_from_checkpoint(self):
+        self.export_and_clear('jsonl')
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        with mock.patch('loan_app.loan_book.LoanOffer.objects.bulk_create', side_effect=[mock.DEFAULT, DatabaseError('interrupted')], wraps=LoanOffer.objects.bulk_create):
+            with self.assertRaises(DatabaseError):
+                call_command('import_loans', self.directory, chunk_size=2, checkpoint=checkpoint, stdout=io.StringIO())
+        with open(checkpoint) as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file), {'users': 2, 'loan_requests': 5, 'loan_offers': 2})
+
+        call_command('import_loans', self.directory, chunk_size=2, checkpoint=checkpoint, stdout=io.StringIO())
+        self.assert_round_trip()
+
+    def test_resume_skips_rows_committed_after_the_last_checkpoint(self):
+        self.export_and_clear('jsonl')
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+        advance = Checkpoint.advance
+
+        def crash_after_second_request_chunk(checkpoint, name, rows):
+            if name == 'loan_requests' and checkpoint.done(name) == 2:
+                raise OSError('killed')  # The chunk has committed; its progress is never written.
+            advance(checkpoint, name, rows)
+
+        with mock.patch.object(Checkpoint, 'advance', autospec=True, side_effect=crash_after_second_request_chunk):
+            with self.assertRaises(OSError):
+                call_command('import_loans', self.directory, chunk_size=2, checkpoint=checkpoint, stdout=io.StringIO())
+        self.assertEqual(LoanRequest.objects.count(), 4)
+
+        out = io.StringIO()
+        call_command('import_loans', self.directory, chunk_size=2, checkpoint=checkpoint, stdout=out)
+        self.assertIn('Imported 1 loan_requests', out.getvalue())
+        self.assert_round_trip()
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+    def test_import_into_a_database_with_colliding_ids_fails(self):
+        self.export_and_clear('jsonl')
+        local = LoanUser.objects.create_user(id=self.borrower.id, username='local', password='testpassword')
+
+        with self.assertRaisesMessage(CommandError, '--id-offset'):
+            call_command('import_loans', self.directory, chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(list(LoanUser.objects.values_list('username', flat=True)), ['local'])
+        self.assertFalse(LoanRequest.objects.filter(borrower=local).exists())
+
+        call_command('import_loans', self.directory, chunk_size=2, id_offset=1000, stdout=io.StringIO())
+        self.assertFalse(LoanRequest.objects.filter(borrower=local).exists())
+        self.assertEqual(LoanRequest.objects.filter(borrower__username='borrower').count(), 5)
+
+    def test_import_with_a_taken_username_fails(self):
+        self.export_and_clear('jsonl')
+        LoanUser.objects.create_user(username='investor', password='testpassword')
+        with self.assertRaisesMessage(CommandError, "usernames ['investor'] already exist"):
+            call_command('import_loans', self.directory, chunk_size=2, id_offset=1000, stdout=io.StringIO())
+        self.assertEqual(LoanUser.objects.count(), 1)
+
+
+class LifecycleBenchmarkTestCase(TransactionTestCase):
+    def test_benchmark_writes_json_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_lifecycle', users=10, requests=20, offers=40, flows=3, clients=1, output=output, stdout=io.StringIO())
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        self.assertEqual(results['flows_completed'], 3)
+        self.assertEqual(results['seeded'], {'users': 10, 'requests': 20, 'offers': 40})
+        self.assertEqual(LoanRequest.objects.count(), 23)
+        for endpoint in ['register', 'loan_request_create', 'loan_offer_create', 'accept_offer', 'complete_offer']:
+            self.assertEqual(results['endpoints'][endpoint]['requests'], 3)
+            self.assertEqual(results['endpoints'][endpoint]['errors'], 0)
+            self.assertGreater(results['endpoints'][endpoint]['queries_per_request'], 0)
 
+    def test_seeding_samples_ids_from_the_seeded_ranges(self):
+        LoanUser.objects.create_user(username='existing', password='testpassword')
+        user_ids, counts = seed_database(10, 20, 40, 'seed', random.Random(0), chunk_size=3)
 
+        seeded = LoanUser.objects.filter(username__startswith='seed-')
+        self.assertEqual(list(user_ids), list(seeded.order_by('id').values_list('id', flat=True)))
+        self.assertFalse(LoanRequest.objects.exclude(borrower__in=seeded).exists())
+        self.assertFalse(LoanOffer.objects.exclude(investor__in=seeded).exists())
+        self.assertFalse(LoanOffer.objects.filter(investor=F('loan_request__borrower')).exists())
+        self.assertEqual(counts, {'users': 10, 'requests': 20, 'offers': 40})
+        self.assertEqual(LoanOffer.objects.count(), 40)
+        # Every seeded balance is backed by a deposit.
+        self.assertEqual(LedgerEntry.objects.filter(kind='Deposit', user__in=seeded).count(), 10)
+        # Offers are spread over every request.
+        self.assertEqual(LoanOffer.objects.values('loan_request').distinct().count(), 20)
@@ -0,0 +1,218 @@
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+from .idempotency import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_CACHE_ALIAS = getattr(settings, 'LOAN_RATE_LIMIT_CACHE_ALIAS', 'default')
+# Route -> (tokens refilled per second, bucket size). Routes are "<METHOD> <url name>".
+RATE_LIMITS = getattr(settings, 'LOAN_RATE_LIMITS', {
+    'GET loanrequest-list': (10, 50),
+    'POST loanoffer-list': (5, 50),
+    'POST loanoffer-batch': (1, 5),
+})
+# Route -> requests allowed to run at once across all processes sharing the cache.
+CONCURRENCY_LIMITS = getattr(settings, 'LOAN_CONCURRENCY_LIMITS', {
+    'POST loanrequest-list': 32,
+    'POST loanoffer-list': 32,
+    'POST loanoffer-batch': 8,
+    'POST loanoffer-accept-offer': 32,
+    'POST loanoffer-complete-offer': 32,
+})
+# Seconds after which an in-flight counter is reset, reclaiming slots leaked by workers that died mid-request.
+CONCURRENCY_SLOT_TTL = getattr(settings, 'LOAN_CONCURRENCY_SLOT_TTL', 60)
+CONCURRENCY_RETRY_AFTER = 1
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} {request.path}'
+    # The /api/async/ variants share the limits, and the buckets, of the endpoints they mirror.
+    return f"{request.method} {match.view_name.removeprefix('async-')}"
+
+
+class TokenBucketStore:
+    """
+    Token buckets kept in a Django cache, falling back to process memory if the cache fails.
+
+    Each bucket is a (tokens, updated_at) pair refilled lazily on every take. The
+    read-modify-write is not atomic across processes, so concurrent requests can
+    occasionally overdraw a bucket by a token or two; that is acceptable for shedding
+    abusive clients and avoids a lock round trip per request.
+    """
+
+    def __init__(self, alias=RATE_LIMIT_CACHE_ALIAS, fallback_size=10000):
+        self.alias = alias
+        self.fallback = TTLCache(fallback_size, 60 * 60)
+        self._lock = threading.Lock()
+
+    def _take(self, load, save, key, rate, burst, now):
+        tokens, updated_at = load(key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            save(key, (tokens, now), burst / rate)
+            return (1 - tokens) / rate
+        save(key, (tokens - 1, now), burst / rate)
+        return 0.0
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token from the bucket; return 0 if allowed, else the seconds until a token is available."""
+        now = time.time() if now is None else now
+        try:
+            cache = caches[self.alias]
+            return self._take(cache.get, lambda k, v, timeout: cache.set(k, v, math.ceil(timeout)), key, rate, burst, now)
+        except Exception:
+            logger.warning('Rate limit cache unavailable, using in-process buckets', exc_info=True)
+            with self._lock:
+                return self._take(self.fallback.get, lambda k, v, timeout: self.fallback.set(k, v), key, rate, burst, now)
+
+    def clear(self):
+        self.fallback.clear()
+
+
+buckets = TokenBucketStore()
+
+
+def take_token(route, ident):
+    """Take a token for `ident` on `route`; return 0 if allowed, else the seconds to wait."""
+    limit = RATE_LIMITS.get(route)
+    if limit is None:
+        return 0
+    return buckets.take(f"loan_rate:{route.replace(' ', ':')}:{ident}", *limit)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user, per-route token bucket configured by LOAN_RATE_LIMITS.
+
+    Routes without an entry are not limited. Throttled requests get DRF's 429 response
+    with a Retry-After header of the time until the next token.
+    """
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        ident = request.user.pk if request.user.is_authenticated else self.get_ident(request)
+        self._wait = take_token(route_name(request), ident)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class ConcurrencyLimiter:
+    """
+    Per-route counters of in-flight requests kept in a Django cache, bounded by LOAN_CONCURRENCY_LIMITS.
+
+    Counters are shared by every process using the cache, so a limit holds for the whole
+    deployment. They are changed with the cache's incr/decr, which are atomic on Redis and
+    Memcached. A counter expires LOAN_CONCURRENCY_SLOT_TTL seconds after it was created, so
+    slots leaked by a worker that died mid-request are reclaimed; requests still running
+    when it expires are briefly not counted. If the cache fails, counting falls back to
+    this process, like TokenBucketStore does.
+    """
+
+    def __init__(self, alias=RATE_LIMIT_CACHE_ALIAS, ttl=CONCURRENCY_SLOT_TTL):
+        self.alias = alias
+        self.ttl = ttl
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, route):
+        return f"loan_in_flight:{route.replace(' ', ':')}"
+
+    def _acquire_shared(self, route, limit):
+        cache, key = caches[self.alias], self._key(route)
+        cache.add(key, 0, self.ttl)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # The counter expired between add and incr.
+            cache.add(key, 0, self.ttl)
+            count = cache.incr(key)
+        if count > limit:
+            cache.decr(key)
+            return None
+        return lambda: self._release_shared(key)
+
+    def _release_shared(self, key):
+        cache = caches[self.alias]
+        try:
+            if cache.decr(key) < 0:
+                # The counter was reset while this request ran.
+                cache.incr(key)
+        except ValueError:
+            pass  # Expired: the slot was reclaimed with it.
+        except Exception:
+            logger.warning('Concurrency limit cache unavailable, could not release slot', exc_info=True)
+
+    def _acquire_local(self, route, limit):
+        with self._lock:
+            if self._in_flight.get(route, 0) >= limit:
+                return None
+            self._in_flight[route] = self._in_flight.get(route, 0) + 1
+        return lambda: self._release_local(route)
+
+    def _release_local(self, route):
+        with self._lock:
+            self._in_flight[route] -= 1
+
+    def acquire(self, route, limit):
+        """Take a slot on `route`; return a function that releases it, or None if `limit` slots are taken."""
+        try:
+            return self._acquire_shared(route, limit)
+        except Exception:
+            logger.warning('Concurrency limit cache unavailable, using in-process counters', exc_info=True)
+            return self._acquire_local(route, limit)
+
+    def in_flight(self, route):
+        with self._lock:
+            local = self._in_flight.get(route, 0)
+        try:
+            return caches[self.alias].get(self._key(route), 0) + local
+        except Exception:
+            return local
+
+
+concurrency_limiter = ConcurrencyLimiter()
+
+
+def admission_control(view_method):
+    """
+    Shed a DRF view method's requests with 429 once its route has too many in flight.
+
+    Excess requests are rejected immediately instead of queueing for database locks,
+    so the requests that are admitted keep a stable latency under overload. Limits apply
+    to the whole deployment through the shared cache, or per process while it is down.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        route = route_name(request)
+        limit = CONCURRENCY_LIMITS.get(route)
+        if limit is None:
+            return view_method(self, request, *args, **kwargs)
+        release = concurrency_limiter.acquire(route, limit)
+        if release is None:
+            return Response(
+                {'message': 'Too many requests in progress, please retry shortly'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(CONCURRENCY_RETRY_AFTER)},
+            )
+        try:
+            return view_method(self, request, *args, **kwargs)
+        finally:
+            release()
+
+    return wrapper
@@ -1,13 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import  LoanRequestViewSet, LoanOfferViewSet , UserRegistrationView
+from .views import  LoanRequestViewSet, LoanOfferViewSet , UserRegistrationView, PortfolioSummaryView, TokenView, JobViewSet, MetricsView
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'loan-requests', LoanRequestViewSet)
 router.register(r'loan-offers', LoanOfferViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', UserRegistrationView.as_view(), name='user-registration'),
+    path('async/loan-requests/', async_views.loan_request_list, name='async-loanrequest-list'),
+    path('async/loan-offers/', async_views.loan_offer_list, name='async-loanoffer-list'),
+    path('async/register/', async_views.user_registration, name='async-user-registration'),
+    path('token/', TokenView.as_view(), name='api-token'),
+    path('portfolio/summary/', PortfolioSummaryView.as_view(), name='portfolio-summary'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 
 ]
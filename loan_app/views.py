@@ -1,73 +1,359 @@
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.response import Response
-from .models import LoanUser , LoanRequest ,LoanOffer
-from .serializers import  LoanRequestSerializer , UserRegistrationSerializer, LoanOfferSerializer , LoanRequestCreateSerializer
-from django.db import transaction
+from .models import LENME_FEE, LoanUser , LoanRequest ,LoanOffer, RepaymentInstallment, InvestorPortfolio, Job, ArchivedLoanRequest, ArchivedLoanOffer, ArchivedRepaymentInstallment
+from .serializers import  LoanRequestSerializer , UserRegistrationSerializer, LoanOfferSerializer , LoanRequestCreateSerializer, LoanOfferBatchItemSerializer, RepaymentInstallmentSerializer, LoanOfferDetailSerializer, LOAN_OFFER_ROW_FIELDS, serialize_loan_offer_row, LOAN_REQUEST_ROW_FIELDS, serialize_loan_request_rows, PortfolioSummarySerializer, JobSerializer
+from django.db import DEFAULT_DB_ALIAS, transaction
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated 
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.db.models import Q 
 from rest_framework.decorators import action
 from drf_yasg.utils import swagger_auto_schema
+from decimal import Decimal, InvalidOperation
+from .pagination import LoanRequestCursorPagination, FundableLoanRequestCursorPagination
+from .renderers import API_RENDERER_CLASSES, NDJSONRenderer, dumps
+from .cache import feed_cache_key, get_cached_feed_page, set_cached_feed_page, feed_cache_stats
+from .matching import offer_book
+from .metrics import registry as metrics_registry
+from .idempotency import idempotent
+from .db_routers import ReplicaReadMixin
+from .throttling import TokenBucketThrottle, admission_control
+from .authentication import API_AUTHENTICATION_CLASSES, API_TOKEN_TTL, IsMetricsScraper, MetricsTokenAuthentication, issue_token
+from .jobs import enqueue
+from .hashing import password_hasher, HasherSaturated
+from .ledger import get_ledger_balance
+from .services import register_user, accept_loan_offer, complete_loan_offer, fundable_loan_requests, loan_interest, FundingError
+
+
+# Filter values are validated with the model's digit and range limits, so they can never
+# make the query itself fail.
+LOAN_AMOUNT_FIELD = LoanRequest._meta.get_field('loan_amount')
+LOAN_AMOUNT_FILTER = serializers.DecimalField(max_digits=LOAN_AMOUNT_FIELD.max_digits, decimal_places=LOAN_AMOUNT_FIELD.decimal_places)
+LOAN_PERIOD_FILTER = serializers.IntegerField(min_value=0, max_value=2147483647)  # PositiveIntegerField range
+
+LOAN_REQUEST_RANGE_FILTERS = {
+    'min_amount': ('loan_amount__gte', LOAN_AMOUNT_FILTER),
+    'max_amount': ('loan_amount__lte', LOAN_AMOUNT_FILTER),
+    'min_period': ('loan_period__gte', LOAN_PERIOD_FILTER),
+    'max_period': ('loan_period__lte', LOAN_PERIOD_FILTER),
+}
+
+
+def wants_async(request):
+    """True if the client asked for the action to be queued, via Prefer: respond-async or ?async=1."""
+    return 'respond-async' in request.headers.get('Prefer', '') or request.query_params.get('async') == '1'
+
+
+def job_accepted_response(request, job):
+    return Response(
+        {'job_id': job.id, 'status_url': request.build_absolute_uri(reverse('job-detail', args=[job.id]))},
+        status=status.HTTP_202_ACCEPTED,
+    )
 
 
-def calculate_total_loan_amount(loan_offer):
-    loan_request = loan_offer.loan_request
-    total_loan_amount = (
-        float(loan_request.loan_amount)
-        + float(loan_request.loan_amount) * float(loan_offer.annual_interest_rate / 100)
-        * float((loan_request.loan_period / 12))
-        + 3.00
-    )
-    return total_loan_amount
+def parse_range_filters(query_params, filters):
+    """
+    Translate range query parameters into ORM lookups.
+
+    `filters` maps each parameter to an (ORM lookup, serializer field) pair. Returns a
+    (lookups, errors) tuple; errors maps each invalid parameter to its validation messages.
+    """
+    lookups = {}
+    errors = {}
+    for param, (lookup, field) in filters.items():
+        value = query_params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            lookups[lookup] = field.run_validation(value)
+        except serializers.ValidationError as exc:
+            errors[param] = exc.detail
+    return lookups, errors
+
+
+MAX_OFFER_BATCH_SIZE = 500
+
+REGISTRATION_RETRY_AFTER = 1  # Seconds
+
+STREAM_CHUNK_SIZE = 2000
+
+DEFAULT_BEST_OFFERS = 5
+MAX_BEST_OFFERS = 100
+
+LOAN_OFFER_DETAIL_FIELDS = (
+    'id', 'annual_interest_rate', 'status',
+    'investor__id', 'investor__username',
+    'loan_request__id', 'loan_request__borrower_id', 'loan_request__loan_amount',
+    'loan_request__loan_period', 'loan_request__status',
+)
+
+
+def history_page(request, querysets, row_id):
+    """
+    Merge one page, newest first, of rows from the hot and archived tiers.
+
+    Each queryset contributes at most one page of rows below the `before` id, so the
+    archive is read with the same index range scan as the live table.
+    """
+    pagination = LoanRequestCursorPagination
+    try:
+        page_size = max(1, min(int(request.query_params.get(pagination.page_size_query_param, pagination.page_size)), pagination.max_page_size))
+        before = int(request.query_params['before']) if 'before' in request.query_params else None
+    except ValueError:
+        return None, None
+    rows = []
+    for queryset in querysets:
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        rows.extend(queryset.order_by('-id')[:page_size + 1])
+    rows.sort(key=row_id, reverse=True)
+
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.query_params.copy()
+        query['before'] = row_id(rows[-1])
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return rows, next_url
+
+
+def loan_offer_detail_queryset():
+    """Loan offers joined to their investor and loan request, loading only the columns LoanOfferDetailSerializer reads."""
+    return LoanOffer.objects.select_related('investor', 'loan_request').only(*LOAN_OFFER_DETAIL_FIELDS)
+
 
 class UserRegistrationView(generics.CreateAPIView):
     queryset = LoanUser.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [] 
-    def perform_create(self, serializer):
-        user = serializer.save()
-        user.set_password(serializer.validated_data['password'])
-        user.save()
-
     @swagger_auto_schema(
         request_body=UserRegistrationSerializer,
-        responses={status.HTTP_201_CREATED: 'User registered successfully'},
+        responses={
+            status.HTTP_201_CREATED: 'User registered successfully',
+            status.HTTP_429_TOO_MANY_REQUESTS: 'Too many registrations in progress',
+        },
     )
+    @idempotent
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            self.perform_create(serializer)
+            try:
+                password_hash = password_hasher.hash(serializer.validated_data['password'])
+            except HasherSaturated:
+                return Response(
+                    {'message': 'Too many registrations in progress, please retry shortly'},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={'Retry-After': str(REGISTRATION_RETRY_AFTER)},
+                )
+            register_user(serializer, password_hash)
             return Response({'message': 'User registered successfully'}, status=status.HTTP_201_CREATED)
     
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class LoanRequestViewSet(viewsets.ModelViewSet):
+class TokenView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: 'Signed API token and its lifetime in seconds'})
+    def post(self, request, *args, **kwargs):
+        """
+        Issue a signed bearer token for the logged-in user.
+
+        Authenticate this call with Basic or session credentials, then send
+        `Authorization: Bearer <token>` on API calls until the token expires.
+
+        Responses:
+        - 200 OK: The token and `expires_in` seconds.
+        """
+        return Response({'token': issue_token(request.user), 'expires_in': API_TOKEN_TTL})
+
+
+class PortfolioSummaryView(ReplicaReadMixin, generics.GenericAPIView):
+    authentication_classes = API_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated]
+    serializer_class = PortfolioSummarySerializer
+
+    @swagger_auto_schema(responses={status.HTTP_200_OK: PortfolioSummarySerializer})
+    def get(self, request, *args, **kwargs):
+        """
+        Retrieve the logged-in investor's portfolio totals.
+
+        The totals are maintained incrementally when offers are accepted and completed,
+        so this is a single-row lookup regardless of how many loans the investor funded.
+
+        Responses:
+        - 200 OK: Funded and completed counts, funded principal, expected interest and outstanding amount.
+        """
+        portfolio = InvestorPortfolio.objects.filter(investor=request.user).first() or InvestorPortfolio(investor=request.user)
+        serializer = PortfolioSummarySerializer(portfolio)
+        return Response(serializer.data)
+
+
+class LoanRequestViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    authentication_classes = API_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated] 
+    throttle_classes = [TokenBucketThrottle]
+    renderer_classes = API_RENDERER_CLASSES
     queryset = LoanRequest.objects.all()
     serializer_class = LoanRequestSerializer
+    pagination_class = LoanRequestCursorPagination
 
     def list(self, request , *args, **kwargs):
         """
-        Retrieve all loan requests for the logged-in user.
+        Retrieve loan requests for the logged-in user, one cursor page at a time.
+
+        This endpoint retrieves the loan requests of the currently logged-in user
+        together with every pending request on the marketplace, newest first.
+        Results can be narrowed with the min_amount, max_amount, min_period and
+        max_period query parameters; follow the returned next/previous links to page.
+        JSON pages are served from the feed cache until a loan request or offer changes;
+        pages read from a replica are served but not cached.
+
+        Responses:
+        - 200 OK: Page of loan request objects.
+        - 400 Bad Request: Invalid filter value.
+        """
+        lookups, errors = parse_range_filters(request.query_params, LOAN_REQUEST_RANGE_FILTERS)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        cacheable = request.accepted_renderer.format == 'json'
+        if cacheable:
+            cache_key = feed_cache_key(user.id, request.query_params)
+            content = get_cached_feed_page(cache_key)
+            if content is not None:
+                return HttpResponse(content, content_type='application/json')
+
+        requests = LoanRequest.objects.filter(Q(borrower = user)|Q(status="Pending") ).filter(**lookups)
+
+        page = self.paginate_queryset(requests.values(*LOAN_REQUEST_ROW_FIELDS))
+        response = self.get_paginated_response(serialize_loan_request_rows(page))
+        # A replica may lag behind a write whose invalidation has already bumped the feed
+        # version, so only pages read from the primary are stored under the current version.
+        if cacheable and requests.db == DEFAULT_DB_ALIAS:
+            set_cached_feed_page(cache_key, dumps(response.data))
+        return response
+
+    @action(detail=False, methods=['GET'])
+    def history(self, request):
+        """
+        List every loan request of the logged-in borrower, including archived ones, newest first.
 
-        This endpoint retrieves all loan requests associated with the currently logged-in user.
-        It includes both pending and non-pending requests.
+        Completed loans are moved to the archive tables by `manage.py archive_loans`; this
+        endpoint reads both tiers. Follow the `next` link (keyed by the `before` id) to page.
 
         Responses:
-        - 200 OK: List of loan request objects.
+        - 200 OK: Page of loan request objects.
+        - 400 Bad Request: Invalid page_size or before value.
         """
         user = request.user
-        requests = LoanRequest.objects.filter(Q(borrower = user)|Q(status="Pending") )
+        rows, next_url = history_page(request, [
+            LoanRequest.objects.filter(borrower=user).values(*LOAN_REQUEST_ROW_FIELDS),
+            ArchivedLoanRequest.objects.filter(borrower=user).values(*LOAN_REQUEST_ROW_FIELDS),
+        ], row_id=lambda row: row['id'])
+        if rows is None:
+            return Response({'message': 'page_size and before must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'next': next_url, 'results': serialize_loan_request_rows(rows)})
+
+    @swagger_auto_schema(
+        method='GET',
+        responses={
+            status.HTTP_200_OK: 'Page of loan requests the investor can fund, cheapest first',
+            status.HTTP_400_BAD_REQUEST: 'Invalid rate'
+        },
+        operation_description="List pending loan requests the logged-in investor's balance can fund at a given rate.",
+    )
+    @action(detail=False, methods=['GET'])
+    def fundable(self, request):
+        """
+        List pending loan requests the logged-in investor can fund at the given annual rate.
+
+        The required rate query parameter (0 to 100) is the rate the investor would offer.
+        Only requests whose total loan amount at that rate, fee included, fits the investor's
+        current balance are returned, cursor-paginated cheapest first. Each request carries
+        its total_loan_amount at that rate.
+
+        Responses:
+        - 200 OK: Page of loan request objects.
+        - 400 Bad Request: Invalid rate.
+        """
+        try:
+            rate = Decimal(request.query_params['rate'])
+        except (KeyError, InvalidOperation):
+            rate = None
+        if rate is None or not rate.is_finite() or not 0 <= rate <= 100:
+            return Response({'rate': 'rate must be a number between 0 and 100'}, status=status.HTTP_400_BAD_REQUEST)
+
+        investor = request.user
+        balance = get_ledger_balance(investor)
+        requests = fundable_loan_requests(investor, rate, balance)
+
+        paginator = FundableLoanRequestCursorPagination()
+        page = paginator.paginate_queryset(requests.values(*LOAN_REQUEST_ROW_FIELDS), request, view=self)
+        results = serialize_loan_request_rows(page)
+        for row, result in zip(page, results):
+            result['total_loan_amount'] = row['loan_amount'] + loan_interest(row['loan_amount'], rate, row['loan_period']) + LENME_FEE
+        return paginator.get_paginated_response(results)
+
+    @action(detail=False, methods=['GET'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Report hit/miss counters of the loan request feed cache for this process.
+
+        Responses:
+        - 200 OK: Hit, miss and hit ratio counters.
+        """
+        return Response(feed_cache_stats.as_dict())
+
+    @swagger_auto_schema(
+        method='GET',
+        responses={
+            status.HTTP_200_OK: LoanOfferDetailSerializer(many=True),
+            status.HTTP_400_BAD_REQUEST: 'Invalid k',
+            status.HTTP_404_NOT_FOUND: 'Loan request not found or not in Pending status'
+        },
+        operation_description="List the best pending offers on one of the borrower's loan requests.",
+    )
+    @action(detail=True, methods=['GET'], url_path='best-offers')
+    def best_offers(self, request, pk=None):
+        """
+        List the best pending offers on one of the borrower's loan requests.
 
-        serializer = LoanRequestSerializer(requests, many=True)
+        Offers are ranked by annual interest rate, earliest first among equal rates,
+        and read from the in-process offer book. The k query parameter (default 5, at most 100)
+        limits how many are returned.
+
+        Responses:
+        - 200 OK: Up to k loan offer objects, best first.
+        - 400 Bad Request: Invalid k.
+        - 404 Not Found: Loan request not found or not in Pending status.
+        """
+        try:
+            k = int(request.query_params.get('k', DEFAULT_BEST_OFFERS))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= MAX_BEST_OFFERS:
+            return Response({'k': f'k must be an integer between 1 and {MAX_BEST_OFFERS}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not LoanRequest.objects.filter(pk=pk, borrower=request.user, status='Pending').exists():
+            return Response({'message': 'Loan request not found or not in Pending status'}, status=status.HTTP_404_NOT_FOUND)
+
+        offer_ids = offer_book.best(int(pk), k)
+        offers = loan_offer_detail_queryset().filter(status='Pending').in_bulk(offer_ids)
+        serializer = LoanOfferDetailSerializer([offers[offer_id] for offer_id in offer_ids if offer_id in offers], many=True)
         return Response(serializer.data)
     
+    @admission_control
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Submit a new loan request.
 
         This endpoint allows the user to submit a new loan request.
         The required fields in the request data are 'loan_amount' and 'loan_period'.
+        An optional 'offer_deadline' makes the best fundable offer be accepted automatically once it passes.
 
         Responses:
         - 201 Created: Loan request submitted successfully.
@@ -81,24 +367,28 @@ class LoanRequestViewSet(viewsets.ModelViewSet):
 
         loan_request_data = {
             'loan_amount': loan_amount,
-            'loan_period': loan_period
+            'loan_period': loan_period,
+            'offer_deadline': request.data.get('offer_deadline')
         }
 
         serializer = LoanRequestCreateSerializer(data=loan_request_data)
         if serializer.is_valid():
             loan_request = LoanRequest.objects.create(
                 borrower=request.user,  # Assuming user authentication
-                **loan_request_data
+                **serializer.validated_data
             )
             return Response({'message': 'Loan request submitted successfully'}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
-class LoanOfferViewSet(viewsets.ModelViewSet):
+class LoanOfferViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = LoanOffer.objects.all()
     serializer_class = LoanOfferSerializer
+    authentication_classes = API_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    renderer_classes = API_RENDERER_CLASSES + [NDJSONRenderer]
 
 
     def list(self, request , *args, **kwargs):
@@ -106,107 +396,187 @@ class LoanOfferViewSet(viewsets.ModelViewSet):
         List loan offers for the logged-in investor.
 
         This endpoint retrieves all loan offers made by the logged-in investor.
-        It lists the loan offers associated with the investor's account.
+        Each offer includes a summary of its investor and loan request, fetched in a single query.
+        With ?stream=1 or an Accept: application/x-ndjson header the offers are streamed
+        as newline-delimited JSON, one object per line, straight from a database cursor.
 
         Responses:
         - 200 OK: List of loan offer objects.
         """
         investor = request.user
-        borrower_offers = LoanOffer.objects.filter(investor=investor)
-        serializer = LoanOfferSerializer(borrower_offers, many=True)
+        if request.query_params.get('stream') == '1' or request.accepted_renderer.format == 'ndjson':
+            offers = LoanOffer.objects.filter(investor=investor)
+            # Rows are read after the view returns, so pin the database chosen for this request now.
+            rows = (
+                offers.using(offers.db)
+                .order_by('id')
+                .values_list(*LOAN_OFFER_ROW_FIELDS)
+                .iterator(chunk_size=STREAM_CHUNK_SIZE)
+            )
+            lines = (dumps(serialize_loan_offer_row(row)) + b'\n' for row in rows)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+        rows = LoanOffer.objects.filter(investor=investor).values_list(*LOAN_OFFER_ROW_FIELDS)
+        return Response([serialize_loan_offer_row(row) for row in rows])
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a single loan offer.
+
+        This endpoint returns a loan offer with its investor and loan request summaries.
+        It is available to the investor who made the offer and the borrower of the loan request.
+
+        Responses:
+        - 200 OK: Loan offer object.
+        - 404 Not Found: Loan offer not found.
+        """
+        user = request.user
+        try:
+            loan_offer = loan_offer_detail_queryset().get(Q(investor=user)|Q(loan_request__borrower=user), pk=kwargs['pk'])
+        except LoanOffer.DoesNotExist:
+            return Response({'message': 'Loan offer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = LoanOfferDetailSerializer(loan_offer)
         return Response(serializer.data)
 
     @swagger_auto_schema(
-        method='GET',
+        method='POST',
         responses={
             status.HTTP_200_OK: 'Loan offer accepted and loan funded successfully',
             status.HTTP_400_BAD_REQUEST: 'Invalid request or insufficient balance'
         },
         operation_description="Accept a loan offer and fund the loan.",
     )
-    @action(detail=True, methods=['GET'])
+    @action(detail=True, methods=['POST'])
+    @admission_control
+    @idempotent
     def accept_offer(self, request, pk=None):
         """
         Accept a loan offer and fund the loan.
 
         This endpoint allows the borrower to accept a pending loan offer and fund the associated loan request.
-        If the borrower's balance is sufficient, the loan offer status changes to 'Accepted',
-        the investor's balance is updated, and the loan request status changes to 'Funded'.
+        If the investor's balance is sufficient, the loan offer status changes to 'Accepted',
+        the loan request status changes to 'Funded', and any other pending offers on the
+        request are rejected. The repayment schedule of the funded loan is generated at the same time.
+
+        With Prefer: respond-async (or ?async=1) the acceptance is queued for the job
+        workers and the response only carries the job id to poll.
 
         Responses:
         - 200 OK: Loan offer accepted and loan funded successfully.
+        - 202 Accepted: Acceptance queued.
         - 400 Bad Request: Invalid request or insufficient balance.
         """
-        borrower = request.user 
+        borrower = request.user
+        if wants_async(request):
+            return job_accepted_response(request, enqueue('accept_offer', {'loan_offer_id': pk, 'borrower_id': borrower.id}, borrower))
         try:
-            with transaction.atomic():
-                loan_offer = LoanOffer.objects.select_for_update().get(pk=pk, loan_request__borrower=borrower, status='Pending')                
-                total_loan_amount = calculate_total_loan_amount(loan_offer)              
-                
-                if loan_offer.investor.balance < total_loan_amount:
-                    return Response({'message': 'Investor does not have sufficient balance'}, status=status.HTTP_400_BAD_REQUEST)
-
-                loan_offer.status = 'Accepted'
-                loan_offer.investor.save()
-                loan_offer.save()
-
-                loan_request = loan_offer.loan_request
-                loan_request.status = 'Funded'
-                loan_request.save()
-
+            accept_loan_offer(pk, borrower)
         except LoanOffer.DoesNotExist:
             return Response({'message': 'Loan offer not found or not in Pending status'}, status=status.HTTP_404_NOT_FOUND)
+        except FundingError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'message': 'Loan offer accepted and loan funded successfully'}, status=status.HTTP_200_OK)
     
     
     @swagger_auto_schema(
         method='GET',
+        responses={
+            status.HTTP_200_OK: RepaymentInstallmentSerializer(many=True),
+            status.HTTP_404_NOT_FOUND: 'Loan offer not found'
+        },
+        operation_description="Retrieve the repayment schedule of a funded loan offer.",
+    )
+    @action(detail=True, methods=['GET'])
+    def schedule(self, request, pk=None):
+        """
+        Retrieve the repayment schedule of a funded loan offer.
+
+        This endpoint returns the installments generated when the offer was accepted.
+        It is available to the investor who made the offer and the borrower of the loan request.
+
+        Responses:
+        - 200 OK: List of installments ordered by number.
+        - 404 Not Found: Loan offer not found.
+        """
+        user = request.user
+        if LoanOffer.objects.filter(Q(investor=user)|Q(loan_request__borrower=user), pk=pk).exists():
+            installments = RepaymentInstallment.objects.filter(loan_offer_id=pk)
+        elif ArchivedLoanOffer.objects.filter(Q(investor=user)|Q(loan_request__borrower=user), pk=pk).exists():
+            installments = ArchivedRepaymentInstallment.objects.filter(loan_offer_id=pk)
+        else:
+            return Response({'message': 'Loan offer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = RepaymentInstallmentSerializer(installments, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def history(self, request):
+        """
+        List every loan offer of the logged-in investor, including archived ones, newest first.
+
+        Offers of archived loans are read from the archive tables. Follow the `next` link
+        (keyed by the `before` id) to page.
+
+        Responses:
+        - 200 OK: Page of loan offer objects.
+        - 400 Bad Request: Invalid page_size or before value.
+        """
+        investor = request.user
+        rows, next_url = history_page(request, [
+            LoanOffer.objects.filter(investor=investor).values_list(*LOAN_OFFER_ROW_FIELDS),
+            ArchivedLoanOffer.objects.filter(investor=investor).values_list(*LOAN_OFFER_ROW_FIELDS),
+        ], row_id=lambda row: row[0])
+        if rows is None:
+            return Response({'message': 'page_size and before must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'next': next_url, 'results': [serialize_loan_offer_row(row) for row in rows]})
+
+    @swagger_auto_schema(
+        method='POST',
         responses={
             status.HTTP_200_OK: 'Loan offer completed and loan completed successfully',
             status.HTTP_400_BAD_REQUEST: 'Invalid request or insufficient balance'
         },
         operation_description="Complete a loan offer and the associated loan.",
     )
-    @action(detail=True, methods=['GET'])
+    @action(detail=True, methods=['POST'])
+    @admission_control
+    @idempotent
     def complete_offer(self, request, pk=None):
         """
         Complete a loan offer and the associated loan.
 
         This endpoint allows the investor to complete an accepted loan offer.
-        If the investor's balance is sufficient, the loan offer status changes to 'Completed',
-        the investor's balance is updated, and the loan request status changes to 'Completed'.
+        Every installment still pending is repaid by the borrower, after the investor pays the
+        principal and fee if no installment was posted yet; the loan offer and the loan request
+        then change to 'Completed'.
+
+        With Prefer: respond-async (or ?async=1) the completion is queued for the job
+        workers and the response only carries the job id to poll.
 
         Responses:
         - 200 OK: Loan offer completed and loan completed successfully.
+        - 202 Accepted: Completion queued.
         - 400 Bad Request: Invalid request or insufficient balance.
         """
-        investor = request.user 
+        investor = request.user
+        if wants_async(request):
+            return job_accepted_response(request, enqueue('complete_offer', {'loan_offer_id': pk, 'investor_id': investor.id}, investor))
         try:
-            with transaction.atomic():
-                loan_offer = LoanOffer.objects.select_for_update().get(pk=pk, investor=investor, status='Accepted')  
-                total_loan_amount = calculate_total_loan_amount(loan_offer)              
-
-                if loan_offer.investor.balance < total_loan_amount:
-                    return Response({'message': 'Investor does not have sufficient balance'}, status=status.HTTP_400_BAD_REQUEST)
-
-                loan_offer.status = 'Completed'
-                loan_offer.investor.balance =float(loan_offer.investor.balance) -  total_loan_amount
-                loan_offer.investor.save()
-                loan_offer.save()
-
-                loan_request = loan_offer.loan_request
-                loan_request.status = 'Completed'
-                loan_request.save()
-
+            complete_loan_offer(pk, investor)
         except LoanOffer.DoesNotExist:
             return Response({'message': 'Loan offer not found or not in Pending status'}, status=status.HTTP_404_NOT_FOUND)
+        except FundingError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'message': 'Loan offer Completed and loan Completed successfully'}, status=status.HTTP_200_OK)
 
    
     
 
+    @admission_control
+    @idempotent
     def create(self, request, *args, **kwargs):
         investor = request.user  
         loan_request_id = request.data.get('loan_request')
@@ -227,12 +597,120 @@ class LoanOfferViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        LoanOffer.objects.create(
+        loan_offer = LoanOffer.objects.create(
             investor=investor,
             loan_request=loan_request,
-            annual_interest_rate=annual_interest_rate
+            annual_interest_rate=serializer.validated_data['annual_interest_rate']
         )
+        offer_book.add(loan_offer)
 
 
         return Response({'message': 'Loan offer submitted successfully'}, status=status.HTTP_201_CREATED)
 
+    @swagger_auto_schema(
+        method='POST',
+        request_body=LoanOfferBatchItemSerializer(many=True),
+        responses={
+            status.HTTP_201_CREATED: 'All loan offers submitted successfully',
+            status.HTTP_207_MULTI_STATUS: 'Some loan offers were rejected, see per-item results',
+            status.HTTP_400_BAD_REQUEST: 'Malformed batch'
+        },
+        operation_description="Submit many loan offers in one request.",
+    )
+    @action(detail=False, methods=['POST'])
+    @admission_control
+    @idempotent
+    def batch(self, request):
+        """
+        Submit many loan offers in one request.
+
+        The request body is a list of {"loan_request", "annual_interest_rate"} objects
+        (or an object with that list under "offers"). All referenced loan requests are
+        fetched in one query and the valid offers are inserted together in one transaction.
+        Every item gets a result entry, in input order, with either the created offer id
+        or the reason it was rejected.
+
+        Responses:
+        - 201 Created: Every offer was submitted.
+        - 207 Multi-Status: At least one offer was rejected.
+        - 400 Bad Request: The body is not a list or exceeds the batch size limit.
+        """
+        items = request.data.get('offers') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'message': 'Request body must be a non-empty list of loan offers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_OFFER_BATCH_SIZE:
+            return Response({'message': f'A batch may contain at most {MAX_OFFER_BATCH_SIZE} loan offers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        investor = request.user
+        results = [None] * len(items)
+        validated = []
+        for index, item in enumerate(items):
+            serializer = LoanOfferBatchItemSerializer(data=item)
+            if serializer.is_valid():
+                validated.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+        loan_requests = LoanRequest.objects.filter(status='Pending').only('id', 'borrower_id').in_bulk(
+            {data['loan_request'] for _, data in validated}
+        )
+
+        pending = []
+        for index, data in validated:
+            loan_request = loan_requests.get(data['loan_request'])
+            if loan_request is None:
+                results[index] = {'index': index, 'status': 'error', 'message': 'Loan request not found or not in Pending status'}
+            elif loan_request.borrower_id == investor.id:
+                results[index] = {'index': index, 'status': 'error', 'message': "You can't make an offer to yourself"}
+            else:
+                pending.append((index, LoanOffer(
+                    investor=investor,
+                    loan_request=loan_request,
+                    annual_interest_rate=data['annual_interest_rate']
+                )))
+
+        with transaction.atomic():
+            created = LoanOffer.objects.bulk_create([offer for _, offer in pending])
+        for (index, _), offer in zip(pending, created):
+            results[index] = {'index': index, 'status': 'created', 'id': offer.id}
+            offer_book.add(offer)
+
+        response_status = status.HTTP_201_CREATED if len(created) == len(items) else status.HTTP_207_MULTI_STATUS
+        return Response({'created': len(created), 'results': results}, status=response_status)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of the background jobs queued by the logged-in user.
+
+    Responses:
+    - 200 OK: Job objects with their status, result or error.
+    """
+    authentication_classes = API_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated]
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Job.objects.none()
+        return Job.objects.filter(user=self.request.user).order_by('-id')
+
+
+class MetricsView(APIView):
+    authentication_classes = [MetricsTokenAuthentication, *API_AUTHENTICATION_CLASSES]
+    permission_classes = [IsMetricsScraper | IsAdminUser]
+    swagger_schema = None
+
+    def get(self, request, *args, **kwargs):
+        """
+        Export the request metrics collected by MetricsMiddleware in Prometheus text format.
+
+        Only staff users and scrapers sending `Authorization: Bearer <LOAN_METRICS_TOKEN>`
+        may read them.
+
+        Responses:
+        - 200 OK: Per-route histograms of latency, database time, query count, lock wait and rows serialized.
+        - 401 Unauthorized / 403 Forbidden: Not a staff user or the metrics scraper.
+        """
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -3,27 +3,20 @@ from django.urls import path , include
 from django.urls import re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
+from loan_app.schema import API_INFO, schema_file, static_spec
 
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Loan API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
+    API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
 
 urlpatterns = [
-   path('<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-   path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-   path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+   re_path(r'^(?P<format>\.?(?:json|yaml))/$', schema_file, name='schema-json'),
+   path('', static_spec(schema_view.with_ui('swagger', cache_timeout=0)), name='schema-swagger-ui'),
+   path('redoc/', static_spec(schema_view.with_ui('redoc', cache_timeout=0)), name='schema-redoc'),
     path('api-auth/', include('rest_framework.urls')) ,
     path('api/', include("loan_app.urls") )
 ]